@@ -1,9 +1,11 @@
-import os, sys, time, socket, shutil, threading, subprocess, psutil, base64, hmac, platform
-import re
+import os, sys, time, socket, threading, subprocess, psutil, base64, hmac, platform, signal
+import io, re, json, gzip, zlib, hashlib, http.client, queue, select, errno
 from typing import Optional, Set
-from collections import deque
-from datetime import timedelta
-from flask import Flask, request, jsonify, render_template_string, redirect, url_for, session, make_response
+from collections import deque, OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, quote
+from flask import Flask, Response, request, jsonify, redirect, url_for, session, send_from_directory, send_file
+from markupsafe import Markup, escape
 from functools import wraps
 
 # === PocketComfy portable configuration ===
@@ -44,8 +46,45 @@ MINI_PORT_DEFAULT             = _intenv("MINI_PORT", 3000)
 SMART_GALLERY_PORT_DEFAULT    = _intenv("SMART_GALLERY_PORT", 8189)
 WAIT_FOR_GALLERY_SECS         = _intenv("WAIT_FOR_GALLERY_SECS", 60)
 WAIT_FOR_COMFY_SECS           = _intenv("WAIT_FOR_COMFY_SECS", 120)
-FALLBACK_MINI_DELAY_SECS      = _intenv("FALLBACK_MINI_DELAY_SECS", 30)
+WAIT_FOR_MINI_SECS            = _intenv("WAIT_FOR_MINI_SECS", 60)
+READY_PROBE_MIN_MS            = _intenv("READY_PROBE_MIN_MS", 50)
+READY_PROBE_MAX_MS            = _intenv("READY_PROBE_MAX_MS", 1000)
+SERVICE_PROXY                 = os.getenv("SERVICE_PROXY", "1") != "0"
+PROXY_POOL_SIZE               = _intenv("PROXY_POOL_SIZE", 8)
+PROXY_TIMEOUT_SECS            = _intenv("PROXY_TIMEOUT_SECS", 300)
+WS_SEND_TIMEOUT_SECS          = _intenv("WS_SEND_TIMEOUT_SECS", 30)
+COMPRESS_MIN_BYTES            = _intenv("COMPRESS_MIN_BYTES", 256)
+PROGRESS_HUB                  = os.getenv("PROGRESS_HUB", "1") != "0"
+PROGRESS_QUEUE                = _intenv("PROGRESS_QUEUE", 256)
+PROGRESS_IDLE_SECS            = _intenv("PROGRESS_IDLE_SECS", 30)
 FLASK_PORT                    = _intenv("FLASK_PORT", 5000)
+SERVER_MODE                   = os.getenv("SERVER_MODE", "threaded").strip().lower()  # threaded | dev
+SERVER_THREADS                = _intenv("SERVER_THREADS", 32)
+SERVER_BACKLOG                = _intenv("SERVER_BACKLOG", 64)
+SERVER_STREAMS                = _intenv("SERVER_STREAMS", 64)
+KEEPALIVE_SECS                = _intenv("KEEPALIVE_SECS", 5)
+REQUEST_TIMEOUT_SECS          = _intenv("REQUEST_TIMEOUT_SECS", 30)
+DRAIN_SECS                    = _intenv("DRAIN_SECS", 10)
+JOB_WORKERS                   = _intenv("JOB_WORKERS", 2)
+JOB_HISTORY                   = _intenv("JOB_HISTORY", 20)
+PURGE_THREADS                 = _intenv("PURGE_THREADS", 4)
+PURGE_RATE                    = _intenv("PURGE_RATE", 2000)  # deleted entries per second, 0 = unthrottled
+STORAGE_SCAN_SECS             = _intenv("STORAGE_SCAN_SECS", 60)
+STORAGE_INDEX_FILE            = os.getenv("STORAGE_INDEX_FILE", "").strip()
+RETAIN_MAX_GB                 = _intenv("RETAIN_MAX_GB", 0)           # 0 = no size cap
+RETAIN_MAX_AGE_DAYS           = _intenv("RETAIN_MAX_AGE_DAYS", 0)     # 0 = keep forever
+RETAIN_KEEP_PER_FOLDER        = _intenv("RETAIN_KEEP_PER_FOLDER", 0)  # 0 = no per-folder cap
+RETAIN_INTERVAL_MINS          = _intenv("RETAIN_INTERVAL_MINS", 60)
+RETAIN_SETTLE_SECS            = _intenv("RETAIN_SETTLE_SECS", 300)    # files modified since are never touched
+RETAIN_RATE                   = _intenv("RETAIN_RATE", 200)           # removed files per second, 0 = unthrottled
+THUMB_CACHE_MB                = _intenv("THUMB_CACHE_MB", 512)
+THUMB_WORKERS                 = _intenv("THUMB_WORKERS", 2)
+VIDEO_WORKERS                 = _intenv("VIDEO_WORKERS", 1)
+PORT_SAMPLE_MS                = _intenv("PORT_SAMPLE_MS", 1000)
+EVENT_HEARTBEAT_SECS          = _intenv("EVENT_HEARTBEAT_SECS", 15)
+STOP_GRACE_SECS               = _intenv("STOP_GRACE_SECS", 5)
+STOP_TIMEOUT_SECS             = _intenv("STOP_TIMEOUT_SECS", 15)
+LISTENER_BACKEND              = os.getenv("LISTENER_BACKEND", "auto").strip().lower()  # auto | procfs | psutil
 
 FORCE_FREE_COMFY_PORT         = os.getenv("FORCE_FREE_COMFY_PORT", "1") != "0"
 FORCE_FREE_MINI_PORT          = os.getenv("FORCE_FREE_MINI_PORT", "1") != "0"
@@ -86,6 +125,8 @@ def _csrf():
     if request.method in ("POST", "PUT", "PATCH", "DELETE"):
         if request.path in ("/login", "/activity"):
             return
+        if proxy_bound():  # upstream apps do their own request validation
+            return
         token = request.headers.get("X-CSRF-Token") or request.form.get("csrf_token", "")
         if not token or not hmac.compare_digest(token, CSRF_TOKEN):
             return ("Forbidden", 403)
@@ -95,7 +136,7 @@ RATE_MAX_HITS  = 30
 _rate = {}
 @app.before_request
 def _rate_limit_posts():
-    if request.method != "POST": return
+    if request.method != "POST" or proxy_bound(): return
     ip = request.remote_addr or "?"
     now = time.time()
     q = _rate.setdefault(ip, deque())
@@ -143,7 +184,67 @@ def get_lan_ip() -> str:
     except Exception:
         return "127.0.0.1"
 
-def taskkill_tree(pid: Optional[int]):
+# On POSIX every service starts as the leader of its own session/process
+# group, so stopping it is one killpg() that also reaches reparented workers.
+_service_pgids: Set[int] = set()
+
+def _relay_output(stream, marker: "re.Pattern", hint: threading.Event):
+    # Pass the child's console output through unchanged (raw chunks keep
+    # progress bars intact) while watching for its readiness marker.
+    out = getattr(sys.stdout, "buffer", None)
+    tail = b""
+    try:
+        while True:
+            chunk = os.read(stream.fileno(), 65536)
+            if not chunk: break
+            if out is not None:
+                try: out.write(chunk); out.flush()
+                except Exception: out = None
+            if not hint.is_set():
+                tail = (tail + chunk)[-4096:]
+                if marker.search(tail): hint.set()
+    except OSError:
+        pass
+    finally:
+        stream.close()
+
+def _service_popen(cmd, cwd: str, env=None, shell: bool = False,
+                   marker: Optional["re.Pattern"] = None, hint: Optional[threading.Event] = None) -> subprocess.Popen:
+    extra = {}
+    if marker is not None and hint is not None:
+        env = dict(env or os.environ); env.setdefault("PYTHONUNBUFFERED", "1")
+        extra = {"stdout": subprocess.PIPE, "stderr": subprocess.STDOUT}
+    if platform.system() == "Windows":
+        proc = subprocess.Popen(cmd, shell=shell, cwd=cwd, env=env, **extra)
+    else:
+        if shell and isinstance(cmd, str):
+            cmd = [cmd] if os.access(cmd, os.X_OK) else ["/bin/sh", cmd]
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, start_new_session=True, **extra)
+        _service_pgids.add(proc.pid)
+    if extra:
+        threading.Thread(target=_relay_output, args=(proc.stdout, marker, hint), daemon=True).start()
+    return proc
+
+def _stop_group(pgid: int, proc: Optional[subprocess.Popen] = None, grace: float = STOP_GRACE_SECS):
+    def _alive() -> bool:
+        if proc is not None: proc.poll()  # reap the leader so it does not linger as a zombie
+        try: os.killpg(pgid, 0); return True
+        except ProcessLookupError: return False
+        except PermissionError: return True
+    try: os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError: _service_pgids.discard(pgid); return
+    deadline = time.time() + grace
+    while _alive() and time.time() < deadline: time.sleep(0.05)
+    if _alive():
+        print(f"[WARN] process group {pgid} ignored SIGTERM for {grace}s; sending SIGKILL")
+        try: os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError: pass
+        if proc is not None:
+            try: proc.wait(timeout=2)
+            except subprocess.TimeoutExpired: pass
+    _service_pgids.discard(pgid)
+
+def taskkill_tree(pid: Optional[int], proc: Optional[subprocess.Popen] = None):
     if not pid: return
     try:
         if platform.system() == "Windows":
@@ -154,6 +255,10 @@ def taskkill_tree(pid: Optional[int]):
                 creationflags=subprocess.CREATE_NO_WINDOW
             )
         else:
+            try: pgid = os.getpgid(pid)
+            except ProcessLookupError: return
+            if pgid in _service_pgids and pgid != os.getpgrp():
+                _stop_group(pgid, proc); return
             try:
                 proc = psutil.Process(pid)
             except psutil.NoSuchProcess:
@@ -167,37 +272,193 @@ def taskkill_tree(pid: Optional[int]):
         print(f"[ERROR] taskkill failed for PID {pid}: {e}")
 
 def kill_proc_handle(proc: Optional[subprocess.Popen]):
-    if proc and proc.poll() is None: taskkill_tree(proc.pid)
+    if proc and proc.poll() is None: taskkill_tree(proc.pid, proc)
 
-def comfy_running_by_handle() -> bool:
+def running_by_handle(key: str) -> bool:
     with lock:
-        p = processes.get("comfy")
+        p = processes.get(key)
         return bool(p and p.poll() is None)
 
-def mini_running_by_handle() -> bool:
-    with lock:
-        p = processes.get("mini")
-        return bool(p and p.poll() is None)
+# ================ Shared listener snapshot ================
+# One background sampler takes a single system-wide connection scan per
+# interval; every status/readiness/free-port check reads the indexed result.
+_snap_lock = threading.Lock()
+_snapshot = {"ts": 0.0, "by_port": {}, "by_pid": {}, "unresolved": {}, "ancestors": {}}
+_sampler_started = False
+
+def _ancestor_chains(pids) -> dict:
+    ppid_cache: dict[int, int] = {}
+    chains: dict[int, frozenset] = {}
+    for pid in pids:
+        chain, cur = set(), pid
+        while cur and cur not in chain and len(chain) < 64:
+            chain.add(cur)
+            if cur not in ppid_cache:
+                try: ppid_cache[cur] = psutil.Process(cur).ppid()
+                except (psutil.NoSuchProcess, psutil.AccessDenied): ppid_cache[cur] = 0
+            cur = ppid_cache[cur]
+        chains[pid] = frozenset(chain)
+    return chains
+
+# Linux fast path: LISTEN sockets come straight from /proc/net/tcp{,6} and
+# their inodes are mapped to PIDs through a cached index that is refreshed
+# from the managed process trees only, and only when a listener appeared
+# since the last pass. Listeners owned by anything else stay "unresolved"
+# until a caller actually needs their PIDs (free_port).
+PROCFS = "/proc"
+_inode_lock = threading.Lock()
+_inode_pid: dict[int, int] = {}
+_inode_seen: Set[int] = set()  # listener inodes of the previous pass
+_roots_seen: Set[int] = set()  # managed top-level PIDs of the previous pass
+
+def _use_procfs() -> bool:
+    if LISTENER_BACKEND == "psutil": return False
+    return sys.platform.startswith("linux") and os.path.exists(os.path.join(PROCFS, "net", "tcp"))
+
+def _proc_net_listeners() -> list[tuple[int, int]]:
+    out = []
+    for name in ("tcp", "tcp6"):
+        try: f = open(os.path.join(PROCFS, "net", name), "rb")
+        except OSError: continue
+        with f:
+            f.readline()
+            for line in f:
+                head = line.split(None, 4)
+                if len(head) < 5 or head[3] != b"0A": continue  # 0A == TCP_LISTEN
+                parts = line.split()
+                out.append((int(parts[1].rpartition(b":")[2], 16), int(parts[9])))
+    return out
+
+def _socket_inodes(pid: int) -> Set[int]:
+    inodes: Set[int] = set()
+    try:
+        with os.scandir(os.path.join(PROCFS, str(pid), "fd")) as it:
+            for e in it:
+                try: target = os.readlink(e.path)
+                except OSError: continue
+                if target.startswith("socket:["): inodes.add(int(target[8:-1]))
+    except OSError:
+        pass
+    return inodes
 
-def _inet_conns(p):
-    fn = getattr(p, "net_connections", None)
-    return fn(kind="inet") if fn else p.connections(kind="inet")
+def _proc_children(pid: int) -> Set[int]:
+    kids: Set[int] = set()
+    try:
+        with os.scandir(os.path.join(PROCFS, str(pid), "task")) as it:
+            for t in it:
+                try:
+                    with open(os.path.join(t.path, "children"), "rb") as f: kids.update(int(x) for x in f.read().split())
+                except OSError: continue
+    except OSError:
+        pass
+    return kids
 
-def _listen_ports(proc: psutil.Process) -> Set[int]:
-    ports: Set[int] = set()
+def _managed_pids() -> Set[int]:
+    with lock:
+        todo = [p.pid for p in processes.values() if p and p.poll() is None]
+    seen: Set[int] = set()
+    while todo:
+        pid = todo.pop()
+        if pid in seen: continue
+        seen.add(pid); todo.extend(_proc_children(pid))
+    return seen
+
+def _resolve_inodes(inodes: Set[int]) -> Set[int]:
+    """Cold path: scan every /proc/<pid>/fd until the given socket inodes are found."""
+    found: Set[int] = set(); missing = set(inodes)
     try:
-        for c in _inet_conns(proc):
-            if c.status == psutil.CONN_LISTEN and c.laddr and c.laddr.port:
-                ports.add(c.laddr.port)
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        with os.scandir(PROCFS) as it:
+            for e in it:
+                if not missing: break
+                if not e.name.isdigit(): continue
+                hit = _socket_inodes(int(e.name)) & missing
+                if not hit: continue
+                with _inode_lock:
+                    for inode in hit: _inode_pid[inode] = int(e.name)
+                missing -= hit; found.add(int(e.name))
+    except OSError:
         pass
-    for ch in proc.children(recursive=True):
-        try:
-            for c in _inet_conns(ch):
-                if c.status == psutil.CONN_LISTEN and c.laddr and c.laddr.port:
-                    ports.add(c.laddr.port)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+    return found
+
+def _take_procfs_snapshot(started: float) -> dict:
+    listeners = _proc_net_listeners()
+    live = {inode for _, inode in listeners}
+    global _inode_seen, _roots_seen
+    with lock:
+        roots = {p.pid for p in processes.values() if p and p.poll() is None}
+    with _inode_lock:
+        for inode in [i for i in _inode_pid if i not in live]: del _inode_pid[inode]
+        # Unresolved listeners seen before belong to someone else; rescan only for new ones or a new service.
+        fresh = bool(live - _inode_seen) or roots != _roots_seen
+        _inode_seen, _roots_seen = live, roots
+    if fresh:
+        for pid in _managed_pids():
+            hit = _socket_inodes(pid) & live
+            with _inode_lock:
+                for inode in hit: _inode_pid[inode] = pid
+    by_port: dict[int, set[int]] = {}
+    by_pid: dict[int, set[int]] = {}
+    unresolved: dict[int, set[int]] = {}
+    with _inode_lock:
+        for port, inode in listeners:
+            pids = by_port.setdefault(port, set())
+            pid = _inode_pid.get(inode)
+            if pid:
+                pids.add(pid)
+                by_pid.setdefault(pid, set()).add(port)
+            else:
+                unresolved.setdefault(port, set()).add(inode)
+    return {"ts": started, "by_port": by_port, "by_pid": by_pid, "unresolved": unresolved,
+            "ancestors": _ancestor_chains(by_pid)}
+
+def _take_port_snapshot() -> dict:
+    started = time.time()
+    if _use_procfs():
+        try: return _take_procfs_snapshot(started)
+        except OSError as e: print(f"[WARN] /proc listener scan failed, using psutil: {e}")
+    by_port: dict[int, set[int]] = {}
+    by_pid: dict[int, set[int]] = {}
+    for c in psutil.net_connections(kind="inet"):
+        if c.status != psutil.CONN_LISTEN or not c.laddr or not c.laddr.port: continue
+        pids = by_port.setdefault(c.laddr.port, set())
+        if c.pid:
+            pids.add(c.pid)
+            by_pid.setdefault(c.pid, set()).add(c.laddr.port)
+    return {"ts": started, "by_port": by_port, "by_pid": by_pid, "unresolved": {}, "ancestors": _ancestor_chains(by_pid)}
+
+def refresh_port_snapshot() -> dict:
+    global _snapshot
+    asked = time.time()
+    with _snap_lock:
+        if _snapshot["ts"] >= asked: return _snapshot  # another thread refreshed while we waited
+        try: _snapshot = _take_port_snapshot()
+        except (psutil.AccessDenied, OSError) as e: print(f"[WARN] listener scan failed: {e}")
+        return _snapshot
+
+def port_snapshot(max_age: Optional[float] = None) -> dict:
+    """Shared listener index; refreshed inline only when older than max_age (default: two sample intervals)."""
+    if max_age is None: max_age = 2 * PORT_SAMPLE_MS / 1000.0
+    snap = _snapshot
+    if time.time() - snap["ts"] <= max_age: return snap
+    return refresh_port_snapshot()
+
+def _port_sampler():
+    while True:
+        try: refresh_port_snapshot(); publish_status()
+        except Exception as e: print(f"[WARN] port sampler: {e}")
+        time.sleep(max(PORT_SAMPLE_MS, 50) / 1000.0)
+
+def start_port_sampler():
+    global _sampler_started
+    if _sampler_started: return
+    _sampler_started = True
+    threading.Thread(target=_port_sampler, daemon=True).start()
+
+def _listen_ports(proc: psutil.Process, max_age: Optional[float] = None) -> Set[int]:
+    snap = port_snapshot(max_age)
+    ports: Set[int] = set()
+    for pid, chain in snap["ancestors"].items():
+        if proc.pid in chain: ports |= snap["by_pid"].get(pid, set())
     return ports
 
 def detect_port_for(key: str, preferred: Optional[int]) -> Optional[int]:
@@ -211,106 +472,39 @@ def detect_port_for(key: str, preferred: Optional[int]) -> Optional[int]:
     if preferred and preferred in ports: return preferred
     return sorted(ports)[0]
 
-def pids_listening_on(port: int) -> set[int]:
-    pids = set()
-    for c in psutil.net_connections(kind="inet"):
-        if c.laddr and c.laddr.port == port and c.status == psutil.CONN_LISTEN and c.pid:
-            pids.add(c.pid)
+def pids_listening_on(port: int, max_age: Optional[float] = None) -> set[int]:
+    snap = port_snapshot(max_age)
+    pids = set(snap["by_port"].get(port, ()))
+    if snap["unresolved"].get(port): pids |= _resolve_inodes(snap["unresolved"][port])
     return pids
 
-def is_port_in_use(port: int) -> bool:
-    return bool(pids_listening_on(port))
-
-def free_port(port: int, label: str):
-    pids = pids_listening_on(port)
-    if not pids: return
+def is_port_in_use(port: int, max_age: Optional[float] = None) -> bool:
+    return port in port_snapshot(max_age)["by_port"]
+
+def _tree_procs(pid: int) -> list:
+    try: root = psutil.Process(pid)
+    except psutil.NoSuchProcess: return []
+    try: return [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess: return [root]
+
+def wait_port_released(port: int, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while is_port_in_use(port, max_age=0):
+        if time.time() >= deadline: return False
+        time.sleep(0.1)
+    return True
+
+def free_port(port: int, label: str, timeout: float = STOP_TIMEOUT_SECS) -> bool:
+    pids = pids_listening_on(port, max_age=0)
+    if not pids: return True
     print(f"[WARN] {label}: port {port} busy; terminating PIDs {sorted(pids)} …")
+    procs = [pr for pid in pids for pr in _tree_procs(pid)]
     for pid in list(pids):
         try: taskkill_tree(pid)
         except Exception as e: print(f"[ERROR] kill PID {pid} on port {port}: {e}")
-    time.sleep(1.0)
-
-def launch_comfy() -> bool:
-    if platform.system() != "Windows":
-        print("[WARN] launch_comfy skipped: not running on Windows.")
-        return False
-    if not COMFY_PATH:
-        print("[INFO] Comfy launcher not configured. Skipping start."); return True
-    if not os.path.exists(COMFY_PATH):
-        print(f"[WARN] Comfy launcher not found: {COMFY_PATH}. Skipping."); return True
-    try:
-        if FORCE_FREE_COMFY_PORT and is_port_in_use(COMFY_PORT_DEFAULT):
-            free_port(COMFY_PORT_DEFAULT, "ComfyUI")
-        with lock:
-            print(f"[INFO] Launching ComfyUI: {COMFY_PATH}")
-            processes["comfy"] = subprocess.Popen(COMFY_PATH, shell=True, cwd=os.path.dirname(COMFY_PATH))
-        return True
-    except Exception as e:
-        print(f"[ERROR] Failed to launch ComfyUI: {e}"); return False
-
-def launch_mini() -> bool:
-    if platform.system() != "Windows":
-        print("[WARN] launch_mini skipped: not running on Windows.")
-        return False
-    if not MINI_PATH:
-        print("[INFO] Mini launcher not configured. Skipping start."); return True
-    if not os.path.exists(MINI_PATH):
-        print(f"[WARN] Mini launcher not found: {MINI_PATH}. Skipping."); return True
-    try:
-        if FORCE_FREE_MINI_PORT and is_port_in_use(MINI_PORT_DEFAULT):
-            free_port(MINI_PORT_DEFAULT, "Mini")
-        with lock:
-            print(f"[INFO] Launching ComfyUI Mini: {MINI_PATH}")
-            processes["mini"] = subprocess.Popen(MINI_PATH, shell=True, cwd=os.path.dirname(MINI_PATH))
-        return True
-    except Exception as e:
-        print(f"[ERROR] Failed to launch Mini: {e}"); return False
-
-def wait_for_comfy_ready(timeout_secs: int) -> bool:
-    deadline = time.time() + timeout_secs
-    while time.time() < deadline:
-        if is_port_in_use(COMFY_PORT_DEFAULT):
-            detected_ports["comfy"] = COMFY_PORT_DEFAULT; return True
-        if not comfy_running_by_handle():
-            time.sleep(1); continue
-        with lock: p = processes.get("comfy")
-        try: proc = psutil.Process(p.pid)
-        except Exception: time.sleep(1); continue
-        ports = _listen_ports(proc)
-        if ports:
-            best = COMFY_PORT_DEFAULT if COMFY_PORT_DEFAULT in ports else sorted(ports)[0]
-            detected_ports["comfy"] = best; return True
-        time.sleep(2)
-    return is_port_in_use(COMFY_PORT_DEFAULT)
-
-def gallery_running_by_handle() -> bool:
-    with lock:
-        p = processes.get("gallery")
-        return bool(p and p.poll() is None)
-
-def wait_for_gallery_ready(timeout_secs: int) -> bool:
-    deadline = time.time() + timeout_secs
-    while time.time() < deadline:
-        if is_port_in_use(SMART_GALLERY_PORT_DEFAULT):
-            detected_ports["gallery"] = SMART_GALLERY_PORT_DEFAULT
-            return True
-        if not gallery_running_by_handle():
-            time.sleep(1)
-            continue
-        with lock:
-            p = processes.get("gallery")
-        try:
-            proc = psutil.Process(p.pid)
-        except Exception:
-            time.sleep(1)
-            continue
-        ports = _listen_ports(proc)
-        if ports:
-            best = SMART_GALLERY_PORT_DEFAULT if SMART_GALLERY_PORT_DEFAULT in ports else sorted(ports)[0]
-            detected_ports["gallery"] = best
-            return True
-        time.sleep(2)
-    return is_port_in_use(SMART_GALLERY_PORT_DEFAULT)
+    deadline = time.time() + timeout
+    psutil.wait_procs(procs, timeout=timeout)
+    return wait_port_released(port, max(0.0, deadline - time.time()))
 
 # Helper to patch invalid escape sequences in the Smart Gallery script
 def _patch_invalid_escape_sequences(py_file: str) -> None:
@@ -350,96 +544,261 @@ def _patch_invalid_escape_sequences(py_file: str) -> None:
         except Exception:
             pass
 
-def launch_gallery() -> bool:
+# ===================== Service registry ====================
+# Every managed tool is described as data: launch command, working dir,
+# port, readiness timeout and the services it depends on. Launching,
+# readiness, status and stop are generic over this table, so adding a tool
+# means adding an entry here.
+def _prepare_gallery(svc: dict) -> None:
     """
-    Launch the Smart Gallery process if configured.
-
-    On Windows the Smart Gallery script may embed absolute Windows paths in
-    string literals without escaping backslashes, which triggers
-    `SyntaxWarning: invalid escape sequence` under Python 3.12+. To avoid
-    this, the Smart Gallery file is patched immediately before launch to
-    convert assignments like `BASE_OUTPUT_PATH = 'C:\\foo'` to raw strings
-    (`BASE_OUTPUT_PATH = r'C\\foo'`). If the patch fails or the file is
-    missing, the original script is used as-is.
-
-    Additionally, the `PYTHONWARNINGS` environment variable is set to
-    ignore `SyntaxWarning` for the Smart Gallery process to suppress any
-    remaining warnings. This environment variable only applies to the child
-    process.
+    Some Smart Gallery distributions embed absolute Windows paths in string
+    literals without escaping backslashes, which triggers
+    `SyntaxWarning: invalid escape sequence` under Python 3.12+. Patch the
+    script to raw strings right before launch; the service entry also sets
+    `PYTHONWARNINGS` for the child so remaining warnings stay quiet.
     """
-    if platform.system() != "Windows":
-        print("[WARN] launch_gallery skipped: not running on Windows.")
-        return False
-    if not SMART_GALLERY_PATH:
-        print("[INFO] Smart Gallery launcher not configured. Skipping start"); return True
-    if not os.path.exists(SMART_GALLERY_PATH):
-        print(f"[WARN] Smart Gallery script not found: {SMART_GALLERY_PATH}. Skipping."); return True
-
-    # Patch the Smart Gallery script to escape backslashes in string literals
-    _patch_invalid_escape_sequences(SMART_GALLERY_PATH)
-
+    _patch_invalid_escape_sequences(svc["path"])
+
+SERVICES = {
+    "comfy": {
+        "label": "ComfyUI", "path": COMFY_PATH, "port": COMFY_PORT_DEFAULT,
+        "force_free": FORCE_FREE_COMFY_PORT, "ready_timeout": WAIT_FOR_COMFY_SECS,
+        "probe_path": "/system_stats", "ready_marker": rb"To see the GUI go to",
+        "shell": True, "depends_on": (),
+    },
+    "mini": {
+        "label": "Mini", "path": MINI_PATH, "port": MINI_PORT_DEFAULT,
+        "force_free": FORCE_FREE_MINI_PORT, "ready_timeout": WAIT_FOR_MINI_SECS,
+        "probe_path": "/",
+        "shell": True, "depends_on": ("comfy",),
+    },
+    "gallery": {
+        "label": "Smart Gallery", "path": SMART_GALLERY_PATH, "port": SMART_GALLERY_PORT_DEFAULT,
+        "force_free": FORCE_FREE_SMART_GALLERY_PORT, "ready_timeout": WAIT_FOR_GALLERY_SECS,
+        "probe_path": "/", "ready_marker": rb"Running on http",
+        "cmd": lambda svc: [sys.executable, "-u", svc["path"]],  # same interpreter/console
+        "env": {"PYTHONWARNINGS": "ignore::SyntaxWarning"},
+        "prepare": _prepare_gallery, "depends_on": (),
+    },
+}
+_ready_hints: dict[str, threading.Event] = {}
+for _key, _svc in SERVICES.items():
+    processes.setdefault(_key, None); detected_ports.setdefault(_key, None)
+    _ready_hints[_key] = threading.Event()
+    if _svc.get("ready_marker"): _svc["ready_marker"] = re.compile(_svc["ready_marker"])
+
+def service_up(key: str) -> bool:
+    return running_by_handle(key) or is_port_in_use(SERVICES[key]["port"])
+
+def launch_service(key: str) -> bool:
+    svc = SERVICES[key]; label, path = svc["label"], svc["path"]
+    if not path:
+        print(f"[INFO] {label} launcher not configured. Skipping start."); return True
+    if not os.path.exists(path):
+        print(f"[WARN] {label} launcher not found: {path}. Skipping."); return True
+    if svc.get("prepare"): svc["prepare"](svc)
     try:
-        if FORCE_FREE_SMART_GALLERY_PORT and is_port_in_use(SMART_GALLERY_PORT_DEFAULT):
-            free_port(SMART_GALLERY_PORT_DEFAULT, "Smart Gallery")
-        exe = sys.executable  # use same interpreter/console
-        print(f"[INFO] Launching Smart Gallery: {SMART_GALLERY_PATH}")
-        # Prepare environment for the child process; suppress SyntaxWarning
-        env = os.environ.copy()
-        env.setdefault('PYTHONWARNINGS', 'ignore::SyntaxWarning')
+        if svc["force_free"] and is_port_in_use(svc["port"]):
+            free_port(svc["port"], label)
+        env = None
+        if svc.get("env"):
+            env = os.environ.copy()
+            for k, v in svc["env"].items(): env.setdefault(k, v)
+        cmd = svc["cmd"](svc) if svc.get("cmd") else path
+        _ready_hints[key].clear()
         with lock:
-            processes["gallery"] = subprocess.Popen(
-                [exe, "-u", SMART_GALLERY_PATH],
-                cwd=os.path.dirname(SMART_GALLERY_PATH),
-                env=env,
-            )
+            print(f"[INFO] Launching {label}: {path}")
+            processes[key] = _service_popen(cmd, shell=svc.get("shell", False), cwd=os.path.dirname(path), env=env,
+                                            marker=svc.get("ready_marker"), hint=_ready_hints[key])
         return True
     except Exception as e:
-        print(f"[ERROR] Failed to launch Smart Gallery: {e}")
+        print(f"[ERROR] Failed to launch {label}: {e}"); return False
+
+# ===================== Readiness probes ====================
+# A service is ready when its HTTP probe answers (or, without a probe path,
+# when its port accepts TCP). Probing starts fast and backs off
+# exponentially; a readiness line on the child's console wakes it early and
+# restarts the backoff from the minimum.
+def _tcp_probe(host: str, port: int, timeout: float = 0.5) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout): return True
+    except OSError:
         return False
 
-    # Note: Any fallback logic to probe ComfyUI ports is removed from launch_gallery.
-    # The function returns above on success or failure.
+def _http_probe(host: str, port: int, path: str, timeout: float = 2.0) -> bool:
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("GET", path, headers={"Connection": "close"})
+        return conn.getresponse().status < 500
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+def probe_service(key: str, port: int) -> bool:
+    path = SERVICES[key].get("probe_path")
+    for host in ("127.0.0.1", get_lan_ip()):
+        if _tcp_probe(host, port):
+            return _http_probe(host, port, path) if path else True
+    return False
+
+def _candidate_ports(key: str) -> list:
+    default = SERVICES[key]["port"]
+    ports = [default]
+    with lock: p = processes.get(key)
+    if p and p.poll() is None:
+        try: ports += sorted(_listen_ports(psutil.Process(p.pid)) - {default})
+        except psutil.NoSuchProcess: pass
+    return ports
 
-def launch_both():
-    if not launch_comfy(): return
-    def _start_mini_when_ready():
-        print(f"[INFO] Waiting for ComfyUI to expose a port (<= {WAIT_FOR_COMFY_SECS}s)…")
-        if wait_for_comfy_ready(WAIT_FOR_COMFY_SECS):
-            print(f"[INFO] ComfyUI ready on port {detected_ports.get('comfy', COMFY_PORT_DEFAULT)} — starting Mini.")
-            launch_mini()
-        else:
-            if is_port_in_use(COMFY_PORT_DEFAULT) or comfy_running_by_handle():
-                print(f"[WARN] Probe inconclusive; launching Mini in {FALLBACK_MINI_DELAY_SECS}s…")
-                time.sleep(FALLBACK_MINI_DELAY_SECS); launch_mini()
+def wait_for_ready(key: str, timeout_secs: float) -> bool:
+    svc = SERVICES[key]; hint = _ready_hints[key]
+    deadline = time.time() + timeout_secs
+    delay = READY_PROBE_MIN_MS / 1000.0
+    marked = False
+    while True:
+        for port in _candidate_ports(key):
+            if probe_service(key, port):
+                detected_ports[key] = port; return True
+        with lock: p = processes.get(key)
+        if p is None or p.poll() is not None:
+            if not is_port_in_use(svc["port"]): return False  # not launched, or exited during startup
+        remaining = deadline - time.time()
+        if remaining <= 0: return False
+        if hint.is_set() and not marked:  # marker seen: the server is about to answer, back off again from the minimum
+            marked, delay = True, READY_PROBE_MIN_MS / 1000.0
+        if marked: time.sleep(min(delay, remaining))
+        else: hint.wait(min(delay, remaining))
+        delay = min(delay * 2, READY_PROBE_MAX_MS / 1000.0)
+
+# ===================== Startup scheduler ===================
+startup_timings: dict[str, dict] = {}
+
+# At most one launch + readiness wait per service runs at a time. Starts that
+# only want the service up join the flight in progress and are released
+# together when it ends; a forced (re)start queues behind it instead of
+# free_port()-killing the instance that is still booting.
+_flight_lock = threading.Lock()
+_flights: dict[str, dict] = {}
+_pending: dict[str, int] = {}  # start_services() runs per service, including ones still waiting on dependencies
+
+def _launch_and_wait(key: str, only_missing: bool) -> dict:
+    svc = SERVICES[key]; t1 = time.time()
+    if not (only_missing and service_up(key)):
+        if not launch_service(key): return {"ok": False, "launch": time.time() - t1, "ready": 0.0}
+    t2 = time.time()
+    ok = wait_for_ready(key, svc["ready_timeout"])
+    return {"ok": ok, "launch": t2 - t1, "ready": time.time() - t2}
+
+def start_once(key: str, only_missing: bool = True) -> dict:
+    """Launch `key` and wait until it is ready, or join the start already in flight."""
+    while True:
+        with _flight_lock:
+            flight = _flights.get(key)
+            if flight is None:
+                flight = _flights[key] = {"done": threading.Event(), "result": None}
+                break
+        flight["done"].wait()
+        if only_missing and flight["result"] is not None:
+            return {**flight["result"], "joined": True}
+    try:
+        flight["result"] = _launch_and_wait(key, only_missing)
+    finally:
+        with _flight_lock: del _flights[key]
+        flight["done"].set()
+    return flight["result"]
+
+def _with_dependencies(keys) -> list:
+    order, seen = [], set()
+    def _visit(k):
+        if k in seen: return
+        seen.add(k)
+        for dep in SERVICES[k].get("depends_on", ()): _visit(dep)
+        order.append(k)
+    for k in keys: _visit(k)
+    return order
+
+def start_services(keys=None, only_missing: bool = False, block: bool = False, if_idle: bool = False) -> dict:
+    """
+    Start the given services plus their dependencies. Each service launches
+    as soon as everything it depends on is ready (or at least running), and
+    per-phase timings land in `startup_timings`. With `only_missing`,
+    services that are already up are only waited on, not relaunched.
+    Concurrent calls share each service's start (see `start_once`). With
+    `if_idle`, nothing is started when any requested service already has a
+    start underway, even one still waiting on its dependencies.
+    """
+    wanted = keys or list(SERVICES)
+    keys = _with_dependencies(wanted)
+    with _flight_lock:
+        if if_idle and any(k in _flights or k in _pending for k in wanted): return {}
+        for k in keys: _pending[k] = _pending.get(k, 0) + 1
+    done = {k: threading.Event() for k in keys}
+    ready: dict[str, bool] = {}
+    def _run(key):
+        svc = SERVICES[key]; t0 = time.time()
+        timing = {"deps": 0.0, "launch": 0.0, "ready": 0.0}
+        try:
+            for dep in svc.get("depends_on", ()):
+                done[dep].wait()
+                if not (ready.get(dep) or service_up(dep)):
+                    print(f"[WARN] Skipping {svc['label']}: {SERVICES[dep]['label']} is not running.")
+                    ready[key] = False; return
+            timing["deps"] = time.time() - t0
+            t1 = time.time()
+            result = start_once(key, only_missing)
+            ready[key] = result["ok"]
+            if result.get("joined"): timing["joined"] = time.time() - t1
+            else: timing["launch"], timing["ready"] = result["launch"], result["ready"]
+        except Exception as e:
+            print(f"[ERROR] Starting {svc['label']}: {e}"); ready[key] = False
+        finally:
+            timing["total"] = time.time() - t0; timing["ok"] = bool(ready.get(key))
+            state = 'ready' if timing['ok'] else 'not ready'
+            if "joined" in timing:  # the leading start already logged and recorded its timings
+                print(f"[INFO] {svc['label']} {state}: joined the start in progress for {timing['joined']:.1f}s")
             else:
-                print("[WARN] Skipping Mini: ComfyUI stopped during wait.")
-    threading.Thread(target=_start_mini_when_ready, daemon=True).start()
-def launch_all():
-    # Launch Comfy + Mini using existing logic
-    launch_both()
-    # Start Gallery in parallel
-    threading.Thread(target=lambda: (launch_gallery(), wait_for_gallery_ready(WAIT_FOR_GALLERY_SECS)), daemon=True).start()
+                startup_timings[key] = timing
+                print(f"[INFO] {svc['label']} {state} after {timing['total']:.1f}s "
+                      f"(deps {timing['deps']:.1f}s, launch {timing['launch']:.1f}s, ready {timing['ready']:.1f}s)")
+            with _flight_lock:
+                _pending[key] -= 1
+                if not _pending[key]: del _pending[key]
+            done[key].set()
+    workers = [threading.Thread(target=_run, args=(k,), daemon=True) for k in keys]
+    for t in workers: t.start()
+    if block:
+        for t in workers: t.join()
+    return ready
 
+def launch_all():
+    start_services()
 
-def ensure_mini():
-    need_comfy = not (is_port_in_use(COMFY_PORT_DEFAULT) or comfy_running_by_handle())
-    if need_comfy:
-        launch_comfy()
-        wait_for_comfy_ready(WAIT_FOR_COMFY_SECS)
-    if not (is_port_in_use(MINI_PORT_DEFAULT) or mini_running_by_handle()):
-        launch_mini()
-
-def stop_all():
+def _stop_service(key: str, port: int, label: str, timeout: float) -> float:
+    started = time.time()
     with lock:
-        print("[INFO] Stopping Mini (if running)…");     kill_proc_handle(processes.get("mini"));     processes["mini"] = None
-        print("[INFO] Stopping ComfyUI (if running)…");  kill_proc_handle(processes.get("comfy"));    processes["comfy"] = None
-        print("[INFO] Stopping Gallery (if running)…");  kill_proc_handle(processes.get("gallery"));  processes["gallery"] = None
-    try:
-        free_port(MINI_PORT_DEFAULT, "Mini")
-        free_port(COMFY_PORT_DEFAULT, "ComfyUI")
-        free_port(SMART_GALLERY_PORT_DEFAULT, "Smart Gallery")
-    except Exception as e:
-        print(f"[WARN] free_port during stop_all: {e}")
+        p = processes.get(key); processes[key] = None
+    if p and p.poll() is None:
+        print(f"[INFO] Stopping {label}…")
+        procs = _tree_procs(p.pid)
+        kill_proc_handle(p)
+        psutil.wait_procs(procs, timeout=max(0.0, started + timeout - time.time()))
+    if not free_port(port, label, timeout=max(0.0, started + timeout - time.time())):
+        print(f"[WARN] {label}: port {port} still busy after {timeout}s")
+    return time.time() - started
+
+def stop_all(timeout: float = STOP_TIMEOUT_SECS) -> dict:
+    """Stop every service in parallel; returns seconds each one took to exit and release its port."""
+    services = [(key, svc["port"], svc["label"]) for key, svc in SERVICES.items()]
+    timings: dict[str, float] = {}
+    def _run(key, port, label):
+        try: timings[key] = _stop_service(key, port, label, timeout)
+        except Exception as e: print(f"[WARN] stopping {label}: {e}")
+    workers = [threading.Thread(target=_run, args=svc, daemon=True) for svc in services]
+    for t in workers: t.start()
+    for t in workers: t.join()
+    print("[INFO] Stop timings: " + ", ".join(f"{label} {timings.get(key, float('nan')):.2f}s" for key, _, label in services))
+    return timings
 
 def kill_other_controller_instances():
     this_pid = os.getpid()
@@ -459,6 +818,1105 @@ def kill_other_controller_instances():
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             continue
 
+# ===================== Status stream (SSE) ==================
+# The sampler publishes a new version only when the combined status changes;
+# /events subscribers block on the condition instead of polling. Job updates
+# ride the same stream as `event: job`, kept in a short sequence-numbered log.
+_status_cond = threading.Condition()
+_status_state = {"version": 0, "data": None, "job_seq": 0, "storage_version": 0, "storage": None}
+_job_events: deque = deque(maxlen=64)
+
+def collect_status() -> dict:
+    out = {"mode_hidden": is_hidden_mode(), "lan_ip": get_lan_ip(), "flask_port": FLASK_PORT}
+    for key, svc in SERVICES.items():
+        default = svc["port"]
+        alive = running_by_handle(key)
+        if not alive and is_port_in_use(default):
+            alive = True; detected_ports[key] = default
+        if alive:
+            port = detect_port_for(key, default)
+            if port: detected_ports[key] = port
+        out[key] = alive
+        out[f"{key}_port"] = detected_ports.get(key) or (default if is_port_in_use(default) else None)
+    return out
+
+def publish_status() -> dict:
+    data = collect_status()
+    with _status_cond:
+        if data != _status_state["data"]:
+            _status_state["data"] = data
+            _status_state["version"] += 1
+            _status_cond.notify_all()
+    return data
+
+def publish_job(snapshot: dict):
+    with _status_cond:
+        _status_state["job_seq"] += 1
+        _job_events.append((_status_state["job_seq"], snapshot))
+        _status_cond.notify_all()
+
+def publish_storage(summary: dict):
+    with _status_cond:
+        _status_state["storage"] = summary
+        _status_state["storage_version"] += 1
+        _status_cond.notify_all()
+
+def _status_events():
+    version = storage_version = None
+    with _status_cond: job_seq = _status_state["job_seq"]
+    yield "retry: 3000\n\n" + "".join(f"event: job\ndata: {json.dumps(j)}\n\n" for j in active_jobs())
+    while True:
+        with _status_cond:
+            _status_cond.wait_for(lambda: _status_state["version"] != version or _status_state["job_seq"] != job_seq
+                                  or _status_state["storage_version"] != storage_version,
+                                  timeout=EVENT_HEARTBEAT_SECS)
+            changed = _status_state["version"] != version
+            version, data = _status_state["version"], _status_state["data"]
+            jobs = [j for seq, j in _job_events if seq > job_seq]
+            job_seq = _status_state["job_seq"]
+            storage_changed = _status_state["storage_version"] != storage_version
+            storage_version, storage = _status_state["storage_version"], _status_state["storage"]
+        out = "".join(f"event: job\ndata: {json.dumps(j)}\n\n" for j in jobs)
+        if changed and data is not None:
+            out += f"event: status\ndata: {json.dumps(data)}\n\n"
+        if storage_changed and storage is not None:
+            out += f"event: storage\ndata: {json.dumps(storage)}\n\n"
+        yield out or ": ping\n\n"
+
+# ========================= Jobs ===========================
+# Long actions (restart, stop, shutdown, relaunch, delete) run as jobs: the
+# route answers at once with the job and a small executor does the work. Jobs
+# of one group run in submission order, and submitting a kind that is already
+# queued or running returns that job. Every phase change (and progress, at
+# most four times a second) is published on /events and readable at
+# /jobs/<id>. Cancelling is cooperative and only offered while it is safe.
+from concurrent.futures import ThreadPoolExecutor
+
+BOOT_ID = os.urandom(8).hex()  # lets a page tell a relaunched controller from this one
+_FINISHED = ("done", "failed", "cancelled")
+_jobs: dict = {}
+_job_groups: dict[str, deque] = {}
+_jobs_lock = threading.Lock()
+_job_pool = ThreadPoolExecutor(max_workers=max(1, JOB_WORKERS), thread_name_prefix="job")
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, kind: str, label: str, fn, group: str, cancellable: bool):
+        self.id = os.urandom(6).hex()
+        self.kind, self.label, self.fn, self.group = kind, label, fn, group
+        self.state, self.phase = "queued", "Queued"
+        self.done = self.total = 0
+        self.cancellable, self.cancel_requested = cancellable, False
+        self.result = self.error = None
+        self.after_finish = None  # runs once the final state is published (e.g. exit the process)
+        self.created, self.started, self.finished = time.time(), None, None
+        self._published, self._dirty = 0.0, False
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id, "kind": self.kind, "label": self.label, "state": self.state, "phase": self.phase,
+            "done": self.done, "total": self.total,
+            "progress": round(min(1.0, self.done / self.total), 3) if self.total else None,
+            "cancellable": self.cancellable and not self.cancel_requested and self.state not in _FINISHED,
+            "result": self.result, "error": self.error, "boot": BOOT_ID,
+            "created": self.created, "started": self.started, "finished": self.finished,
+        }
+
+    def update(self, phase: Optional[str] = None, done: Optional[int] = None, total: Optional[int] = None,
+               cancellable: Optional[bool] = None):
+        if phase is not None: self.phase = phase
+        if total is not None: self.total = total
+        if done is not None and done != self.done: self.done, self._dirty = done, True
+        if cancellable is not None: self.cancellable = cancellable
+        now = time.monotonic()
+        if phase is not None or cancellable is not None or (self._dirty and now - self._published >= 0.25):
+            self._published, self._dirty = now, False
+            publish_job(self.snapshot())
+
+    def check_cancelled(self):
+        if self.cancel_requested and self.cancellable: raise JobCancelled()
+
+def _prune_jobs():
+    finished = [j for j in _jobs.values() if j.state in _FINISHED]
+    for j in finished[:max(0, len(finished) - JOB_HISTORY)]: del _jobs[j.id]
+
+def submit_job(kind: str, label: str, fn, group: str = "services", cancellable: bool = False) -> Job:
+    with _jobs_lock:
+        for j in _job_groups.get(group, ()):
+            if j.kind == kind and j.state not in _FINISHED and not j.cancel_requested: return j
+        job = Job(kind, label, fn, group, cancellable)
+        _jobs[job.id] = job
+        queue_ = _job_groups.setdefault(group, deque())
+        queue_.append(job)
+        first = len(queue_) == 1
+        _prune_jobs()
+    publish_job(job.snapshot())
+    if first: _job_pool.submit(_run_job, job)
+    return job
+
+def _run_job(job: Job):
+    if job.state == "queued":  # may already have been cancelled while waiting
+        job.started = time.time()
+        try:
+            job.state = "running"
+            job.update(phase="Starting")
+            job.result = job.fn(job)
+            job.state = "done"; job.phase = "Done"
+        except JobCancelled:
+            job.state = "cancelled"; job.phase = "Cancelled"
+        except Exception as e:
+            job.state, job.error = "failed", str(e)
+            print(f"[ERROR] job {job.kind}: {e}")
+        job.finished = time.time()
+        publish_job(job.snapshot())
+    with _jobs_lock:
+        queue_ = _job_groups[job.group]
+        queue_.popleft()
+        nxt = queue_[0] if queue_ else None
+    if nxt: _job_pool.submit(_run_job, nxt)
+    if job.after_finish and job.state == "done": job.after_finish()
+
+def cancel_job(job_id: str) -> Optional[Job]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job.state in _FINISHED or not job.cancellable: return job
+        job.cancel_requested = True
+        if job.state == "queued":
+            job.state, job.phase, job.finished = "cancelled", "Cancelled", time.time()
+    job.update(phase=job.phase if job.state == "cancelled" else "Cancelling")
+    return job
+
+def active_jobs() -> list:
+    with _jobs_lock: return [j.snapshot() for j in _jobs.values() if j.state not in _FINISHED]
+
+def exit_controller():
+    time.sleep(0.5)  # let the final job event reach the open dashboards
+    drain_server()
+    os._exit(0)
+
+def _job_stop(job: Job):
+    job.update(phase="Stopping services")
+    return stop_all()
+
+def _job_restart(job: Job):
+    job.update(phase="Stopping services", total=1 + len(SERVICES))
+    stop_all()
+    job.update(done=1)
+    job.check_cancelled()  # cancelling before the relaunch leaves everything stopped
+    job.update(phase="Starting services", cancellable=False)
+    ready = start_services()
+    while len(ready) < len(SERVICES):
+        time.sleep(0.25)
+        job.update(done=1 + len(ready))
+    job.update(done=job.total)
+    return {SERVICES[k]["label"]: bool(ok) for k, ok in ready.items()}
+
+def _job_shutdown(job: Job):
+    job.update(phase="Stopping services")
+    stop_all()
+    job.update(phase="Closing other controllers")
+    kill_other_controller_instances()
+    job.after_finish = exit_controller
+
+def _job_relaunch(hidden: bool):
+    def run(job: Job):
+        job.update(phase="Stopping services")
+        stop_all()
+        job.update(phase="Starting the new controller")
+        if not (relaunch_hidden_core() if hidden else relaunch_visible_core_autostart()):
+            raise RuntimeError("could not start the new controller")
+        job.after_finish = exit_controller
+        return {"mode": "hidden" if hidden else "visible"}
+    return run
+
+# Delete renames the output folder into a trash folder next to it (same
+# filesystem, so the rename is atomic and instant) and recreates it empty;
+# ComfyUI can write again right away. A separate "purge" job then empties the
+# trash with PURGE_THREADS scandir workers, throttled to PURGE_RATE entries/s
+# so the disk stays responsive. Cancelling a purge leaves the rest in the
+# trash; it is picked up by the next delete or the next start. When the
+# rename cannot work (DELETE_PATH is a mount point or drive root, or the
+# trash would land on another device) the delete job purges in place instead.
+def trash_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(DELETE_PATH)), ".pocketcomfy-trash")
+
+def _usable_trash() -> tuple[Optional[str], str]:
+    """(trash dir, "") when DELETE_PATH can be renamed into it, else (None, why not)."""
+    if os.path.ismount(DELETE_PATH): return None, "the output folder is a mount point or drive root"
+    trash = trash_dir()
+    try:
+        os.makedirs(trash, exist_ok=True)
+        if os.stat(trash).st_dev != os.stat(DELETE_PATH).st_dev: return None, "the trash folder is on another device"
+    except OSError as e:
+        return None, f"cannot create the trash folder: {e.strerror or e}"
+    return trash, ""
+
+def _busy(e: OSError) -> bool:
+    # Windows refuses the rename while a file inside is open (access denied / sharing violation); usually brief.
+    return e.errno == errno.EBUSY or getattr(e, "winerror", None) in (5, 32)
+
+def _job_delete(job: Job):
+    job.update(phase="Moving to trash")
+    if os.path.isdir(DELETE_PATH):
+        trash, why = _usable_trash()
+        if trash:
+            name = os.path.basename(os.path.normpath(DELETE_PATH))
+            dest = os.path.join(trash, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}")
+            for attempt in range(3):
+                try:
+                    os.rename(DELETE_PATH, dest); break
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        trash, why = None, "the trash folder is on another device"; break
+                    if not _busy(e): raise RuntimeError(f"cannot move the output folder to the trash: {e.strerror or e}")
+                    if attempt == 2: raise RuntimeError(f"output folder is busy: {e.strerror or e}")
+                    time.sleep(0.2)
+        if trash is None:
+            print(f"[INFO] Deleting outputs in place: {why}")
+            _purge_in_place(job)
+            _storage_wake.set()
+            return
+    os.makedirs(DELETE_PATH, exist_ok=True)
+    _storage_wake.set()
+    submit_job("purge", "Purge deleted outputs", _job_purge, group="purge", cancellable=True)
+
+class _RateLimiter:
+    def __init__(self, rate: int, burst: float = 0.1):
+        self.rate, self.burst = rate, burst
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, n: int):
+        if self.rate <= 0: return
+        with self.lock:
+            now = time.monotonic()
+            self.next = max(self.next, now - self.burst) + n / self.rate
+            delay = self.next - now
+        if delay > 0: time.sleep(delay)
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except PermissionError:  # read-only attribute on Windows
+        try: os.chmod(path, 0o600); os.remove(path)
+        except OSError: pass
+    except OSError:
+        pass
+
+def _count_tree(root: str, job: Job) -> int:
+    count, stack = 1, [root]
+    while stack:
+        job.check_cancelled()
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    count += 1
+                    if entry.is_dir(follow_symlinks=False): stack.append(entry.path)
+        except OSError:
+            pass
+    return count
+
+def _purge_trees(roots: list, job: Job, limiter: _RateLimiter):
+    work: queue.Queue = queue.Queue()
+    dirs, lock = [], threading.Lock()
+    for root in roots: work.put(root); dirs.append(root)
+    def worker():
+        while True:
+            path = work.get()
+            if path is None: return
+            removed = 0
+            try:
+                if not job.cancel_requested:
+                    with os.scandir(path) as it:
+                        for entry in it:
+                            if job.cancel_requested: break
+                            if entry.is_dir(follow_symlinks=False):
+                                with lock: dirs.append(entry.path)
+                                work.put(entry.path)
+                                continue
+                            _remove_file(entry.path); removed += 1
+                            if removed % 32 == 0:
+                                limiter.wait(32)
+                                with lock: job.update(done=job.done + 32)
+            except OSError:
+                pass
+            finally:
+                with lock: job.update(done=job.done + removed % 32)
+                work.task_done()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, PURGE_THREADS))]
+    for t in threads: t.start()
+    work.join()
+    for _ in threads: work.put(None)
+    job.check_cancelled()
+    for path in sorted(dirs, key=lambda d: d.count(os.sep), reverse=True):  # children before parents
+        try:
+            if os.path.islink(path): os.remove(path)
+            else: os.rmdir(path)
+        except OSError:
+            pass
+        job.update(done=job.done + 1)
+
+def _job_purge(job: Job):
+    trash, limiter = trash_dir(), _RateLimiter(PURGE_RATE)
+    while True:  # a delete made while purging adds a batch; keep going until the trash is empty
+        try:
+            with os.scandir(trash) as it: batches = [e for e in it]
+        except FileNotFoundError:
+            batches = []
+        if not batches: break
+        for e in batches:
+            if not e.is_dir(follow_symlinks=False): _remove_file(e.path)
+        batches = [e.path for e in batches if e.is_dir(follow_symlinks=False)]
+        if not batches: continue
+        job.update(phase="Counting")
+        total = job.done + sum(_count_tree(b, job) for b in batches)
+        job.update(phase="Purging", total=total)
+        _purge_trees(batches, job, limiter)
+    try: os.rmdir(trash)
+    except OSError: pass
+
+def _purge_in_place(job: Job):
+    """Empty DELETE_PATH itself, keeping the folder; only what is there when it starts is removed."""
+    limiter = _RateLimiter(PURGE_RATE)
+    job.update(phase="Counting")
+    with os.scandir(DELETE_PATH) as it: entries = list(it)
+    dirs = [e.path for e in entries if e.is_dir(follow_symlinks=False)]
+    total = sum(_count_tree(d, job) for d in dirs) + len(entries) - len(dirs)
+    job.update(phase="Deleting in place", total=total)
+    for e in entries:
+        if e.is_dir(follow_symlinks=False): continue
+        job.check_cancelled()
+        _remove_file(e.path); limiter.wait(1)
+        job.update(done=job.done + 1)
+    _purge_trees(dirs, job, limiter)
+
+def resume_purge():
+    """Finish a purge that was cancelled or cut short by a restart."""
+    if DELETE_PATH and os.path.isdir(trash_dir()):
+        submit_job("purge", "Purge deleted outputs", _job_purge, group="purge", cancellable=True)
+
+def _job_recreate(job: Job):
+    job.update(phase="Creating folder")
+    os.makedirs(DELETE_PATH, exist_ok=True)
+
+# ================= Output storage index ===================
+# A background indexer keeps per-directory file counts and byte totals for
+# DELETE_PATH. Each pass stats every directory once and lists only those whose
+# mtime changed; a directory touched in the last two seconds, or holding a
+# file modified in them, is listed again next pass, since files in it may
+# still be growing. The index is saved to STORAGE_INDEX_FILE, so a restart
+# picks up where it left off instead of walking the whole tree. /storage and
+# `event: storage` serve the summary.
+STORAGE_GROWTH_WINDOW = 3600
+_storage_lock = threading.Lock()
+_storage_wake = threading.Event()
+_storage = {"root": None, "dirs": {}, "history": []}
+_storage_started = False
+
+def storage_index_file() -> str:
+    return STORAGE_INDEX_FILE or os.path.join(os.path.dirname(SCRIPT_PATH), ".pocketcomfy-cache", "storage-index.json")
+
+def _scan_dir(path: str) -> dict:
+    files = size = newest = 0; subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False): subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    files += 1; size += st.st_size; newest = max(newest, st.st_mtime_ns)
+            except OSError:
+                pass
+    return {"files": files, "bytes": size, "subdirs": subdirs, "newest": newest}
+
+def _index_pass(root: str, old: dict, scan=_scan_dir) -> tuple[dict, int]:
+    """One incremental pass over `root`; returns (index, directories listed)."""
+    index, listed, stack = {}, 0, [""]
+    settled = time.time_ns() - 2_000_000_000
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(root, rel) if rel else root
+        try: mtime = os.stat(path).st_mtime_ns
+        except OSError: continue
+        entry = old.get(rel)
+        if entry is None or entry["mtime"] != mtime:
+            try: entry = scan(path)
+            except OSError: continue
+            # A file still being written (a video render) grows without touching the directory's mtime.
+            quiet = mtime < settled and entry.pop("newest") < settled
+            entry["mtime"] = mtime if quiet else 0
+            listed += 1
+        index[rel] = entry
+        stack.extend(os.path.join(rel, d) if rel else d for d in entry["subdirs"])
+    return index, listed
+
+def _storage_summary(root: str, index: dict, history: list) -> dict:
+    top: dict[str, list] = {}
+    for rel, entry in index.items():
+        if not rel: continue
+        t = top.setdefault(rel.split(os.sep, 1)[0], [0, 0])
+        t[0] += entry["files"]; t[1] += entry["bytes"]
+    here = index.get("", {"files": 0, "bytes": 0})
+    growth = None
+    if len(history) > 1 and history[-1][0] - history[0][0] >= 60:
+        # Only increases count, so a delete or purge does not read as negative growth.
+        added = sum(max(0, b[1] - a[1]) for a, b in zip(history, history[1:]))
+        growth = round(added * 3600 / (history[-1][0] - history[0][0]))
+    return {
+        "root": root, "exists": bool(index),
+        "files": sum(e["files"] for e in index.values()),
+        "bytes": sum(e["bytes"] for e in index.values()),
+        "dirs": max(0, len(index) - 1),
+        "growth_bytes_per_hour": growth,
+        "top": sorted(({"name": n, "files": f, "bytes": b} for n, (f, b) in top.items()),
+                      key=lambda d: d["bytes"], reverse=True)[:10],
+        "root_files": here["files"], "root_bytes": here["bytes"],
+    }
+
+def _load_storage_index():
+    try:
+        with open(storage_index_file(), "r", encoding="utf-8") as f: saved = json.load(f)
+        if saved.get("version") != 1: return
+        dirs = {rel: {"mtime": m, "files": n, "bytes": b, "subdirs": sub} for rel, (m, n, b, sub) in saved["dirs"].items()}
+        with _storage_lock:
+            _storage.update(root=saved["root"], dirs=dirs, history=saved.get("history", []))
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+def _save_storage_index():
+    with _storage_lock:
+        saved = {"version": 1, "root": _storage["root"], "history": _storage["history"],
+                 "dirs": {rel: [e["mtime"], e["files"], e["bytes"], e["subdirs"]] for rel, e in _storage["dirs"].items()}}
+    path = storage_index_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, json.dumps(saved, separators=(",", ":")).encode("utf-8"))
+
+def storage_pass() -> dict:
+    root = os.path.abspath(DELETE_PATH)
+    with _storage_lock:
+        old = _storage["dirs"] if _storage["root"] == root else {}
+        history = list(_storage["history"]) if _storage["root"] == root else []
+    started = time.perf_counter()
+    index, listed = _index_pass(root, old)
+    now = time.time()
+    total = sum(e["bytes"] for e in index.values())
+    history = [h for h in history if now - h[0] <= STORAGE_GROWTH_WINDOW]
+    if not history or history[-1][1] != total or now - history[-1][0] >= 300:
+        history.append([round(now), total])
+    summary = _storage_summary(root, index, history)
+    with _storage_lock:
+        changed = listed or _storage["root"] != root or len(index) != len(_storage["dirs"])
+        _storage.update(root=root, dirs=index, history=history)
+    if changed:
+        try: _save_storage_index()
+        except OSError as e: print(f"[WARN] storage index not saved: {e}")
+    if summary != _status_state["storage"]:
+        publish_storage(summary)
+    if listed: print(f"[INFO] Storage index: listed {listed}/{len(index)} dir(s) in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return summary
+
+def _storage_indexer():
+    _load_storage_index()
+    while True:
+        try: storage_pass()
+        except Exception as e: print(f"[WARN] storage index: {e}")
+        _storage_wake.wait(STORAGE_SCAN_SECS)
+        _storage_wake.clear()
+
+def start_storage_indexer():
+    global _storage_started
+    if _storage_started or not DELETE_PATH: return
+    _storage_started = True
+    threading.Thread(target=_storage_indexer, daemon=True).start()
+
+# ===================== Output retention ====================
+# Optional cleanup of DELETE_PATH by policy: files older than
+# RETAIN_MAX_AGE_DAYS, files beyond the newest RETAIN_KEEP_PER_FOLDER in their
+# folder, then the oldest remaining files until the total fits RETAIN_MAX_GB.
+# File lists are cached per directory and refreshed only when its mtime
+# changes (same pass as the storage index). Files modified within
+# RETAIN_SETTLE_SECS are never candidates, and each file is re-checked right
+# before removal. Runs as a throttled "retention" job every
+# RETAIN_INTERVAL_MINS; GET /retention shows what a run would remove.
+import heapq
+
+_retain_lock = threading.Lock()
+_retain_cache = {"root": None, "dirs": {}}
+_retain_started = False
+
+def retention_policy() -> dict:
+    return {"max_bytes": RETAIN_MAX_GB * 1024 ** 3, "max_age_days": RETAIN_MAX_AGE_DAYS,
+            "keep_per_folder": RETAIN_KEEP_PER_FOLDER, "settle_secs": RETAIN_SETTLE_SECS}
+
+def retention_enabled() -> bool:
+    return bool(DELETE_PATH and (RETAIN_MAX_GB or RETAIN_MAX_AGE_DAYS or RETAIN_KEEP_PER_FOLDER))
+
+def _list_dir(path: str) -> dict:
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False): subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    files.append((entry.name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                pass
+    return {"files": files, "subdirs": subdirs, "newest": max((f[1] for f in files), default=0)}
+
+def retention_plan() -> dict:
+    """Decide what the policy would remove now, oldest first."""
+    root = os.path.abspath(DELETE_PATH)
+    with _retain_lock:
+        old = _retain_cache["dirs"] if _retain_cache["root"] == root else {}
+        index, _ = _index_pass(root, old, scan=_list_dir)
+        _retain_cache.update(root=root, dirs=index)
+    now = time.time_ns()
+    settled = now - RETAIN_SETTLE_SECS * 1_000_000_000
+    age_cutoff = now - RETAIN_MAX_AGE_DAYS * 86400 * 1_000_000_000 if RETAIN_MAX_AGE_DAYS else None
+    evict, keep, total, recent = [], [], 0, 0
+    for rel, entry in index.items():
+        newest_first = sorted(entry["files"], key=lambda f: f[1], reverse=True)
+        for rank, (name, mtime, size) in enumerate(newest_first):
+            total += size
+            path = os.path.join(rel, name) if rel else name
+            if mtime > settled:
+                recent += 1; continue
+            if age_cutoff is not None and mtime < age_cutoff: reason = "age"
+            elif RETAIN_KEEP_PER_FOLDER and rank >= RETAIN_KEEP_PER_FOLDER: reason = "per-folder"
+            else:
+                keep.append((mtime, path, size)); continue
+            evict.append((mtime, path, size, reason))
+    remaining = total - sum(e[2] for e in evict)
+    if RETAIN_MAX_GB and remaining > RETAIN_MAX_GB * 1024 ** 3:
+        heapq.heapify(keep)  # oldest first
+        while keep and remaining > RETAIN_MAX_GB * 1024 ** 3:
+            mtime, path, size = heapq.heappop(keep)
+            evict.append((mtime, path, size, "size")); remaining -= size
+    evict.sort()
+    return {"root": root, "policy": retention_policy(), "enabled": retention_enabled(),
+            "files": sum(len(e["files"]) for e in index.values()), "bytes": total, "recent_files": recent,
+            "evict_files": len(evict), "evict_bytes": total - remaining, "bytes_after": remaining,
+            "evict": [{"path": p, "bytes": sz, "mtime": m // 1_000_000_000, "reason": r} for m, p, sz, r in evict]}
+
+def _job_retention(job: Job):
+    job.update(phase="Scanning")
+    plan = retention_plan()
+    evict, root = plan["evict"], plan["root"]
+    job.update(phase="Removing old outputs", total=len(evict))
+    limiter, removed, freed = _RateLimiter(RETAIN_RATE), 0, 0
+    for i, item in enumerate(evict, 1):
+        job.check_cancelled()
+        path = os.path.join(root, item["path"])
+        try:
+            st = os.stat(path, follow_symlinks=False)
+            # Skip anything written to since the plan was made (or since the settle window).
+            if (st.st_size == item["bytes"] and st.st_mtime_ns // 1_000_000_000 == item["mtime"]
+                    and time.time() - st.st_mtime >= RETAIN_SETTLE_SECS):
+                os.remove(path); removed += 1; freed += st.st_size
+        except OSError:
+            pass
+        limiter.wait(1)
+        job.update(done=i)
+    _storage_wake.set()
+    return {"removed": removed, "freed_bytes": freed, "planned": len(evict)}
+
+def _retention_scheduler():
+    while True:
+        time.sleep(max(1, RETAIN_INTERVAL_MINS) * 60)
+        submit_job("retention", "Output retention", _job_retention, group="outputs", cancellable=True)
+
+def start_retention():
+    global _retain_started
+    if _retain_started or not retention_enabled() or RETAIN_INTERVAL_MINS <= 0: return
+    _retain_started = True
+    threading.Thread(target=_retention_scheduler, daemon=True).start()
+
+# ================= Service reverse proxy ==================
+# /svc/<name>/… streams requests and responses to the service's detected
+# port through a small keep-alive pool per upstream, so phones talk to one
+# origin. Bodies are never buffered. Requests for absolute paths made from
+# inside a proxied page (Referer under /svc/<name>/) are routed to the same
+# upstream when Pocket Comfy itself has no such route.
+_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+                "trailers", "transfer-encoding", "upgrade", "host", "content-length", "expect"}
+_pool_lock = threading.Lock()
+_pools: dict[int, deque] = {}
+
+def proxied_service() -> Optional[str]:
+    """The service whose /svc/<name>/ prefix this request's own path is under."""
+    parts = request.path.split("/", 3)
+    if len(parts) > 2 and parts[1] == "svc" and parts[2] in SERVICES: return parts[2]
+    return None
+
+def referer_service() -> Optional[str]:
+    """The service whose /svc/<name>/ page (on this host) issued the request, per Referer."""
+    ref = urlsplit(request.headers.get("Referer", ""))
+    if ref.netloc == request.host:
+        parts = ref.path.split("/", 3)
+        if len(parts) > 3 and parts[1] == "svc" and parts[2] in SERVICES: return parts[2]
+    return None
+
+def proxy_bound() -> bool:
+    """True when this request can only reach an upstream service, never a controller route."""
+    if request.path == "/login": return False
+    if proxied_service(): return True
+    return request.url_rule is None and referer_service() is not None  # headed for the 404 fallback
+
+def _pool_get(port: int) -> http.client.HTTPConnection:
+    with _pool_lock:
+        pool = _pools.get(port)
+        if pool: return pool.pop()
+    return http.client.HTTPConnection("127.0.0.1", port, timeout=PROXY_TIMEOUT_SECS)
+
+def _pool_put(port: int, conn: http.client.HTTPConnection):
+    with _pool_lock:
+        pool = _pools.setdefault(port, deque())
+        if len(pool) < PROXY_POOL_SIZE: pool.append(conn); return
+    conn.close()
+
+def _upstream_headers(name: str, port: int) -> list:
+    skip = _HOP_HEADERS | {h.strip().lower() for h in request.headers.get("Connection", "").split(",")}
+    out = []
+    for k, v in request.headers.items():
+        lk = k.lower()
+        if lk in skip: continue
+        if lk == "cookie":  # keep Pocket Comfy's own session cookie to ourselves
+            v = "; ".join(c for c in v.split("; ") if not c.startswith(app.config["SESSION_COOKIE_NAME"] + "="))
+            if not v: continue
+        if lk == "origin" and urlsplit(v).netloc == request.host:
+            v = f"http://127.0.0.1:{port}"  # same-origin for us is same-origin upstream (ComfyUI rejects mismatches)
+        out.append((k, v))
+    out += [("Host", f"127.0.0.1:{port}"), ("X-Forwarded-For", request.remote_addr or ""),
+            ("X-Forwarded-Proto", request.scheme), ("X-Forwarded-Host", request.host),
+            ("X-Forwarded-Prefix", f"/svc/{name}")]
+    return out
+
+def _send_upstream(conn, method: str, target: str, headers: list, body_len: Optional[int], chunked: bool):
+    conn.putrequest(method, target, skip_host=True, skip_accept_encoding=True)
+    for k, v in headers: conn.putheader(k, v)
+    if body_len is not None: conn.putheader("Content-Length", str(body_len))
+    elif chunked: conn.putheader("Transfer-Encoding", "chunked")
+    conn.endheaders()
+    if body_len or chunked:
+        stream = request.stream
+        while True:
+            chunk = stream.read(65536)
+            if not chunk: break
+            conn.send(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+        if chunked: conn.send(b"0\r\n\r\n")
+
+class _HijackedResponse(Response):
+    # The socket was taken over (WebSocket relay); tell the server the connection is gone.
+    def __call__(self, environ, start_response):
+        raise ConnectionAbortedError("connection hijacked")
+
+def _pump(src: socket.socket, dst: socket.socket, idle_ok: bool):
+    # One reusable buffer per direction; sendall blocks while the receiver is
+    # slow, so at most one chunk is ever held and TCP pushes back upstream.
+    buf = bytearray(65536); view = memoryview(buf)
+    try:
+        while True:
+            try: n = src.recv_into(buf)
+            except socket.timeout:
+                if idle_ok: continue
+                raise
+            if not n: break
+            dst.sendall(view[:n])
+    except OSError:
+        pass
+    finally:
+        for sk in (src, dst):
+            try: sk.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+
+def relay_websocket(name: str, target: str) -> Response:
+    client = request.environ.get("werkzeug.socket")
+    if client is None: return Response("WebSocket relay unsupported by this server", status=501, mimetype="text/plain")
+    port = detected_ports.get(name) or SERVICES[name]["port"]
+    try: upstream = socket.create_connection(("127.0.0.1", port), timeout=10)
+    except OSError as e: return Response(f"{SERVICES[name]['label']} unavailable: {e}", status=502, mimetype="text/plain")
+    keep = {"upgrade", "connection"}
+    lines = [f"GET {target} HTTP/1.1"]
+    for k, v in _upstream_headers(name, port):
+        lines.append(f"{k}: {v}")
+    for k, v in request.headers.items():
+        if k.lower() in keep: lines.append(f"{k}: {v}")
+    upstream.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    head = b""
+    while b"\r\n\r\n" not in head and len(head) < 65536:
+        chunk = upstream.recv(4096)
+        if not chunk: break
+        head += chunk
+    client.sendall(head)
+    if not head.startswith(b"HTTP/1.1 101"):
+        upstream.close(); return _HijackedResponse()
+    upstream.settimeout(None)
+    client.settimeout(WS_SEND_TIMEOUT_SECS)  # bounds how long a stalled phone can block a send
+    t = threading.Thread(target=_pump, args=(upstream, client, False), daemon=True)
+    t.start()
+    _pump(client, upstream, True)
+    t.join()
+    upstream.close()
+    return _HijackedResponse()
+
+def proxy_to_service(name: str, target: str) -> Response:
+    if request.headers.get("Upgrade", "").lower() == "websocket":
+        if name == "comfy" and PROGRESS_HUB and urlsplit(target).path == "/ws":
+            return serve_progress_websocket()
+        return relay_websocket(name, target)
+    port = detected_ports.get(name) or SERVICES[name]["port"]
+    headers = _upstream_headers(name, port)
+    body_len = request.content_length
+    chunked = body_len is None and bool(request.environ.get("wsgi.input_terminated"))
+    for attempt in (0, 1):
+        conn = _pool_get(port)
+        try:
+            _send_upstream(conn, request.method, target, headers, body_len, chunked)
+            resp = conn.getresponse()
+            break
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            # A pooled keep-alive socket may have been closed upstream; retry once if nothing was streamed.
+            if attempt or body_len or chunked:
+                return Response(f"{SERVICES[name]['label']} unavailable: {e}", status=502, mimetype="text/plain")
+    prefix = f"/svc/{name}"
+    out_headers = []
+    for k, v in resp.getheaders():
+        lk = k.lower()
+        if lk in _HOP_HEADERS and lk != "content-length": continue
+        if lk == "location":
+            if v.startswith(f"http://127.0.0.1:{port}"): v = v[len(f"http://127.0.0.1:{port}"):] or "/"
+            if v.startswith("/") and not v.startswith(prefix + "/"): v = prefix + v
+        out_headers.append((k, v))
+    def _body():
+        ok = False
+        try:
+            while True:
+                chunk = resp.read1(65536)
+                if not chunk: break
+                yield chunk
+            ok = True
+        finally:
+            resp.close()  # marks the response done so the connection can carry the next request
+            if ok and not resp.will_close: _pool_put(port, conn)
+            else: conn.close()
+    return Response(_body(), status=resp.status, headers=out_headers, direct_passthrough=True)
+
+def _raw_target(strip_prefix: str = "") -> str:
+    raw = request.environ.get("REQUEST_URI") or request.environ.get("RAW_URI")
+    if not raw:
+        qs = request.query_string.decode("latin-1")
+        raw = request.path + (f"?{qs}" if qs else "")
+    raw = urlsplit(raw)._replace(scheme="", netloc="").geturl()
+    if strip_prefix and raw.startswith(strip_prefix): raw = raw[len(strip_prefix):]
+    return raw if raw.startswith("/") else "/" + raw
+
+# ================= ComfyUI progress hub ===================
+# One WebSocket to ComfyUI per instance, shared by every viewer: proxied
+# ComfyUI tabs (/svc/comfy/ws) and the dashboard's /progress stream all
+# subscribe here, so ComfyUI encodes and sends each event once. Messages are
+# framed once and handed to each subscriber through a bounded queue; preview
+# images go to a single "latest" slot, so a slow phone skips frames instead
+# of queueing them. Other events are never dropped: a subscriber whose queue
+# would overflow is closed instead (WebSocket close 1013, or the SSE stream
+# ends) and reconnects to a fresh snapshot. The hub connects with a fixed clientId which proxied tabs
+# adopt, so prompts queued from any device report progress to all of them.
+PROGRESS_CLIENT_ID = "pocketcomfy-" + os.urandom(8).hex()
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_WS_MAX_MESSAGE = 64 << 20
+_PREVIEW_TYPES = {1: "image/jpeg", 2: "image/png"}
+_progress_cond = threading.Condition()
+_progress_send_lock = threading.Lock()
+_progress = {"thread": None, "sock": None, "port": None, "connected": False, "gen": 0,
+             "status": None, "last": {}, "preview": None, "preview_frame": None, "subs": {}}
+
+def _ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode("ascii")).digest()).decode("ascii")
+
+def _ws_mask(data: bytes, key: bytes) -> bytes:
+    n = len(data)
+    pad = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, "little") ^ int.from_bytes(pad, "little")).to_bytes(n, "little")
+
+def _ws_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    n, bit = len(payload), 0x80 if mask else 0
+    if n < 126: head = bytes((0x80 | opcode, bit | n))
+    elif n < 65536: head = bytes((0x80 | opcode, bit | 126)) + n.to_bytes(2, "big")
+    else: head = bytes((0x80 | opcode, bit | 127)) + n.to_bytes(8, "big")
+    if not mask: return head + payload
+    key = os.urandom(4)
+    return head + key + _ws_mask(payload, key)
+
+def _ws_read_exact(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n: raise ConnectionError("websocket closed")
+    return data
+
+def _ws_read(f, on_ping=None) -> tuple[int, bytes]:
+    """Next message as (opcode, payload). Close frames are returned as they arrive; pings go to
+    on_ping, even between the fragments of a message, and pongs are ignored."""
+    opcode, parts, size = None, [], 0
+    while True:
+        h = _ws_read_exact(f, 2)
+        op, n = h[0] & 0x0F, h[1] & 0x7F
+        if n == 126: n = int.from_bytes(_ws_read_exact(f, 2), "big")
+        elif n == 127: n = int.from_bytes(_ws_read_exact(f, 8), "big")
+        if op >= 8 and n > 125: raise ConnectionError("websocket control frame too large")
+        if op < 8: size += n
+        if size > _WS_MAX_MESSAGE: raise ConnectionError("websocket message too large")
+        key = _ws_read_exact(f, 4) if h[1] & 0x80 else None
+        data = _ws_read_exact(f, n)
+        if key: data = _ws_mask(data, key)
+        if op == 8: return op, data
+        if op >= 8:
+            if op == 9 and on_ping: on_ping(data)
+            continue
+        if op: opcode = op
+        parts.append(data)
+        if h[0] & 0x80: return opcode, b"".join(parts)
+
+def _ws_connect(port: int, path: str):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    try:
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        sock.sendall((f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+                      f"Origin: http://127.0.0.1:{port}\r\n\r\n").encode("latin-1"))
+        f = sock.makefile("rb")
+        if f.readline().split(b" ", 2)[1:2] != [b"101"]: raise ConnectionError("upgrade refused")
+        accept = None
+        while True:
+            line = f.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            k, _, v = line.partition(b":")
+            if k.strip().lower() == b"sec-websocket-accept": accept = v.strip().decode("latin-1")
+        if accept != _ws_accept(key): raise ConnectionError("bad Sec-WebSocket-Accept")
+        sock.settimeout(None)
+        return sock, f
+    except BaseException:
+        sock.close(); raise
+
+def _progress_send(opcode: int, payload: bytes):
+    sock = _progress["sock"]
+    if sock is None: return
+    with _progress_send_lock:
+        try: sock.sendall(_ws_frame(opcode, payload, mask=True))
+        except OSError: pass
+
+def _progress_broadcast(frame: bytes, sse: Optional[bytes]):
+    # Caller holds _progress_cond.
+    for sub in _progress["subs"].values():
+        item = frame if sub["ws"] else sse
+        if item is None or sub["closed"]: continue
+        if len(sub["q"]) >= PROGRESS_QUEUE:  # too far behind to stay consistent; make it start over
+            sub["q"].clear(); sub["closed"] = sub["overflow"] = True
+        else:
+            sub["q"].append(item)
+    _progress_cond.notify_all()
+
+def _progress_text(data: bytes):
+    try: msg = json.loads(data)
+    except ValueError: return
+    kind = msg.get("type") if isinstance(msg, dict) else None
+    body = msg.get("data") if isinstance(msg, dict) else None
+    sse = b"event: comfy\ndata: " + data.replace(b"\n", b" ") + b"\n\n"
+    with _progress_cond:
+        last = _progress["last"]
+        if kind == "status" and isinstance(body, dict): _progress["status"] = body.get("status")
+        if kind in ("status", "executing", "progress", "execution_start"): last[kind] = sse
+        if kind in ("execution_success", "execution_error", "execution_interrupted") or (
+                kind == "executing" and isinstance(body, dict) and body.get("node") is None):
+            last.pop("progress", None); last.pop("executing", None)
+        _progress_broadcast(_ws_frame(1, data), sse)
+
+def _progress_binary(data: bytes):
+    kind = int.from_bytes(data[:4], "big") if len(data) >= 8 else 0
+    mime = img = None
+    if kind == 1:
+        mime, img = _PREVIEW_TYPES.get(int.from_bytes(data[4:8], "big")), data[8:]
+    elif kind == 4:  # PREVIEW_IMAGE_WITH_METADATA: u32 length + JSON + image
+        n = int.from_bytes(data[4:8], "big")
+        try: mime = json.loads(data[8:8 + n]).get("image_type")
+        except (ValueError, AttributeError): mime = None
+        img = data[8 + n:]
+    frame = _ws_frame(2, data)
+    with _progress_cond:
+        if not mime:
+            _progress_broadcast(frame, None); return
+        seq = (_progress["preview"] or (0,))[0] + 1
+        _progress["preview"], _progress["preview_frame"] = (seq, mime, img), frame
+        for sub in _progress["subs"].values(): sub["preview"] = True
+        _progress_cond.notify_all()
+
+def _progress_hub():
+    delay = READY_PROBE_MIN_MS / 1000.0
+    while True:
+        with _progress_cond:
+            if not _progress["subs"]:
+                _progress["thread"] = None; return
+        port = detected_ports.get("comfy") or SERVICES["comfy"]["port"]
+        try:
+            sock, f = _ws_connect(port, f"/ws?clientId={PROGRESS_CLIENT_ID}")
+        except OSError:
+            time.sleep(delay); delay = min(delay * 2, READY_PROBE_MAX_MS / 1000.0)
+            continue
+        delay = READY_PROBE_MIN_MS / 1000.0
+        with _progress_cond:
+            _progress.update(sock=sock, port=port, connected=True)
+            _progress_broadcast(b"", b'event: hub\ndata: {"connected": true}\n\n')
+        try:
+            while True:
+                op, data = _ws_read(f, lambda ping: _progress_send(10, ping))
+                if op == 1: _progress_text(data)
+                elif op == 2: _progress_binary(data)
+                elif op == 8: break
+        except OSError:
+            pass
+        finally:
+            sock.close()
+            with _progress_cond:
+                _progress.update(sock=None, connected=False, status=None, last={})
+                _progress["gen"] += 1
+                _progress_broadcast(b"", b'event: hub\ndata: {"connected": false}\n\n')
+
+def _progress_check():
+    """Start the hub if needed and drop its connection if ComfyUI moved to another port."""
+    with _progress_cond:
+        t = _progress["thread"]
+        if t is None or not t.is_alive():
+            t = _progress["thread"] = threading.Thread(target=_progress_hub, daemon=True)
+            t.start()
+        sock, port = _progress["sock"], detected_ports.get("comfy") or SERVICES["comfy"]["port"]
+    if sock is not None and _progress["port"] != port:
+        try: sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+
+def _progress_idle():
+    with _progress_cond:
+        if _progress["subs"] or _progress["sock"] is None: return
+        sock = _progress["sock"]
+    try: sock.shutdown(socket.SHUT_RDWR)
+    except OSError: pass
+
+def progress_subscribe(ws: bool) -> dict:
+    sub = {"ws": ws, "q": deque(), "preview": False, "gen": None, "closed": False, "overflow": False}
+    with _progress_cond:
+        _progress["subs"][id(sub)] = sub
+        sub["gen"] = _progress["gen"]
+    _progress_check()
+    return sub
+
+def progress_unsubscribe(sub: dict):
+    with _progress_cond:
+        _progress["subs"].pop(id(sub), None)
+        idle = not _progress["subs"]
+    if idle:
+        t = threading.Timer(PROGRESS_IDLE_SECS, _progress_idle); t.daemon = True; t.start()
+
+def _progress_take(sub: dict, timeout: float):
+    """Wait for work; returns (queued items, latest preview or None, hub still same connection)."""
+    with _progress_cond:
+        _progress_cond.wait_for(lambda: sub["q"] or sub["preview"] or sub["closed"]
+                                or _progress["gen"] != sub["gen"], timeout=timeout)
+        items = list(sub["q"]); sub["q"].clear()
+        preview = None
+        if sub["preview"]:
+            sub["preview"] = False
+            preview = _progress["preview_frame"] if sub["ws"] else _progress["preview"]
+        return items, preview, _progress["gen"] == sub["gen"] and not sub["closed"]
+
+def _progress_events():
+    sub = progress_subscribe(ws=False)
+    try:
+        yield "retry: 3000\n\n"
+        with _progress_cond:
+            snap = [f'event: hub\ndata: {{"connected": {json.dumps(_progress["connected"])}}}\n\n'.encode()]
+            snap += list(_progress["last"].values())
+            if _progress["preview"]: sub["preview"] = True
+        yield b"".join(snap)
+        while True:
+            items, preview, _ = _progress_take(sub, EVENT_HEARTBEAT_SECS)
+            if sub["closed"]: return  # overflowed; EventSource reconnects and gets a fresh snapshot
+            sub["gen"] = _progress["gen"]  # SSE viewers ride through reconnects
+            if preview:
+                items.append(f'event: preview\ndata: {{"seq": {preview[0]}, "type": "{preview[1]}"}}\n\n'.encode())
+            if not items:
+                _progress_check(); items = [b": ping\n\n"]
+            yield b"".join(items)
+    finally:
+        progress_unsubscribe(sub)
+
+class _PatientReader:
+    # read(n) over a socket whose timeout only bounds sends: idle reads just keep waiting.
+    def __init__(self, sock: socket.socket):
+        self.sock, self.buf = sock, bytearray()
+
+    def read(self, n: int) -> bytes:
+        while len(self.buf) < n:
+            try: chunk = self.sock.recv(max(65536, n - len(self.buf)))
+            except socket.timeout: continue
+            if not chunk: break
+            self.buf += chunk
+        out = bytes(self.buf[:n]); del self.buf[:n]
+        return out
+
+def _progress_client_reader(client: socket.socket, sub: dict, send_lock: threading.Lock):
+    f = _PatientReader(client)
+    def pong(data: bytes):
+        with send_lock: client.sendall(_ws_frame(10, data))
+    try:
+        while True:
+            op, data = _ws_read(f, pong)
+            if op == 8: break
+            if op in (1, 2): _progress_send(op, data)  # e.g. the frontend's feature_flags hello
+    except OSError:
+        pass
+    finally:
+        with _progress_cond:
+            sub["closed"] = True; _progress_cond.notify_all()
+
+def serve_progress_websocket() -> Response:
+    """Serve a proxied ComfyUI tab's /ws from the shared hub connection."""
+    client, key = request.environ.get("werkzeug.socket"), request.headers.get("Sec-WebSocket-Key", "")
+    if client is None: return Response("WebSocket relay unsupported by this server", status=501, mimetype="text/plain")
+    if not key: return Response("Missing Sec-WebSocket-Key", status=400, mimetype="text/plain")
+    sub = progress_subscribe(ws=True)
+    with _progress_cond:
+        _progress_cond.wait_for(lambda: _progress["connected"], timeout=10)
+        connected, status, sub["gen"] = _progress["connected"], _progress["status"], _progress["gen"]
+        sub["q"].clear()
+    if not connected:
+        progress_unsubscribe(sub)
+        return Response(f"{SERVICES['comfy']['label']} unavailable", status=502, mimetype="text/plain")
+    send_lock = threading.Lock()
+    try:
+        client.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                        f"Sec-WebSocket-Accept: {_ws_accept(key)}\r\n\r\n").encode("latin-1"))
+        client.settimeout(WS_SEND_TIMEOUT_SECS)
+        # ComfyUI's frontend takes its clientId from the sid of the first status message.
+        hello = {"type": "status", "data": {"status": status or {"exec_info": {"queue_remaining": 0}},
+                                            "sid": PROGRESS_CLIENT_ID}}
+        client.sendall(_ws_frame(1, json.dumps(hello).encode()))
+        threading.Thread(target=_progress_client_reader, args=(client, sub, send_lock), daemon=True).start()
+        while True:
+            items, preview, alive = _progress_take(sub, EVENT_HEARTBEAT_SECS)
+            if not alive: break
+            if preview: items.append(preview)
+            if not items: _progress_check(); continue
+            with send_lock: client.sendall(b"".join(i for i in items if i))
+        code = 1013 if sub["overflow"] else 1001  # 1013 "try again later": the tab reconnects
+        with send_lock: client.sendall(_ws_frame(8, code.to_bytes(2, "big")))
+    except OSError:
+        pass
+    finally:
+        progress_unsubscribe(sub)
+        try: client.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+    return _HijackedResponse()
+
 # ================= Relaunch Hidden/Visible =================
 CREATE_NEW_CONSOLE   = 0x00000010
 DETACHED_PROCESS     = 0x00000008
@@ -476,35 +1934,23 @@ def _spawn_relaunch(exe_path: str, creationflags: int, env=None):
         print(f"[ERROR] Relaunch failed: {e}")
         return False
 
-def relaunch_hidden_core():
+def relaunch_hidden_core() -> bool:
     exe = PYTHONW_EXE if os.path.exists(PYTHONW_EXE) else sys.executable
     env = os.environ.copy()
     env["PC_START_DELAY"] = "2"
-    ok = _spawn_relaunch(exe, DETACHED_PROCESS | CREATE_NO_WINDOW, env=env)
-    if ok: time.sleep(0.3); os._exit(0)
+    return _spawn_relaunch(exe, DETACHED_PROCESS | CREATE_NO_WINDOW, env=env)
 
-def relaunch_visible_core_autostart():
+def relaunch_visible_core_autostart() -> bool:
     exe = PYTHON_EXE if os.path.exists(PYTHON_EXE) else sys.executable
     env = os.environ.copy()
     env["PC_START_DELAY"] = "2"
-    ok = _spawn_relaunch(exe, CREATE_NEW_CONSOLE, env=env)
-    if ok: time.sleep(0.3); os._exit(0)
+    return _spawn_relaunch(exe, CREATE_NEW_CONSOLE, env=env)
 
 def is_hidden_mode() -> bool:
     return "pythonw" in os.path.basename(sys.executable).lower()
 
 # ======================= Login Page ========================
-LOGIN_TEMPLATE = """
-<!doctype html><html lang="en"><head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1, viewport-fit=cover"/>
-<title>Pocket Comfy • Login</title>
-<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
-<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
-<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
-<link rel="preload" as="image" href="{{ hero_logo }}" imagesrcset="{{ hero_logo }}">
-<meta name="apple-mobile-web-app-capable" content="yes"><meta name="apple-mobile-web-app-status-bar-style" content="black">
-<style>
+LOGIN_CSS = """
 :root{
   --bg:#070814; --panel:#121336; --txt:#eaf6ff; --ink:#0b0c1a;
   --purp1:#a86eff; --purp2:#5e36ff; --cyan:#00d9ff;
@@ -539,6 +1985,7 @@ body{ /* backdrop lives on body now to avoid iOS/Safari gaps */
 /* layout */
 .wrap{max-width:520px;margin:9vh auto 8vh;padding:0 20px}
 .hero{position:relative;display:flex;justify-content:center;margin:0 0 18px;transform:translateZ(0);will-change:transform}
+picture{display:contents}
 .heroWrap{position:relative; width:75vw; max-width:520px; aspect-ratio: 1 / 1; transform:translateZ(0); will-change:transform;}
 .heroWrap img{position:absolute; inset:0; width:100%; height:100%; object-fit:contain; display:block;
   -webkit-transform:translateZ(0); transform:translateZ(0); -webkit-backface-visibility:hidden; backface-visibility:hidden;
@@ -598,39 +2045,14 @@ body.kb-open .wrap{ padding-bottom: calc(env(safe-area-inset-bottom) + 90px); }
 
 /* shutdown status styling */
 #headerBar.statusComplete{color:#ff5f6d;font-weight:800}
-</style></head><body>
-<div class="wrap">
-  <div class="hero">
-    <div class="heroWrap">
-      <div class="aura"></div>
-      <img src="{{ hero_logo }}" alt="Pocket Comfy" decoding="async" fetchpriority="high">
-    </div>
-  </div>
-  <div class="card" id="loginCard">
-    <h1>Pocket Comfy • Login</h1>
-    <form method="post" action="/login" autocomplete="on">
-      <input class="vh" id="username" name="username" value="admin" autocomplete="username">
-      <div class="row">
-        <div class="pwdwrap">
-          <input id="pwd" name="password" type="password" autocomplete="current-password" placeholder="Password" inputmode="text"/>
-          <button class="eye" id="eyeBtn" title="Show/Hide" type="button" aria-label="Toggle password visibility">
-            <svg id="eyeIcon" viewBox="0 0 24 24">
-              <path d="M2 12s4-7 10-7 10 7 10 7-4 7-10 7S2 12 2 12Z"/>
-              <circle cx="12" cy="12" r="3"/>
-            </svg>
-          </button>
-        </div>
-        <button class="submit" type="submit">Enter</button>
-      </div>
-    </form>
-    <div class="note">Note: Connection is not secure. Credentials travel in clear text over the internet.</div>
-  </div>
-</div>
-<script>
+"""
+
+LOGIN_JS = """
 // Fresh page after mode switch
 if (new URLSearchParams(location.search).has('switched')) {
   setTimeout(()=>{ location.replace('/login?r='+Date.now()); }, 250);
 }
+if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js').catch(()=>{});
 
 const pwd = document.getElementById('pwd');
 const eyeBtn = document.getElementById('eyeBtn');
@@ -767,28 +2189,63 @@ eyeBtn.addEventListener('click', e=>{ e.preventDefault(); setEye(pwd.type==='pas
   // Nudge into view when focusing
   pwd.addEventListener('focus', () => { setTimeout(()=>{ try{ pwd.scrollIntoView({block:'center', behavior:'smooth'});}catch(e){} }, 80); }, {passive:true});
 })();
-</script>
-</body></html>
 """
 
-# ---------- MINI PAGE (frame + toolbar) ----------
-MINI_TEMPLATE = """
+LOGIN_TEMPLATE = """
 <!doctype html><html lang="en"><head>
 <meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover"/>
-<title>Pocket Comfy • Mini</title>
-<meta name="theme-color" content="#000000">
+<meta name="viewport" content="width=device-width, initial-scale=1, viewport-fit=cover"/>
+<title>Pocket Comfy • Login</title>
+<meta name="theme-color" content="#070814">
 <link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
+<link rel="manifest" href="{{ url_for('web_manifest') }}">
 <link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
 <link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
-<style>
+{{ asset_preload('hero') }}
+<meta name="apple-mobile-web-app-capable" content="yes"><meta name="apple-mobile-web-app-status-bar-style" content="black">
+<link rel="stylesheet" href="{{ bundle_url('login.css') }}"></head><body>
+<div class="wrap">
+  <div class="hero">
+    <div class="heroWrap">
+      <div class="aura"></div>
+      {{ asset_picture('hero', alt='Pocket Comfy', decoding='async', fetchpriority='high') }}
+    </div>
+  </div>
+  <div class="card" id="loginCard">
+    <h1>Pocket Comfy • Login</h1>
+    <form method="post" action="/login" autocomplete="on">
+      <input class="vh" id="username" name="username" value="admin" autocomplete="username">
+      <div class="row">
+        <div class="pwdwrap">
+          <input id="pwd" name="password" type="password" autocomplete="current-password" placeholder="Password" inputmode="text"/>
+          <button class="eye" id="eyeBtn" title="Show/Hide" type="button" aria-label="Toggle password visibility">
+            <svg id="eyeIcon" viewBox="0 0 24 24">
+              <path d="M2 12s4-7 10-7 10 7 10 7-4 7-10 7S2 12 2 12Z"/>
+              <circle cx="12" cy="12" r="3"/>
+            </svg>
+          </button>
+        </div>
+        <button class="submit" type="submit">Enter</button>
+      </div>
+    </form>
+    <div class="note">Note: Connection is not secure. Credentials travel in clear text over the internet.</div>
+  </div>
+</div>
+<script src="{{ bundle_url('login.js') }}"></script>
+</body></html>
+"""
+
+# ---------- FRAME PAGES (shared CSS/JS for Mini, ComfyUI, Smart Gallery) ----------
+FRAME_CSS = """
 :root{
   --bg:#0a0b1e;
   --panel:#0b0c1a;
   --ink:#eaf6ff;
 
-  /* neon + aurora palette */
-  --magenta-rgb: 255, 43, 214;
+  /* neon + aurora palette (ComfyUI blue; per-service overrides at the end) */
+  --magenta-rgb: 80, 140, 255;
+  --pulse-rgb: 0, 184, 255;
+  --ring-alpha: .86;
   --magenta: rgb(var(--magenta-rgb));
   --c-cyan:#00eaff;
   --c-mint:#7cffc4;
@@ -799,7 +2256,7 @@ MINI_TEMPLATE = """
   --barH:45px;
   --barRadius:16px;
   --sideBorder:3px;
-  --bottomBorder:2px;          /* ↓ slightly thinner for more space */
+  --bottomBorder:2px;
   --glassBlur:12px;
   --barSidePad:12px;
 
@@ -822,7 +2279,7 @@ body{
 .topbar-wrap{
   position:fixed; left:0; right:0; top:0; z-index:1000;
   padding:
-    calc(env(safe-area-inset-top) + 3px)   /* ↑ nudge bar closer to top */
+    calc(env(safe-area-inset-top) + 3px)
     calc(max(env(safe-area-inset-right),0px) + var(--barSidePad))
     6px
     calc(max(env(safe-area-inset-left),0px) + var(--barSidePad));
@@ -840,11 +2297,11 @@ body{
   overflow:visible;
 }
 
-/* Neon pulse ring (unchanged) */
+/* Neon pulse ring */
 .topbar::after{
   content:"";
   position:absolute; inset:-6px; border-radius:inherit;
-  background:radial-gradient(closest-side, rgba(0,234,255,.55), rgba(0,234,255,.25) 55%, rgba(0,234,255,0) 70%);
+  background:radial-gradient(closest-side, rgba(var(--pulse-rgb),.55), rgba(var(--pulse-rgb),.25) 55%, rgba(var(--pulse-rgb),0) 70%);
   opacity:0; transform:scale(.96);
   pointer-events:none;
 }
@@ -861,7 +2318,7 @@ body{
   align-items:center; width:100%; padding:0 4px;
 }
 
-/* ===== Flat deep-black circular buttons, magenta ring slightly toned down ===== */
+/* ===== Flat deep-black circular buttons ===== */
 .iconbtn{
   appearance:none; cursor:pointer;
   position:relative; isolation:isolate;
@@ -869,9 +2326,8 @@ body{
   display:inline-grid; place-items:center; overflow:hidden;
 
   background:#000;
-  border:1px solid rgba(var(--magenta-rgb), .82); /* ↓ “smidge” less glow */
-  box-shadow:none;
-  backdrop-filter:none; -webkit-backdrop-filter:none;
+  border:1px solid rgba(var(--magenta-rgb), var(--ring-alpha));
+  box-shadow:none; backdrop-filter:none; -webkit-backdrop-filter:none;
 
   color:#fff;
   transition:transform .08s ease, opacity .12s ease;
@@ -884,8 +2340,7 @@ body{
 
 /* Aurora layers INSIDE the circle, fully clipped */
 .iconbtn .aurora{
-  position:absolute; inset:0;
-  border-radius:inherit;
+  position:absolute; inset:0; border-radius:inherit;
   clip-path:circle(50% at 50% 50%);
   -webkit-mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
           mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
@@ -951,16 +2406,16 @@ body{
 }
 .title a{ color:#eaf6ff; text-decoration:none; }
 
-/* Frame — moved up slightly */
+/* Frame */
 .frameWrap{
   position:fixed;
-  top:calc(var(--barH) + env(safe-area-inset-top) + 6px); /* ↓ was +12px */
+  top:calc(var(--barH) + env(safe-area-inset-top) + 6px);
   left:0; right:0; bottom:max(env(safe-area-inset-bottom), 0px);
   background:var(--panel);
   border-left:var(--sideBorder) solid #000;
   border-right:var(--sideBorder) solid #000;
   border-top:1px solid #000;
-  border-bottom:var(--bottomBorder) solid #000; /* thinner */
+  border-bottom:var(--bottomBorder) solid #000;
   overflow:hidden;
 }
 iframe{ width:100%; height:100%; border:0; display:block; background:#0b0c1a; }
@@ -971,14 +2426,118 @@ iframe{ width:100%; height:100%; border:0; display:block; background:#0b0c1a; }
 @supports (-webkit-touch-callout: none) { .frameWrap{ bottom:0; } }
 @media (max-width:360px){ .title{ font-size:.86rem; } }
 
+/* === Auto-hide border + topbar in landscape to maximize canvas (ComfyUI, Gallery) === */
+@media (orientation: landscape){
+  .landscape-full .topbar-wrap{ display:none !important; }
+  .landscape-full .frameWrap{ top:0 !important; border:0 !important; }
+}
+
 /* --- Stability for sticky header & vivid green lock text --- */
 .header{transform:translateZ(0);-webkit-transform:translateZ(0);backface-visibility:hidden;-webkit-backface-visibility:hidden;will-change:transform;contain:paint}
 .statusHot{color:#40f19a;font-weight:800}
 /* shutdown status styling */
 #headerBar.statusComplete{color:#ff5f6d;font-weight:800}
 
+/* Per-service palettes (set on <html data-service>) */
+:root[data-service="mini"]{ --magenta-rgb: 255, 43, 214; --pulse-rgb: 0, 234, 255; --ring-alpha: .82; }
+:root[data-service="gallery"]{ --magenta-rgb: 255, 120, 90; --pulse-rgb: 255, 160, 120; }
+"""
+
+FRAME_JS = """
+/* Shared controller for the framed service pages (Mini, ComfyUI, Smart Gallery).
+   The page sets CSRF/PROXY inline and describes itself on <html data-service/data-port/data-label>. */
+const SVC = document.documentElement.dataset;
+const PORT_KEY = SVC.service + '_port';
+let liveNet = null;
+async function getServiceURL(){
+  if (PROXY) return '/svc/' + SVC.service + '/';
+  const host = location.hostname || '127.0.0.1';
+  try{
+    const n = liveNet || await (await fetch('/netinfo')).json();
+    const port = (n && n[PORT_KEY]) ? n[PORT_KEY] : SVC.port;
+    // direct http is expected (same-LAN). If you serve over https, ensure a proxy to avoid mixed content.
+    return location.protocol + '//' + host + ':' + port + '/';
+  }catch(_){
+    return location.protocol + '//' + host + ':' + SVC.port + '/';
+  }
+}
+
+/* A page served from the service worker cache may carry the token of a previous server run */
+async function refreshCsrf(){
+  try{
+    const r = await fetch('/csrf', { cache:'no-store' });
+    if (r.ok && !r.redirected){ CSRF = (await r.json()).token; return true; }
+  }catch(_){}
+  return false;
+}
+async function ensureService(){
+  const send = () => fetch('/ensure_' + SVC.service, { method:'POST', headers:{ 'X-CSRF-Token': CSRF } });
+  try {
+    const r = await send();
+    if (r.status === 403 && await refreshCsrf()) await send();
+  } catch(e){}
+}
+function bustURL(u){ return u + (u.includes('?') ? '&' : '?') + 'r=' + Date.now(); }
+
+/* Trigger the neon pulse on the bar */
+function triggerBarPulse(){
+  const bar = document.getElementById('topbar');
+  if(!bar) return;
+  bar.classList.remove('pulse'); void bar.offsetWidth; bar.classList.add('pulse');
+}
+async function loadService(){
+  const f = document.getElementById('svcFrame');
+  const st = document.getElementById('svcStatus');
+  const url = await getServiceURL();
+  f.onload = () => { st.textContent = SVC.label + ' Ready'; };
+  f.src = bustURL(url);
+}
+
+document.getElementById('backBtn').addEventListener('click', () => { location.href = '/'; });
+document.getElementById('refreshBtn').addEventListener('click', async () => {
+  const f = document.getElementById('svcFrame');
+  const url = await getServiceURL();
+  f.src = bustURL(url);
+  document.getElementById('svcStatus').textContent = 'Refreshing…';
+  triggerBarPulse();
+});
+
+/* Follow port changes pushed by /events; poll /netinfo while the stream is down */
+let loadedPort = null, netPoll = null;
+if ('serviceWorker' in navigator){
+  navigator.serviceWorker.register('/sw.js').catch(()=>{});
+  navigator.serviceWorker.addEventListener('message', e => { if (e.data && e.data.type === 'logged-out') location.replace('/login'); });
+}
+function onNet(n){
+  liveNet = n;
+  if (loadedPort && n[PORT_KEY] && n[PORT_KEY] !== loadedPort){ loadedPort = n[PORT_KEY]; loadService(); }
+}
+if (window.EventSource){
+  const es = new EventSource('/events');
+  es.addEventListener('status', e => { if (netPoll){ clearInterval(netPoll); netPoll = null; } onNet(JSON.parse(e.data)); });
+  es.onerror = () => { if (!netPoll) netPoll = setInterval(async () => { try{ onNet(await (await fetch('/netinfo', { cache:'no-store' })).json()); }catch(_){} }, 5000); };
+}
+
+(async () => {
+  await ensureService();
+  await loadService();
+  loadedPort = (liveNet && liveNet[PORT_KEY]) || Number(SVC.port);
+  triggerBarPulse();
+})();
+"""
 
-</style></head><body>
+# ---------- MINI PAGE (frame + toolbar) ----------
+MINI_TEMPLATE = """
+<!doctype html><html lang="en" data-service="mini" data-port="3000" data-label="Comfy Mini"><head>
+<meta charset="utf-8"/>
+<meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover"/>
+<title>Pocket Comfy • Mini</title>
+<meta name="theme-color" content="#000000">
+<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
+<link rel="manifest" href="{{ url_for('web_manifest') }}">
+<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
+<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
+<link rel="stylesheet" href="{{ bundle_url('frame.css') }}"></head><body>
 
   <div class="topbar-wrap">
     <div class="topbar" id="topbar">
@@ -1006,564 +2565,79 @@ iframe{ width:100%; height:100%; border:0; display:block; background:#0b0c1a; }
   </div>
 
   <div class="frameWrap">
-    <iframe id="miniFrame" src="about:blank" referrerpolicy="no-referrer"></iframe>
+    <iframe id="svcFrame" src="about:blank" referrerpolicy="no-referrer"></iframe>
   </div>
 
-  <div class="sr-only" id="miniStatus" aria-live="polite">Loading Comfy Mini…</div>
-
-<script>
-const CSRF = "{{ csrf_token }}";
-const miniURL = location.protocol + '//' + location.hostname + ':3000/';
+  <div class="sr-only" id="svcStatus" aria-live="polite">Loading Comfy Mini…</div>
 
-async function ensureMini(){
-  try { await fetch('/ensure_mini', { method:'POST', headers:{ 'X-CSRF-Token': CSRF } }); }
-  catch(e) {}
-}
-function bustURL(u){ return u + (u.includes('?') ? '&' : '?') + 'r=' + Date.now(); }
+<script>let CSRF = "{{ csrf_token }}"; const PROXY = {{ 'true' if service_proxy else 'false' }};</script>
+<script src="{{ bundle_url('frame.js') }}"></script>
+</body></html>
+"""
 
-/* Trigger the neon pulse on the bar (on demand) */
-function triggerBarPulse(){
-  const bar = document.getElementById('topbar');
-  if(!bar) return;
-  bar.classList.remove('pulse');
-  void bar.offsetWidth;
-  bar.classList.add('pulse');
-}
 
-function loadMini(){
-  const f = document.getElementById('miniFrame');
-  const st = document.getElementById('miniStatus');
-  f.onload = () => { st.textContent = 'Comfy Mini Ready'; };
-  f.src = bustURL(miniURL);
-}
-
-document.getElementById('backBtn').addEventListener('click', () => { location.href = '/'; });
-
-document.getElementById('refreshBtn').addEventListener('click', () => {
-  const f = document.getElementById('miniFrame');
-  f.src = bustURL(miniURL);
-  document.getElementById('miniStatus').textContent = 'Refreshing…';
-  triggerBarPulse(); // pulse on refresh tap
-});
-
-(async () => {
-  await ensureMini();
-  loadMini();
-  triggerBarPulse();   // pulse once on first load
-})();
-</script>
-</body></html>
-"""
-
-
-# ---------- COMFYUI PAGE (frame + toolbar) ---------- 
-COMFYUI_TEMPLATE = """
-<!doctype html><html lang="en"><head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover"/>
-<title>Pocket Comfy • ComfyUI</title>
-<meta name="theme-color" content="#000000">
-<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
-<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
-<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
-<style>
-:root{
-  --bg:#0a0b1e;
-  --panel:#0b0c1a;
-  --ink:#eaf6ff;
-
-  /* neon + aurora palette (slightly bluer for ComfyUI) */
-  --magenta-rgb: 80, 140, 255;       /* blue ring */
-  --magenta: rgb(var(--magenta-rgb));
-  --c-cyan:#00eaff;
-  --c-mint:#7cffc4;
-  --c-violet:#b28dff;
-  --c-blue:#00b3ff;
-  --c-red:#ff5f6d;
-
-  --barH:45px;
-  --barRadius:16px;
-  --sideBorder:3px;
-  --bottomBorder:2px;
-  --glassBlur:12px;
-  --barSidePad:12px;
-
-  /* Aurora tuning */
-  --aurora-blur:8px;
-  --aurora-opacity:.30;
-  --aurora-red-opacity:.60;
-  --aurora-speed-base:12s;
-  --aurora-speed-red:7.5s;
-}
-
-*{ box-sizing:border-box; -webkit-tap-highlight-color:transparent; }
-html, body{ height:100%; }
-body{
-  margin:0; background:var(--bg); color:var(--ink);
-  font-family:system-ui,-apple-system,Segoe UI,Roboto,Inter,Arial,sans-serif;
-}
-
-/* ===== Top bar wrapper ===== */
-.topbar-wrap{
-  position:fixed; left:0; right:0; top:0; z-index:1000;
-  padding:
-    calc(env(safe-area-inset-top) + 3px)
-    calc(max(env(safe-area-inset-right),0px) + var(--barSidePad))
-    6px
-    calc(max(env(safe-area-inset-left),0px) + var(--barSidePad));
-}
-.topbar{
-  position:relative;
-  height:var(--barH);
-  display:flex; align-items:center;
-  border-radius:var(--barRadius);
-  background:linear-gradient(180deg, rgba(0,0,0,.92), rgba(0,0,0,.96) 60%, #000 100%);
-  border:1px solid rgba(255,255,255,.06);
-  box-shadow:0 10px 26px rgba(0,0,0,.45), inset 0 1px 0 rgba(255,255,255,.06), inset 0 -1px 0 rgba(255,255,255,.03);
-  backdrop-filter:blur(var(--glassBlur)) saturate(130%);
-  -webkit-backdrop-filter:blur(var(--glassBlur)) saturate(130%);
-  overflow:visible;
-}
-
-/* Neon pulse ring */
-.topbar::after{
-  content:"";
-  position:absolute; inset:-6px; border-radius:inherit;
-  background:radial-gradient(closest-side, rgba(0,184,255,.55), rgba(0,184,255,.25) 55%, rgba(0,184,255,0) 70%);
-  opacity:0; transform:scale(.96);
-  pointer-events:none;
-}
-.topbar.pulse::after{ animation:barPulse 1.6s ease-out .2s 1 forwards; }
-@keyframes barPulse{
-  0%   { opacity:.0;  transform:scale(.96); }
-  15%  { opacity:.9;  transform:scale(.985); }
-  60%  { opacity:.25; transform:scale(1.06); }
-  100% { opacity:0;   transform:scale(1.08); }
-}
-
-.bar-inner{
-  display:grid; grid-template-columns:44px 1fr 44px;
-  align-items:center; width:100%; padding:0 4px;
-}
-
-/* ===== Flat deep-black circular buttons (blue ring for ComfyUI) ===== */
-.iconbtn{
-  appearance:none; cursor:pointer;
-  position:relative; isolation:isolate;
-  width:36px; height:36px; border-radius:999px;
-  display:inline-grid; place-items:center; overflow:hidden;
-
-  background:#000;
-  border:1px solid rgba(var(--magenta-rgb), .86);
-  box-shadow:none; backdrop-filter:none; -webkit-backdrop-filter:none;
-
-  color:#fff;
-  transition:transform .08s ease, opacity .12s ease;
-  -webkit-mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-          mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-  -webkit-mask-repeat:no-repeat; mask-repeat:no-repeat;
-  -webkit-mask-position:center; mask-position:center;
-  -webkit-mask-size:100% 100%; mask-size:100% 100%;
-}
-
-/* Aurora layers INSIDE the circle, fully clipped */
-.iconbtn .aurora{
-  position:absolute; inset:0; border-radius:inherit;
-  clip-path:circle(50% at 50% 50%);
-  -webkit-mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-          mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-  filter:blur(var(--aurora-blur)); mix-blend-mode:screen;
-  will-change:transform; transform:translateZ(0);
-  pointer-events:none;
-}
-.iconbtn .aurora.base{
-  opacity:var(--aurora-opacity);
-  background:
-    radial-gradient(60% 70% at 20% 30%, var(--c-cyan) 0%, transparent 60%),
-    radial-gradient(55% 65% at 78% 35%, var(--c-mint) 0%, transparent 68%),
-    radial-gradient(65% 55% at 52% 80%, var(--c-violet) 0%, transparent 68%),
-    radial-gradient(55% 70% at 32% 72%, var(--c-blue) 0%, transparent 80%);
-  animation:auroraDrift var(--aurora-speed-base) ease-in-out infinite;
-}
-.iconbtn .aurora.red{
-  opacity:var(--aurora-red-opacity);
-  background:radial-gradient(70% 50% at 70% 25%, rgba(255,95,109,.95) 0%, rgba(255,95,109,0) 60%);
-  animation:auroraRibbon var(--aurora-speed-red) linear infinite;
-}
-
-/* subtle inner specular */
-.iconbtn::after{
-  content:""; position:absolute; inset:0; border-radius:inherit;
-  background:linear-gradient(180deg, rgba(255,255,255,.12), rgba(255,255,255,0) 45%);
-  mix-blend-mode:soft-light; pointer-events:none;
-}
-
-/* icon */
-.iconbtn svg{
-  position:relative; z-index:1; width:20px; height:20px;
-  stroke:currentColor; fill:none; stroke-width:2; stroke-linecap:round; stroke-linejoin:round;
-}
-
-/* interactions */
-.iconbtn:hover{ opacity:.96; }
-.iconbtn:active{ transform:translateY(1px); }
-.iconbtn:focus-visible{ outline:2px solid rgba(var(--magenta-rgb), .85); outline-offset:2px; }
-
-/* Motion */
-@keyframes auroraDrift{
-  0%   { transform:translate(-12%, -9%) scale(1.04) rotate(0deg); }
-  50%  { transform:translate(12%, 9%)  scale(1.12) rotate(180deg); }
-  100% { transform:translate(-12%, -9%) scale(1.04) rotate(360deg); }
-}
-@keyframes auroraRibbon{
-  0%   { transform:translate(-18%, -6%) scale(1.05) rotate(0deg); }
-  50%  { transform:translate(18%, 8%)  scale(1.18) rotate(180deg); }
-  100% { transform:translate(-18%, -6%) scale(1.05) rotate(360deg); }
-}
-
-@media (prefers-reduced-motion: reduce){
-  .iconbtn .aurora{ animation:none; }
-  .topbar.pulse::after{ animation:none; opacity:0; }
-}
-
-/* Title */
-.title{
-  text-align:center; font-weight:700; font-size:.9rem; line-height:1;
-  letter-spacing:.2px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;
-  text-shadow:0 1px 1px rgba(0,0,0,.35); padding:0 4px;
-}
-.title a{ color:#eaf6ff; text-decoration:none; }
-
-/* Frame */
-.frameWrap{
-  position:fixed;
-  top:calc(var(--barH) + env(safe-area-inset-top) + 6px);
-  left:0; right:0; bottom:max(env(safe-area-inset-bottom), 0px);
-  background:var(--panel);
-  border-left:var(--sideBorder) solid #000;
-  border-right:var(--sideBorder) solid #000;
-  border-top:1px solid #000;
-  border-bottom:var(--bottomBorder) solid #000;
-  overflow:hidden;
-}
-iframe{ width:100%; height:100%; border:0; display:block; background:#0b0c1a; }
-.sr-only{
-  position:absolute; width:1px; height:1px; padding:0; margin:-1px; overflow:hidden;
-  clip:rect(0,0,0,0); white-space:nowrap; border:0;
-}
-@supports (-webkit-touch-callout: none) { .frameWrap{ bottom:0; } }
-@media (max-width:360px){ .title{ font-size:.86rem; } }
-
-/* === Auto-hide border + topbar in landscape to maximize canvas === */
-@media (orientation: landscape){
-  .topbar-wrap{ display:none !important; }
-  .frameWrap{ top:0 !important; border:0 !important; }
-}
-
-/* --- Stability for sticky header & vivid green lock text --- */
-.header{transform:translateZ(0);-webkit-transform:translateZ(0);backface-visibility:hidden;-webkit-backface-visibility:hidden;will-change:transform;contain:paint}
-.statusHot{color:#40f19a;font-weight:800}
-/* shutdown status styling */
-#headerBar.statusComplete{color:#ff5f6d;font-weight:800}
-
-
-</style></head><body>
-
-  <div class="topbar-wrap">
-    <div class="topbar" id="topbar">
-      <div class="bar-inner">
-        <button class="iconbtn" id="backBtn" title="Back" aria-label="Back">
-          <span class="aurora base"></span>
-          <span class="aurora red"></span>
-          <svg viewBox="0 0 24 24"><path d="M15 18l-6-6 6-6"/></svg>
-        </button>
-
-       <div class="title">
-  <a href="https://www.comfy.org/" target="_blank" rel="noopener">ComfyUI</a>
-</div>
-        <button class="iconbtn" id="refreshBtn" title="Refresh" aria-label="Refresh">
-          <span class="aurora base"></span>
-          <span class="aurora red"></span>
-          <svg viewBox="0 0 24 24">
-            <path d="M3 12a9 9 0 0 1 14.5-6.36M21 12a9 9 0 0 1-14.5 6.36"/>
-            <path d="M3 5v6h6"/>
-          </svg>
-        </button>
-      </div>
-    </div>
-  </div>
-
-  <div class="frameWrap">
-    <iframe id="comfyFrame" src="about:blank" referrerpolicy="no-referrer"></iframe>
-  </div>
-
-  <div class="sr-only" id="comfyStatus" aria-live="polite">Loading ComfyUI…</div>
-
-<script>
-const CSRF = "{{ csrf_token }}";
-async function getComfyURL(){
-  try{
-    const n = await (await fetch('/netinfo')).json();
-    const port = (n && n.comfy_port) ? n.comfy_port : 8188;
-    const host = location.hostname || '127.0.0.1';
-    // direct http is expected (same-LAN). If you serve over https, ensure a proxy to avoid mixed content.
-    return location.protocol + '//' + host + ':' + port + '/';
-  }catch(_){
-    const host = location.hostname || '127.0.0.1';
-    return location.protocol + '//' + host + ':8188/';
-  }
-}
-
-async function ensureComfy(){
-  try { await fetch('/ensure_comfy', { method:'POST', headers:{ 'X-CSRF-Token': CSRF } }); } catch(e){}
-}
-function bustURL(u){ return u + (u.includes('?') ? '&' : '?') + 'r=' + Date.now(); }
-function triggerBarPulse(){
-  const bar = document.getElementById('topbar');
-  if(!bar) return;
-  bar.classList.remove('pulse'); void bar.offsetWidth; bar.classList.add('pulse');
-}
-async function loadComfy(){
-  const f = document.getElementById('comfyFrame');
-  const st = document.getElementById('comfyStatus');
-  const url = await getComfyURL();
-  f.onload = () => { st.textContent = 'ComfyUI Ready'; };
-  f.src = bustURL(url);
-}
-
-document.getElementById('backBtn').addEventListener('click', () => { location.href = '/'; });
-document.getElementById('refreshBtn').addEventListener('click', async () => {
-  const f = document.getElementById('comfyFrame');
-  const url = await getComfyURL();
-  f.src = bustURL(url);
-  document.getElementById('comfyStatus').textContent = 'Refreshing…';
-  triggerBarPulse();
-});
-
-(async () => {
-  await ensureComfy();
-  await loadComfy();
-  triggerBarPulse();
-})();
-</script>
-</body></html>
-"""
-
-
-
-# ---------- SMART GALLERY PAGE (frame + toolbar) ----------
-GALLERY_TEMPLATE = """
-<!doctype html><html lang="en"><head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover"/>
-<title>Pocket Comfy • Gallery</title>
-<meta name="theme-color" content="#000000">
-<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
-<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
-<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
-<style>
-:root{
-  --bg:#0a0b1e;
-  --panel:#0b0c1a;
-  --ink:#eaf6ff;
-
-  /* neon + aurora palette (warmer ring for Gallery) */
-  --magenta-rgb: 255, 120, 90;
-  --magenta: rgb(var(--magenta-rgb));
-  --c-cyan:#00eaff;
-  --c-mint:#7cffc4;
-  --c-violet:#b28dff;
-  --c-blue:#00b3ff;
-  --c-red:#ff5f6d;
-
-  --barH:45px;
-  --barRadius:16px;
-  --sideBorder:3px;
-  --bottomBorder:2px;
-  --glassBlur:12px;
-  --barSidePad:12px;
-
-  /* Aurora tuning */
-  --aurora-blur:8px;
-  --aurora-opacity:.30;
-  --aurora-red-opacity:.60;
-  --aurora-speed-base:12s;
-  --aurora-speed-red:7.5s;
-}
-
-*{ box-sizing:border-box; -webkit-tap-highlight-color:transparent; }
-html, body{ height:100%; }
-body{
-  margin:0; background:var(--bg); color:var(--ink);
-  font-family:system-ui,-apple-system,Segoe UI,Roboto,Inter,Arial,sans-serif;
-}
-
-/* ===== Top bar wrapper ===== */
-.topbar-wrap{
-  position:fixed; left:0; right:0; top:0; z-index:1000;
-  padding:
-    calc(env(safe-area-inset-top) + 3px)
-    calc(max(env(safe-area-inset-right),0px) + var(--barSidePad))
-    6px
-    calc(max(env(safe-area-inset-left),0px) + var(--barSidePad));
-}
-.topbar{
-  position:relative;
-  height:var(--barH);
-  display:flex; align-items:center;
-  border-radius:var(--barRadius);
-  background:linear-gradient(180deg, rgba(0,0,0,.92), rgba(0,0,0,.96) 60%, #000 100%);
-  border:1px solid rgba(255,255,255,.06);
-  box-shadow:0 10px 26px rgba(0,0,0,.45), inset 0 1px 0 rgba(255,255,255,.06), inset 0 -1px 0 rgba(255,255,255,.03);
-  backdrop-filter:blur(var(--glassBlur)) saturate(130%);
-  -webkit-backdrop-filter:blur(var(--glassBlur)) saturate(130%);
-  overflow:visible;
-}
-
-/* Neon pulse ring */
-.topbar::after{
-  content:"";
-  position:absolute; inset:-6px; border-radius:inherit;
-  background:radial-gradient(closest-side, rgba(255,160,120,.55), rgba(255,160,120,.25) 55%, rgba(255,160,120,0) 70%);
-  opacity:0; transform:scale(.96);
-  pointer-events:none;
-}
-.topbar.pulse::after{ animation:barPulse 1.6s ease-out .2s 1 forwards; }
-@keyframes barPulse{
-  0%   { opacity:.0;  transform:scale(.96); }
-  15%  { opacity:.9;  transform:scale(.985); }
-  60%  { opacity:.25; transform:scale(1.06); }
-  100% { opacity:0;   transform:scale(1.08); }
-}
-
-.bar-inner{
-  display:grid; grid-template-columns:44px 1fr 44px;
-  align-items:center; width:100%; padding:0 4px;
-}
-
-/* ===== Flat deep-black circular buttons ===== */
-.iconbtn{
-  appearance:none; cursor:pointer;
-  position:relative; isolation:isolate;
-  width:36px; height:36px; border-radius:999px;
-  display:inline-grid; place-items:center; overflow:hidden;
-
-  background:#000;
-  border:1px solid rgba(var(--magenta-rgb), .86);
-  box-shadow:none; backdrop-filter:none; -webkit-backdrop-filter:none;
-
-  color:#fff;
-  transition:transform .08s ease, opacity .12s ease;
-  -webkit-mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-          mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-  -webkit-mask-repeat:no-repeat; mask-repeat:no-repeat;
-  -webkit-mask-position:center; mask-position:center;
-  -webkit-mask-size:100% 100%; mask-size:100% 100%;
-}
-
-/* Aurora layers INSIDE the circle, fully clipped */
-.iconbtn .aurora{
-  position:absolute; inset:0;
-  border-radius:inherit;
-  clip-path:circle(50% at 50% 50%);
-  -webkit-mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-          mask-image: radial-gradient(closest-side, #000 99.7%, transparent 100%);
-  filter:blur(var(--aurora-blur)); mix-blend-mode:screen;
-  will-change:transform; transform:translateZ(0);
-  pointer-events:none;
-}
-.iconbtn .aurora.base{
-  opacity:var(--aurora-opacity);
-  background:
-    radial-gradient(60% 70% at 20% 30%, var(--c-cyan) 0%, transparent 60%),
-    radial-gradient(55% 65% at 78% 35%, var(--c-mint) 0%, transparent 68%),
-    radial-gradient(65% 55% at 52% 80%, var(--c-violet) 0%, transparent 68%),
-    radial-gradient(55% 70% at 32% 72%, var(--c-blue) 0%, transparent 80%);
-  animation:auroraDrift var(--aurora-speed-base) ease-in-out infinite;
-}
-.iconbtn .aurora.red{
-  opacity:var(--aurora-red-opacity);
-  background:radial-gradient(70% 50% at 70% 25%, rgba(255,95,109,.95) 0%, rgba(255,95,109,0) 60%);
-  animation:auroraRibbon var(--aurora-speed-red) linear infinite;
-}
-
-/* subtle inner specular */
-.iconbtn::after{
-  content:""; position:absolute; inset:0; border-radius:inherit;
-  background:linear-gradient(180deg, rgba(255,255,255,.12), rgba(255,255,255,0) 45%);
-  mix-blend-mode:soft-light; pointer-events:none;
-}
-
-/* icon */
-.iconbtn svg{
-  position:relative; z-index:1; width:20px; height:20px;
-  stroke:currentColor; fill:none; stroke-width:2; stroke-linecap:round; stroke-linejoin:round;
-}
-
-/* interactions */
-.iconbtn:hover{ opacity:.96; }
-.iconbtn:active{ transform:translateY(1px); }
-.iconbtn:focus-visible{ outline:2px solid rgba(var(--magenta-rgb), .85); outline-offset:2px; }
+# ---------- COMFYUI PAGE (frame + toolbar) ---------- 
+COMFYUI_TEMPLATE = """
+<!doctype html><html lang="en" data-service="comfy" data-port="8188" data-label="ComfyUI" class="landscape-full"><head>
+<meta charset="utf-8"/>
+<meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover"/>
+<title>Pocket Comfy • ComfyUI</title>
+<meta name="theme-color" content="#000000">
+<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
+<link rel="manifest" href="{{ url_for('web_manifest') }}">
+<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
+<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
+<link rel="stylesheet" href="{{ bundle_url('frame.css') }}"></head><body>
 
-/* Motion */
-@keyframes auroraDrift{
-  0%   { transform:translate(-12%, -9%) scale(1.04) rotate(0deg); }
-  50%  { transform:translate(12%, 9%)  scale(1.12) rotate(180deg); }
-  100% { transform:translate(-12%, -9%) scale(1.04) rotate(360deg); }
-}
-@keyframes auroraRibbon{
-  0%   { transform:translate(-18%, -6%) scale(1.05) rotate(0deg); }
-  50%  { transform:translate(18%, 8%)  scale(1.18) rotate(180deg); }
-  100% { transform:translate(-18%, -6%) scale(1.05) rotate(360deg); }
-}
+  <div class="topbar-wrap">
+    <div class="topbar" id="topbar">
+      <div class="bar-inner">
+        <button class="iconbtn" id="backBtn" title="Back" aria-label="Back">
+          <span class="aurora base"></span>
+          <span class="aurora red"></span>
+          <svg viewBox="0 0 24 24"><path d="M15 18l-6-6 6-6"/></svg>
+        </button>
 
-@media (prefers-reduced-motion: reduce){
-  .iconbtn .aurora{ animation:none; }
-  .topbar.pulse::after{ animation:none; opacity:0; }
-}
+       <div class="title">
+  <a href="https://www.comfy.org/" target="_blank" rel="noopener">ComfyUI</a>
+</div>
+        <button class="iconbtn" id="refreshBtn" title="Refresh" aria-label="Refresh">
+          <span class="aurora base"></span>
+          <span class="aurora red"></span>
+          <svg viewBox="0 0 24 24">
+            <path d="M3 12a9 9 0 0 1 14.5-6.36M21 12a9 9 0 0 1-14.5 6.36"/>
+            <path d="M3 5v6h6"/>
+          </svg>
+        </button>
+      </div>
+    </div>
+  </div>
 
-/* Title */
-.title{
-  text-align:center; font-weight:700; font-size:.9rem; line-height:1;
-  letter-spacing:.2px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;
-  text-shadow:0 1px 1px rgba(0,0,0,.35); padding:0 4px;
-}
-.title a{ color:#eaf6ff; text-decoration:none; }
+  <div class="frameWrap">
+    <iframe id="svcFrame" src="about:blank" referrerpolicy="no-referrer"></iframe>
+  </div>
 
-/* Frame */
-.frameWrap{
-  position:fixed;
-  top:calc(var(--barH) + env(safe-area-inset-top) + 6px);
-  left:0; right:0; bottom:max(env(safe-area-inset-bottom), 0px);
-  background:var(--panel);
-  border-left:var(--sideBorder) solid #000;
-  border-right:var(--sideBorder) solid #000;
-  border-top:1px solid #000;
-  border-bottom:var(--bottomBorder) solid #000;
-  overflow:hidden;
-}
-iframe{ width:100%; height:100%; border:0; display:block; background:#0b0c1a; }
-.sr-only{
-  position:absolute; width:1px; height:1px; padding:0; margin:-1px; overflow:hidden;
-  clip:rect(0,0,0,0); white-space:nowrap; border:0;
-}
-@supports (-webkit-touch-callout: none) { .frameWrap{ bottom:0; } }
-@media (max-width:360px){ .title{ font-size:.86rem; } }
+  <div class="sr-only" id="svcStatus" aria-live="polite">Loading ComfyUI…</div>
 
-/* === Auto-hide border + topbar in landscape === */
-@media (orientation: landscape){
-  .topbar-wrap{ display:none !important; }
-  .frameWrap{ top:0 !important; border:0 !important; }
-}
+<script>let CSRF = "{{ csrf_token }}"; const PROXY = {{ 'true' if service_proxy else 'false' }};</script>
+<script src="{{ bundle_url('frame.js') }}"></script>
+</body></html>
+"""
 
-/* --- Stability for sticky header & vivid green lock text --- */
-.header{transform:translateZ(0);-webkit-transform:translateZ(0);backface-visibility:hidden;-webkit-backface-visibility:hidden;will-change:transform;contain:paint}
-.statusHot{color:#40f19a;font-weight:800}
-/* shutdown status styling */
-#headerBar.statusComplete{color:#ff5f6d;font-weight:800}
 
 
-</style></head><body>
+# ---------- SMART GALLERY PAGE (frame + toolbar) ----------
+GALLERY_TEMPLATE = """
+<!doctype html><html lang="en" data-service="gallery" data-port="8189" data-label="Smart Gallery" class="landscape-full"><head>
+<meta charset="utf-8"/>
+<meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover"/>
+<title>Pocket Comfy • Gallery</title>
+<meta name="theme-color" content="#000000">
+<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
+<link rel="manifest" href="{{ url_for('web_manifest') }}">
+<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
+<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
+<link rel="stylesheet" href="{{ bundle_url('frame.css') }}"></head><body>
 
   <div class="topbar-wrap">
     <div class="topbar" id="topbar">
@@ -1591,75 +2665,18 @@ iframe{ width:100%; height:100%; border:0; display:block; background:#0b0c1a; }
   </div>
 
   <div class="frameWrap">
-    <iframe id="galleryFrame" src="about:blank" referrerpolicy="no-referrer"></iframe>
+    <iframe id="svcFrame" src="about:blank" referrerpolicy="no-referrer"></iframe>
   </div>
 
-  <div class="sr-only" id="galleryStatus" aria-live="polite">Loading Smart Gallery…</div>
-
-<script>
-const CSRF = "{{ csrf_token }}";
-async function getGalleryURL(){
-  try{
-    const n = await (await fetch('/netinfo')).json();
-    const port = (n && n.gallery_port) ? n.gallery_port : 8189;
-    const host = location.hostname || '127.0.0.1';
-    // direct http is expected (same-LAN). If you serve over https, proxy to avoid mixed content.
-    return location.protocol + '//' + host + ':' + port + '/';
-  }catch(_){
-    const host = location.hostname || '127.0.0.1';
-    return location.protocol + '//' + host + ':8189/';
-  }
-}
-
-async function ensureGallery(){
-  try { await fetch('/ensure_gallery', { method:'POST', headers:{ 'X-CSRF-Token': CSRF } }); } catch(e){}
-}
-function bustURL(u){ return u + (u.includes('?') ? '&' : '?') + 'r=' + Date.now(); }
-
-/* Trigger the neon pulse on the bar */
-function triggerBarPulse(){
-  const bar = document.getElementById('topbar');
-  if(!bar) return;
-  bar.classList.remove('pulse'); void bar.offsetWidth; bar.classList.add('pulse');
-}
-
-async function loadGallery(){
-  const f = document.getElementById('galleryFrame');
-  const st = document.getElementById('galleryStatus');
-  const url = await getGalleryURL();
-  f.onload = () => { st.textContent = 'Smart Gallery Ready'; };
-  f.src = bustURL(url);
-}
-
-document.getElementById('backBtn').addEventListener('click', () => { location.href = '/'; });
-document.getElementById('refreshBtn').addEventListener('click', async () => {
-  const f = document.getElementById('galleryFrame');
-  const url = await getGalleryURL();
-  f.src = bustURL(url);
-  document.getElementById('galleryStatus').textContent = 'Refreshing…';
-  triggerBarPulse();
-});
+  <div class="sr-only" id="svcStatus" aria-live="polite">Loading Smart Gallery…</div>
 
-(async () => {
-  await ensureGallery();
-  await loadGallery();
-  triggerBarPulse();
-})();
-</script>
+<script>let CSRF = "{{ csrf_token }}"; const PROXY = {{ 'true' if service_proxy else 'false' }};</script>
+<script src="{{ bundle_url('frame.js') }}"></script>
 </body></html>
 """
 
 # ---------- MAIN CONTROL PAGE ----------         
-TEMPLATE = """
-<!doctype html><html lang="en"><head>
-<meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/>
-<title>Pocket Comfy</title>
-<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
-<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
-<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
-<link rel="preload" as="image" href="{{ url_for('static', filename='comfy-mascot.webp') }}{% if request.args.get('switched') %}?v={{ request.args.get('r','') }}{% endif %}">
-<meta name="apple-mobile-web-app-capable" content="yes"><meta name="apple-mobile-web-app-status-bar-style" content="black">
-<style>
+DASHBOARD_CSS = """
 :root{
   --bg0:#0a0b1e; --panel:#121436; --text:#eaf6ff; --muted:#a7b6ff;
   --accent1:#a86eff; --accent2:#5e36ff; --accent3:#00d9ff;
@@ -1726,6 +2743,7 @@ h1{margin:18px 0 8px;text-align:center;font-size:1.7rem;color:#e8edff;font-weigh
 .container{max-width:520px;margin:0 auto;padding:16px;display:flex;flex-direction:column;gap:14px}
 .panel{background:linear-gradient(180deg, rgba(255,255,255,.02), transparent), var(--panel);border:1px solid #2a2f73;border-radius:var(--radius);padding:14px;box-shadow:0 8px 18px rgba(0,0,0,.45)}
 .panel.warn{border-color:#5a1a2a;background:linear-gradient(180deg, rgba(255,30,77,.05), transparent), #151020}
+picture{display:contents}
 
 /* default CTA link (Open Comfy Mini keeps gradient) */
 a.btnlink,a.btnlink:visited{
@@ -2143,6 +3161,14 @@ input[type=password],input[type=text]{flex:1;padding:14px;font-size:1rem;border-
 .muted{color:#8aa;font-size:.88rem;word-break:break-all;margin-top:10px}
 .muted + .muted{margin-top:4px}
 .tiny{color:#9ab;font-size:.86rem;margin:4px 0 10px}
+.progressPanel{display:none}
+.progressPanel.live{display:block}
+.progressHead{display:flex;justify-content:space-between;gap:10px;font-size:.9rem;color:var(--muted)}
+.progressHead strong{color:var(--text)}
+.progressBar{height:8px;margin-top:10px;border-radius:999px;background:#1b1f52;overflow:hidden}
+.progressBar>span{display:block;height:100%;width:0;background:linear-gradient(90deg,var(--accent2),var(--accent3));transition:width .25s ease}
+.progressPreview{display:none;width:100%;margin-top:12px;border-radius:12px;border:1px solid #2a2f73}
+.progressPreview.on{display:block}
 
 /* Network panel + mascot */
 .netPanel{ position:relative; overflow:hidden; }
@@ -2289,122 +3315,27 @@ a.btnlink:focus-visible, button:focus-visible{
 .bmacLink:focus, .ghLink:focus-visible{ outline:none; }
 .bmacLink img{ display:block; width:100%; height:100%; pointer-events:none; user-select:none; }
 
-/* --- Stability for sticky header & vivid green lock text --- */
-.header{transform:translateZ(0);-webkit-transform:translateZ(0);backface-visibility:hidden;-webkit-backface-visibility:hidden;will-change:transform;contain:paint}
-.statusHot{color:#40f19a;font-weight:800}
-/* shutdown status styling */
-#headerBar.statusComplete{color:#ff5f6d;font-weight:800}
-
-
-</style></head><body>
-<div class="header" id="headerBar">Loading status…</div>
-
-<h1>
-  <span class="brand">
-    <span class="mascot"><a href="https://github.com/PastLifeDreamer/Pocket-Comfy" target="_blank" rel="noopener"><img id="mascotImg" src="{{ url_for('static', filename='comfy-mascot.webp') }}{% if request.args.get('switched') %}?v={{ request.args.get('r','') }}{% endif %}" alt="Mascot" fetchpriority="high" loading="eager" decoding="async"></a></span>
-    <span class="title">Pocket Comfy</span>
-  </span>
-</h1>
-
-<div class="container">
-  <!-- Panel 1: Comfy Mini (original bracket size) -->
-  <div class="panel">
-    <a class="btnlink" id="openMiniBtn" href="#">
-      <span class="ico">
-        <img src="{{ url_for('static', filename='Comfy-Mini.webp') }}" alt="" decoding="async" loading="eager">
-      </span>
-      <span class="label">Comfy Mini</span>
-          <span id="miniDot" class="mode-dot"></span>
-    </a>
-  </div>
-
-  <!-- Panel 2: ComfyUI (black, logo-only) -->
-  <div class="panel">
-    <!-- IMPORTANT: link directly to wrapper route so border/top panel render and port 8188 loads inside it -->
-    <a class="btnlink" id="openComfyUiBtn" href="/comfyui" aria-label="Open ComfyUI">
-      <span class="ico">
-        <img src="{{ url_for('static', filename='comfyui-text.webp') }}" alt="Comfy" decoding="async" loading="eager">
-      </span>
-          <span id="comfyDot" class="mode-dot"></span>
-    </a>
-  </div>
-
-  <!-- Panel 3: Gallery (same bracket size as ComfyUI) -->
-  <div class="panel">
-    <button class="gallery" id="openGalleryBtn">
-      <span class="ico">
-        <img src="{{ url_for('static', filename='ModernMinimalGalleryLogo.webp') }}" alt="" width="32" height="32" decoding="async" loading="eager">
-      </span>
-      Smart Gallery
-      <span id="galleryDot" class="mode-dot"></span>
-    </button>
-  </div>
-
-  <div class="panel">
-    <button class="restart" onclick="post('/restart').then(ok=>{ if(ok){ restartInProgress=true; stoppedOverride=false; toast('Restarting Comfy + Mini…'); }})"><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 12a9 9 0 0115.5-6.36M21 12a9 9 0 01-15.5 6.36"/><path d="M3 5v6h6"/></svg></span>Restart Comfy + Mini</button>
-    <button class="stop" onclick="post('/stop').then(ok=>{ if(ok){ stoppedOverride=true; renderHeader({comfy:false,mini:false}, true); toast('Stopped apps (panel still up)'); } })"><span class="ico"><svg viewBox="0 0 24 24"><rect x="6" y="6" width="12" height="12" rx="2"/></svg></span>Stop Comfy + Mini</button>
-  </div>
-
-  <div class="panel">
-    <div class="tiny"><strong>Run Hidden:</strong> Hides the Python console on your PC.<br><strong>Run Visible:</strong> Brings your console back for visibility. <strong>Note:</strong> Both restart Pocket Comfy + ComfyUI + Mini.</div>
-    <button class="vis" id="visHideBtn"><span class="hold-fill" id="visHideFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 3l18 18"/><path d="M10 10a2 2 0 102.83 2.83"/><path d="M2 12s4-7 10-7 10 7 10 7"/></svg></span>Run Hidden<span id="hiddenDot" class="mode-dot"></span></button>
-    <button class="vis" id="visShowBtn"><span class="hold-fill" id="visShowFill"></span><span class="ico"><svg viewBox="0 0 24 24"><rect x="3" y="4" width="18" height="12" rx="2"/><path d="M8 20h8"/></svg></span>Run Visible<span id="visibleDot" class="mode-dot"></span></button>
-  </div>
-
-  <div class="panel warn">
-    <div class="tiny">Press & hold 3 seconds for full script shutdown.       <strong>This stops Pocket Comfy, ComfyUI, Mini and closes the Python console on your PC!!!</strong> Relaunch on the PC to bring Pocket Comfy back.</div>
-    <button class="shutdown" id="shutdownBtn"><span class="hold-fill" id="shutdownFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M12 2v10"/><path d="M18.36 6.64a9 9 0 11-12.72 0"/></svg></span>Shutdown All</button>
-  </div>
-
-  <div class="panel">
-    <label for="pwd">(Password required for Delete & Recreate)</label>
-    <div class="pwdwrap">
-      <input id="pwd" type="password" placeholder="Password" autocomplete="off"/>
-      <button class="eye" id="toggleEye" title="Show/Hide" aria-label="Show/Hide Password">
-        <svg id="mpEyeIcon" viewBox="0 0 24 24" width="28" height="28">
-          <path d="M2 12s4-7 10-7 10 7 10 7-4 7-10 7S2 12 2 12Z"/><circle cx="12" cy="12" r="3"/>
-        </svg>
-      </button>
-    </div>
-    <button class="delete" id="deleteBtn" disabled><span class="hold-fill" id="deleteFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 6h18"/><path d="M8 6V4h8v2"/><path d="M6 6l1 14h10l1-14"/></svg></span>Delete Output Folder</button>
-    <button class="recreate" id="recreateBtn" disabled><span class="hold-fill" id="recreateFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 7h6l2 2h10v10H3z"/><path d="M12 12v6"/><path d="M9 15h6"/></svg></span>Recreate Output Folder</button>
-    <div class="muted">Only final folder in path is affected:</div>
-    <div class="muted">{{ delete_path }}</div>
-  </div>
-
-  <!-- Network panel with mascot -->
-  <div class="panel netPanel">
-    <div class="net" id="netinfo">Loading network info…</div>
-    <img class="matrixMascot" src="{{ url_for('static', filename='matrix-mascot.webp') }}" alt="" aria-hidden="true" />
-  </div>
-</div>
-
-<div class="footerWrap">
-  <!-- GitHub link image on the left (no tap indicators) -->
-  <a class="ghLink" href="https://github.com/PastLifeDreamer/Pocket-Comfy" target="_blank" rel="noopener">
-    <img src="{{ url_for('static', filename='Github-Link.webp') }}" alt="GitHub repository">
-  </a>
-
-  <!-- Buy Me A Coffee link image on the right (no tap indicators) -->
-  <a class="bmacLink" href="https://buymeacoffee.com/pastlifedreamer" target="_blank" rel="noopener">
-    <img src="{{ url_for('static', filename='BMAC.webp') }}" alt="Buy Me a Coffee">
-  </a>
+/* --- Stability for sticky header & vivid green lock text --- */
+.header{transform:translateZ(0);-webkit-transform:translateZ(0);backface-visibility:hidden;-webkit-backface-visibility:hidden;will-change:transform;contain:paint}
+.statusHot{color:#40f19a;font-weight:800}
+/* shutdown status styling */
+#headerBar.statusComplete{color:#ff5f6d;font-weight:800}
 
-  <div class="statusLine" id="statusBox">Ready.</div>
-  <div class="modeWrap">
-    <div id="modeBox" class="modeBadge" style="display:none">
-      <svg viewBox="0 0 24 24"><rect x="3" y="4" width="18" height="12" rx="2"/><path d="M8 20h8"/></svg>
-      <span>Mode: Visible</span>
-    </div>
-  </div>
-  <div class="sigLine">Flask server running • <span>Pocket Comfy</span> by <strong>PastLifeDreamer</strong></div>
-</div>
 
-<script>
-const CSRF="{{ csrf_token }}";
+"""
+
+DASHBOARD_JS = """
 function toast(m){ document.getElementById('statusBox').textContent=m; }
 function disableAllControls(){ document.querySelectorAll('button, a.btnlink').forEach(el=>{ el.disabled=true; el.setAttribute('aria-disabled','true'); el.classList.add('disabled'); }); }
-async function post(url, body=""){ try{ const r=await fetch(url,{method:'POST',headers:{'Content-Type':'application/x-www-form-urlencoded','X-CSRF-Token':CSRF,'X-Activity':'1'},body}); return (await r.text()).trim()==="success"; }catch(e){ toast("Request failed"); return false; } }
+/* A page served from the service worker cache may carry the token of a previous server run */
+async function refreshCsrf(){ try{ const r=await fetch('/csrf',{cache:'no-store'}); if(r.ok && !r.redirected){ CSRF=(await r.json()).token; return true; } }catch(_){} return false; }
+async function postForm(url, body, extra={}){
+  const send=()=>fetch(url,{method:'POST',headers:{'Content-Type':'application/x-www-form-urlencoded','X-CSRF-Token':CSRF,...extra},body});
+  let r=await send();
+  if(r.status===403 && await refreshCsrf()) r=await send();
+  return r;
+}
+async function post(url, body=""){ try{ const r=await postForm(url,body,{'X-Activity':'1'}); return (await r.text()).trim()==="success"; }catch(e){ toast("Request failed"); return false; } }
 function ping(){ fetch('/activity',{method:'POST',headers:{'X-CSRF-Token':CSRF}}); }
 window.addEventListener('focus', ping); document.addEventListener('visibilitychange', ()=>{ if(document.visibilityState==='visible') ping(); }); setInterval(()=>{ if(document.visibilityState==='visible') ping(); }, 30000);
 
@@ -2421,7 +3352,7 @@ function mpSetEye(show){
 mpEyeBtn.addEventListener('click',e=>{e.preventDefault(); mpSetEye(pwd.type==='password');});
 
 const delBtn=document.getElementById('deleteBtn'), recBtn=document.getElementById('recreateBtn'); let pwTimer=null;
-async function checkPw(){ const res=await fetch('/checkpw',{method:'POST',headers:{'Content-Type':'application/x-www-form-urlencoded','X-CSRF-Token':CSRF},body:'password='+encodeURIComponent(pwd.value)}); const ok=(await res.text()).trim()==='ok'; delBtn.disabled=!ok; recBtn.disabled=!ok; }
+async function checkPw(){ const res=await postForm('/checkpw','password='+encodeURIComponent(pwd.value)); const ok=(await res.text()).trim()==='ok'; delBtn.disabled=!ok; recBtn.disabled=!ok; }
 function schedulePwCheck(){ clearTimeout(pwTimer); pwTimer=setTimeout(checkPw,180); }
 pwd.addEventListener('input',schedulePwCheck); checkPw();
 
@@ -2444,7 +3375,6 @@ window.__statusLockMsg = null;
 const checkSVG = '<svg viewBox="0 0 24 24"><path d="M20 6L9 17l-5-5"/></svg>';
 const xSVG     = '<svg viewBox="0 0 24 24"><path d="M18 6 6 18M6 6l12 12"/></svg>';
 let stoppedOverride = false;
-let restartInProgress = false;
 function badge(ok,label){ return `<span class="badge ${ok?'ok':'bad'}">${ok?checkSVG:xSVG}<span>${label} ${ok?'Running':'Stopped'}</span></span>`; }
 function renderHeader(s, forceBadges=false){
   // Respect lock message during mode switch
@@ -2472,11 +3402,6 @@ if(!s){ header.textContent='Status unavailable'; return; }
     const mdot=document.getElementById('miniDot');
     if(mdot){ mdot.classList.remove('on','off','hidden'); mdot.classList.add(s.mini ? 'on' : 'off'); }
 }
-  if (restartInProgress && s.comfy && s.mini){
-    toast('Comfy + Mini back online');
-    restartInProgress = false;
-    stoppedOverride = false;
-  }
   renderModeBadge(s);
 }
 function renderModeBadge(s){
@@ -2485,11 +3410,115 @@ function renderModeBadge(s){
   box.querySelector('span').textContent='Mode: '+(s.mode_hidden?'Hidden':'Visible');
   box.style.display='inline-flex';
 }
-async function refreshHeader(){ try{ const s=await (await fetch('/status')).json(); renderHeader(s); }catch{ if(!window.__statusLockMsg){ header.textContent="Status unavailable"; } } }
-setInterval(refreshHeader,1000); refreshHeader();
-
-async function refreshNet(){ try{  const n=await (await fetch('/netinfo')).json(); const ip=n.lan_ip||'127.0.0.1', rc=n.flask_port||5000, c=n.comfy_port||8188, m=n.mini_port||3000, g=n.gallery_port||8189; document.getElementById('netinfo').innerHTML=`<div class="ipline"><strong>${ip}</strong></div><div class="ports"><div><strong>Remote Control Port:</strong> ${rc}</div><div><strong>ComfyUI Port:</strong> ${c}</div><div><strong>ComfyUI Mini Port:</strong> ${m}</div><div><strong>Smart Gallery Port:</strong> ${g}</div></div>`;  } catch {  document.getElementById('netinfo').textContent="Network info unavailable.";  } }
-setInterval(refreshNet,5000); refreshNet();
+/* The first read may be answered from the service worker cache; polls ask the network */
+async function refreshHeader(live){ try{ const s=await (await fetch('/status',live===true?{cache:'no-store'}:{})).json(); renderHeader(s); }catch{ if(!window.__statusLockMsg){ header.textContent="Status unavailable"; } } }
+function renderNet(n){ const ip=n.lan_ip||'127.0.0.1', rc=n.flask_port||5000, c=n.comfy_port||8188, m=n.mini_port||3000, g=n.gallery_port||8189; document.getElementById('netinfo').innerHTML=`<div class="ipline"><strong>${ip}</strong></div><div class="ports"><div><strong>Remote Control Port:</strong> ${rc}</div><div><strong>ComfyUI Port:</strong> ${c}</div><div><strong>ComfyUI Mini Port:</strong> ${m}</div><div><strong>Smart Gallery Port:</strong> ${g}</div></div>`; }
+async function refreshNet(live){ try{ renderNet(await (await fetch('/netinfo',live===true?{cache:'no-store'}:{})).json()); } catch {  document.getElementById('netinfo').textContent="Network info unavailable.";  } }
+
+/* Jobs: long actions answer at once with a job; its progress arrives as `job` events on /events,
+   or by polling /jobs/<id> while the stream is down */
+const jobWatchers=new Map(); let jobStreamUp=false, cancelJobId=null, shownJobId=null;
+function jobFinished(j){ return j.state==='done' || j.state==='failed' || j.state==='cancelled'; }
+function onJob(j){ const w=jobWatchers.get(j.id); if(w) w(j); else if(!jobFinished(j) || shownJobId===j.id) showJob(j); }
+function showJob(j){
+  const pct=j.progress==null || jobFinished(j) ? '' : ' '+Math.round(j.progress*100)+'%';
+  shownJobId=j.id; cancelJobId=j.cancellable ? j.id : null;
+  toast(j.label+': '+j.phase+(jobFinished(j) ? '' : '…')+pct+(j.cancellable ? ' · tap to cancel' : ''));
+}
+async function startJob(url, body=''){
+  try{ const r=await postForm(url, body, {'X-Activity':'1'}); return r.ok ? await r.json() : null; }catch(_){ return null; }
+}
+function followJob(job, onUpdate){
+  // Resolves with the final job; {state:'gone'} if the controller stops answering (shutdown, relaunch).
+  return new Promise(resolve=>{
+    let last=job, fails=0;
+    const finish=j=>{ jobWatchers.delete(job.id); clearInterval(poll); if(cancelJobId===job.id) cancelJobId=null; resolve(j); };
+    const handle=j=>{ last=j; onUpdate && onUpdate(j); if(jobFinished(j)) finish(j); };
+    const poll=setInterval(async()=>{
+      if(jobStreamUp) return;
+      try{
+        const r=await fetch('/jobs/'+job.id,{cache:'no-store'}); fails=0;
+        if(r.ok) handle(await r.json()); else if(r.status===404) finish({...last, state:'gone'});
+      }catch(_){ if(++fails>=3) finish({...last, state:'gone'}); }
+    }, 1000);
+    jobWatchers.set(job.id, handle);
+    handle(job);
+  });
+}
+document.getElementById('statusBox').addEventListener('click', ()=>{ if(cancelJobId) postForm('/jobs/'+cancelJobId+'/cancel',''); });
+async function runRestart(){
+  const job=await startJob('/restart'); if(!job){ toast('Restart failed'); return; }
+  stoppedOverride=false;
+  const j=await followJob(job, showJob);
+  toast(j.state==='done' ? 'Comfy + Mini back online' : j.state==='cancelled' ? 'Restart cancelled: apps stopped' : 'Restart failed'+(j.error ? ': '+j.error : ''));
+}
+async function runStop(){
+  const job=await startJob('/stop'); if(!job){ toast('Stop failed'); return; }
+  const j=await followJob(job, showJob);
+  if(j.state!=='done'){ toast('Stop failed'); return; }
+  stoppedOverride=true; renderHeader({comfy:false,mini:false}, true); toast('Stopped apps (panel still up)');
+}
+async function waitForNewController(oldBoot, t=60000){
+  const st=performance.now();
+  while(performance.now()-st<t){
+    try{ const r=await fetch('/boot',{cache:'no-store'}); if(r.ok){ const b=(await r.text()).trim(); if(b && b!==oldBoot) return true; } }catch(_){}
+    await new Promise(r=>setTimeout(r,400));
+  }
+  return false;
+}
+async function runRelaunch(url){
+  const job=await startJob(url);
+  if(!job){ window.__statusLockMsg=null; toast('Mode switch failed'); refreshHeader(true); return; }
+  const j=await followJob(job, showJob);
+  if(j.state==='failed' || j.state==='cancelled'){ window.__statusLockMsg=null; toast('Mode switch failed'+(j.error ? ': '+j.error : '')); refreshHeader(true); return; }
+  toast('Waiting for the new controller…');
+  await waitForNewController(job.boot);
+  location.replace('/login?switched=1&r='+Date.now());
+}
+
+/* Output folder size: the server indexes it in the background and pushes `event: storage` */
+function fmtBytes(n){ const u=['B','KB','MB','GB','TB']; let i=0; while(n>=1024 && i<u.length-1){ n/=1024; i++; } return (i ? n.toFixed(n<10?1:0) : n)+' '+u[i]; }
+function renderStorage(s){ const el=document.getElementById('storageLine'); if(!el) return;
+  el.textContent=!s.exists ? '' : `${fmtBytes(s.bytes)} · ${s.files.toLocaleString()} files`+(s.growth_bytes_per_hour ? ` · +${fmtBytes(s.growth_bytes_per_hour)}/h` : ''); }
+async function refreshStorage(){ try{ const s=await (await fetch('/storage',{cache:'no-store'})).json(); if(s.ready) renderStorage(s); }catch(_){} }
+
+/* Live status: /events pushes only on change; fall back to polling while the stream is down */
+let pollTimers=null;
+function startPolling(){ if(pollTimers) return; pollTimers=[setInterval(()=>refreshHeader(true),1000), setInterval(()=>refreshNet(true),5000), setInterval(refreshStorage,30000)]; refreshHeader(); refreshNet(); refreshStorage(); }
+function stopPolling(){ if(!pollTimers) return; pollTimers.forEach(clearInterval); pollTimers=null; }
+if (window.EventSource){
+  const es=new EventSource('/events');
+  es.addEventListener('status', e=>{ jobStreamUp=true; stopPolling(); const s=JSON.parse(e.data); renderHeader(s); renderNet(s); });
+  es.addEventListener('job', e=>{ jobStreamUp=true; onJob(JSON.parse(e.data)); });
+  es.addEventListener('storage', e=>renderStorage(JSON.parse(e.data)));
+  es.onopen=()=>{ jobStreamUp=true; };
+  es.onerror=()=>{ jobStreamUp=false; startPolling(); };
+  refreshHeader(); refreshNet();
+} else { startPolling(); }
+
+/* Generation progress: one shared ComfyUI connection server-side; previews fetched latest-only */
+if (window.EventSource){
+  const pPanel=document.getElementById('progressPanel'), pNode=document.getElementById('progressNode'),
+        pQueue=document.getElementById('progressQueue'), pFill=document.getElementById('progressFill'),
+        pImg=document.getElementById('progressPreview');
+  let wantSeq=0, loading=false;
+  function loadPreview(){ if(loading || !wantSeq) return; loading=true; const seq=wantSeq; const img=new Image();
+    img.onload=()=>{ pImg.src=img.src; pImg.classList.add('on'); loading=false; if(wantSeq!==seq) loadPreview(); };
+    img.onerror=()=>{ loading=false; };
+    img.src='/progress/preview?seq='+seq; }
+  function idle(){ pNode.innerHTML='<strong>Idle</strong>'; pFill.style.width='0%'; }
+  const ps=new EventSource('/progress');
+  ps.addEventListener('hub', e=>{ pPanel.classList.toggle('live', !!JSON.parse(e.data).connected); });
+  ps.addEventListener('comfy', e=>{
+    const m=JSON.parse(e.data), d=m.data||{};
+    if(m.type==='status'){ const q=((d.status||{}).exec_info||{}).queue_remaining||0; pQueue.textContent='Queue: '+q; if(!q) idle(); }
+    else if(m.type==='execution_start'){ pNode.innerHTML='<strong>Starting…</strong>'; pFill.style.width='0%'; pImg.classList.remove('on'); }
+    else if(m.type==='executing'){ if(d.node==null) idle(); else pNode.innerHTML='<strong>Running</strong> node '+String(d.node).replace(/[<>&]/g,''); }
+    else if(m.type==='progress' && d.max){ pFill.style.width=Math.round(100*d.value/d.max)+'%'; }
+    else if(m.type==='execution_success' || m.type==='execution_interrupted' || m.type==='execution_error'){ idle(); }
+  });
+  ps.addEventListener('preview', e=>{ wantSeq=JSON.parse(e.data).seq; loadPreview(); });
+}
 
 /* press-and-hold helper */
 function holdFill(btnId, fillId, dur, onComplete, reqEnabled=true, hooks={}){ const btn=document.getElementById(btnId), fill=document.getElementById(fillId); let timer=null, raf=null, start=0, finished=false; function startHold(e){ e.preventDefault(); if (reqEnabled && btn.disabled) return; if (timer) return; start=performance.now(); finished=false; fill.style.width='0%'; timer=setTimeout(async()=>{ finished=true; cancelAnimationFrame(raf); fill.style.width='100%'; hooks.onFinish && hooks.onFinish(btn, e); await onComplete(e); }, dur); hooks.onStart && hooks.onStart(btn, e); animate(); } function animate(){ const pct=Math.min(100, ((performance.now()-start)/dur)*100); fill.style.width=pct+'%'; if (timer) raf=requestAnimationFrame(animate); } function cancelHold(e){ if (e) e.preventDefault(); if (timer){ clearTimeout(timer); timer=null; } cancelAnimationFrame(raf); raf=null; fill.style.width='0%'; if (!finished && hooks.onCancel) hooks.onCancel(btn, e); finished=false; } btn.addEventListener('pointerdown',startHold,{passive:false}); ['pointerup','pointerleave','pointercancel'].forEach(ev=>btn.addEventListener(ev,cancelHold,{passive:false})); }
@@ -2510,14 +3539,15 @@ holdFill('shutdownBtn','shutdownFill',3000, async(e)=>{
   disableAllControls();
   stoppedOverride = true;
 try { ['galleryDot','comfyDot','miniDot'].forEach(id=>{ const d=document.getElementById(id); if(d){ d.classList.remove('on','off','hidden'); d.classList.add('off'); }});} catch(_){/* no-op */}
-await post('/shutdown');
+const job=await startJob('/shutdown');
+  if(job) await followJob(job, showJob);
   await waitForStopped(6000);
 }, false, { onStart:(b)=>b.classList.add('holding'), onCancel:(b)=>b.classList.remove('holding'), onFinish:(b)=>b.classList.remove('holding') });
 
-holdFill('visHideBtn','visHideFill',3000, async()=>{ disableAllControls(); window.__statusLockMsg = 'Cloaking PC Python Window…'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.textContent = window.__statusLockMsg; toast('Cloaking PC Python Window…'); await post('/relaunch_hidden_full'); setTimeout(()=>{ location.replace('/login?switched=1&r='+Date.now()); }, 5600); }, false);
-holdFill('visShowBtn','visShowFill',3000, async()=>{ disableAllControls(); window.__statusLockMsg = 'Materializing PC Python Window…'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.textContent = window.__statusLockMsg; toast('Materializing PC Python Window…'); await post('/relaunch_visible_full'); setTimeout(()=>{ location.replace('/login?switched=1&r='+Date.now()); }, 5600); }, false);
-holdFill('deleteBtn','deleteFill',3000, async()=>{ const ok=await post('/delete','password='+encodeURIComponent(pwd.value)); toast(ok?'Output folder deleted':'Wrong password or error'); });
-holdFill('recreateBtn','recreateFill',3000, async()=>{ const ok=await post('/recreate','password='+encodeURIComponent(pwd.value)); toast(ok?'Output folder recreated':'Wrong password or error'); });
+holdFill('visHideBtn','visHideFill',3000, async()=>{ disableAllControls(); window.__statusLockMsg = 'Cloaking PC Python Window…'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.textContent = window.__statusLockMsg; toast('Cloaking PC Python Window…'); await runRelaunch('/relaunch_hidden_full'); }, false);
+holdFill('visShowBtn','visShowFill',3000, async()=>{ disableAllControls(); window.__statusLockMsg = 'Materializing PC Python Window…'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.style.color='#40f19a'; header.style.fontWeight='800'; header.textContent = window.__statusLockMsg; toast('Materializing PC Python Window…'); await runRelaunch('/relaunch_visible_full'); }, false);
+holdFill('deleteBtn','deleteFill',3000, async()=>{ const job=await startJob('/delete','password='+encodeURIComponent(pwd.value)); if(!job){ toast('Wrong password or error'); return; } const j=await followJob(job, showJob); toast(j.state==='done'?'Output folder deleted':j.state==='cancelled'?'Delete cancelled':'Delete failed'); });
+holdFill('recreateBtn','recreateFill',3000, async()=>{ const job=await startJob('/recreate','password='+encodeURIComponent(pwd.value)); if(!job){ toast('Wrong password or error'); return; } const j=await followJob(job, showJob); toast(j.state==='done'?'Output folder recreated':'Recreate failed'); });
 
 /* Open Comfy Mini (ensure + route) */
 const openMiniBtn=document.getElementById('openMiniBtn');
@@ -2546,7 +3576,7 @@ if (openGalleryBtn){
   openGalleryBtn.addEventListener('click', async (e)=>{
     e.preventDefault();
     toast('Opening Gallery…');
-    try { await fetch('/ensure_gallery', { method:'POST', headers:{ 'X-CSRF-Token': CSRF } }); } catch(_) {}
+    try { await postForm('/ensure_gallery', ''); } catch(_) {}
     window.location.href = '/gallery';
   }, { passive:false });
 }
@@ -2554,7 +3584,7 @@ async function waitForStopped(t=5000){
   const st=performance.now();
   while(performance.now()-st<t){
     try{
-      const s=await (await fetch('/status')).json();
+      const s=await (await fetch('/status',{cache:'no-store'})).json();
       if(!s.comfy && !s.mini){ toast('Shutdown Complete'); stoppedOverride=false; renderHeader({comfy:false,mini:false}); return true; }
     }catch{ break; }
     await new Promise(r=>setTimeout(r,300));
@@ -2572,32 +3602,988 @@ document.addEventListener('click', (e) => {
   hapticTap();
 }, { passive: true });
 
-/* --- Reliable mascot image loader w/ cache-busting after mode switch --- */
+/* --- Reliable mascot image loader: content-hashed URL, so only failed loads (e.g. mid mode switch) are retried --- */
 function loadMascotReliably(){
   const img = document.getElementById('mascotImg');
   if(!img) return;
   const base = img.getAttribute('src');
-  // If src already has a version/r param (set during mode switch), nothing to do.
-  if (/[?&](v|r)=/.test(base)) return;
-
   let tries = 0, max = 5;
-  function bustOnce(){
-    const u = new URL(base, location.origin);
-    u.searchParams.set('v', Date.now().toString());
-    img.src = u.toString();
-  }
   img.addEventListener('error', () => {
-    if(++tries < max) setTimeout(bustOnce, 200 * tries);
+    if(++tries < max) setTimeout(() => img.setAttribute('src', base), 200 * tries);
   });
-  if (location.pathname === '/login' || /[?&]switched=1\b/.test(location.search)){
-    bustOnce();
-  }
 }
 document.addEventListener('DOMContentLoaded', loadMascotReliably);
-</script>
+
+/* Installable app: cached shell for instant start (secure contexts only) */
+if ('serviceWorker' in navigator){
+  navigator.serviceWorker.register('/sw.js').catch(()=>{});
+  navigator.serviceWorker.addEventListener('message', e=>{ if(e.data && e.data.type==='logged-out') location.replace('/login'); });
+  if (navigator.serviceWorker.controller) refreshCsrf();
+}
+"""
+
+TEMPLATE = """
+<!doctype html><html lang="en"><head>
+<meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/>
+<title>Pocket Comfy</title>
+<meta name="theme-color" content="#0a0b1e">
+<link rel="apple-touch-icon" sizes="180x180" href="{{ apple_icon }}">
+<link rel="manifest" href="{{ url_for('web_manifest') }}">
+<link rel="icon" type="image/png" sizes="32x32" href="{{ favicon32 }}">
+<link rel="icon" type="image/png" sizes="16x16" href="{{ favicon16 }}">
+{{ asset_preload('mascot') }}
+<meta name="apple-mobile-web-app-capable" content="yes"><meta name="apple-mobile-web-app-status-bar-style" content="black">
+<link rel="stylesheet" href="{{ bundle_url('dashboard.css') }}"></head><body>
+<div class="header" id="headerBar">Loading status…</div>
+
+<h1>
+  <span class="brand">
+    <span class="mascot"><a href="https://github.com/PastLifeDreamer/Pocket-Comfy" target="_blank" rel="noopener"><img id="mascotImg" src="{{ asset_url('mascot') }}" alt="Mascot" fetchpriority="high" loading="eager" decoding="async"></a></span>
+    <span class="title">Pocket Comfy</span>
+  </span>
+</h1>
+
+<div class="container">
+  <!-- Panel 1: Comfy Mini (original bracket size) -->
+  <div class="panel">
+    <a class="btnlink" id="openMiniBtn" href="#">
+      <span class="ico">
+        <img src="{{ asset_url('comfy-mini') }}" alt="" decoding="async" loading="eager">
+      </span>
+      <span class="label">Comfy Mini</span>
+          <span id="miniDot" class="mode-dot"></span>
+    </a>
+  </div>
+
+  <!-- Panel 2: ComfyUI (black, logo-only) -->
+  <div class="panel">
+    <!-- IMPORTANT: link directly to wrapper route so border/top panel render and port 8188 loads inside it -->
+    <a class="btnlink" id="openComfyUiBtn" href="/comfyui" aria-label="Open ComfyUI">
+      <span class="ico">
+        {{ asset_picture('comfyui-text', alt='Comfy', decoding='async', loading='eager') }}
+      </span>
+          <span id="comfyDot" class="mode-dot"></span>
+    </a>
+  </div>
+
+  <!-- Live generation progress (shared ComfyUI connection via /progress) -->
+  <div class="panel progressPanel" id="progressPanel">
+    <div class="progressHead"><span id="progressNode"><strong>Idle</strong></span><span id="progressQueue">Queue: 0</span></div>
+    <div class="progressBar"><span id="progressFill"></span></div>
+    <img class="progressPreview" id="progressPreview" alt="Latest preview" decoding="async">
+  </div>
+
+  <!-- Panel 3: Gallery (same bracket size as ComfyUI) -->
+  <div class="panel">
+    <button class="gallery" id="openGalleryBtn">
+      <span class="ico">
+        <img src="{{ asset_url('gallery-logo') }}" alt="" width="32" height="32" decoding="async" loading="eager">
+      </span>
+      Smart Gallery
+      <span id="galleryDot" class="mode-dot"></span>
+    </button>
+  </div>
+
+  <div class="panel">
+    <button class="restart" onclick="runRestart()"><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 12a9 9 0 0115.5-6.36M21 12a9 9 0 01-15.5 6.36"/><path d="M3 5v6h6"/></svg></span>Restart Comfy + Mini</button>
+    <button class="stop" onclick="runStop()"><span class="ico"><svg viewBox="0 0 24 24"><rect x="6" y="6" width="12" height="12" rx="2"/></svg></span>Stop Comfy + Mini</button>
+  </div>
+
+  <div class="panel">
+    <div class="tiny"><strong>Run Hidden:</strong> Hides the Python console on your PC.<br><strong>Run Visible:</strong> Brings your console back for visibility. <strong>Note:</strong> Both restart Pocket Comfy + ComfyUI + Mini.</div>
+    <button class="vis" id="visHideBtn"><span class="hold-fill" id="visHideFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 3l18 18"/><path d="M10 10a2 2 0 102.83 2.83"/><path d="M2 12s4-7 10-7 10 7 10 7"/></svg></span>Run Hidden<span id="hiddenDot" class="mode-dot"></span></button>
+    <button class="vis" id="visShowBtn"><span class="hold-fill" id="visShowFill"></span><span class="ico"><svg viewBox="0 0 24 24"><rect x="3" y="4" width="18" height="12" rx="2"/><path d="M8 20h8"/></svg></span>Run Visible<span id="visibleDot" class="mode-dot"></span></button>
+  </div>
+
+  <div class="panel warn">
+    <div class="tiny">Press & hold 3 seconds for full script shutdown.       <strong>This stops Pocket Comfy, ComfyUI, Mini and closes the Python console on your PC!!!</strong> Relaunch on the PC to bring Pocket Comfy back.</div>
+    <button class="shutdown" id="shutdownBtn"><span class="hold-fill" id="shutdownFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M12 2v10"/><path d="M18.36 6.64a9 9 0 11-12.72 0"/></svg></span>Shutdown All</button>
+  </div>
+
+  <div class="panel">
+    <label for="pwd">(Password required for Delete & Recreate)</label>
+    <div class="pwdwrap">
+      <input id="pwd" type="password" placeholder="Password" autocomplete="off"/>
+      <button class="eye" id="toggleEye" title="Show/Hide" aria-label="Show/Hide Password">
+        <svg id="mpEyeIcon" viewBox="0 0 24 24" width="28" height="28">
+          <path d="M2 12s4-7 10-7 10 7 10 7-4 7-10 7S2 12 2 12Z"/><circle cx="12" cy="12" r="3"/>
+        </svg>
+      </button>
+    </div>
+    <button class="delete" id="deleteBtn" disabled><span class="hold-fill" id="deleteFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 6h18"/><path d="M8 6V4h8v2"/><path d="M6 6l1 14h10l1-14"/></svg></span>Delete Output Folder</button>
+    <button class="recreate" id="recreateBtn" disabled><span class="hold-fill" id="recreateFill"></span><span class="ico"><svg viewBox="0 0 24 24"><path d="M3 7h6l2 2h10v10H3z"/><path d="M12 12v6"/><path d="M9 15h6"/></svg></span>Recreate Output Folder</button>
+    <div class="muted">Only final folder in path is affected:</div>
+    <div class="muted">{{ delete_path }}</div>
+    <div class="muted" id="storageLine"></div>
+  </div>
+
+  <!-- Network panel with mascot -->
+  <div class="panel netPanel">
+    <div class="net" id="netinfo">Loading network info…</div>
+    {{ asset_picture('matrix-mascot', class_='matrixMascot', alt='', aria_hidden='true') }}
+  </div>
+</div>
+
+<div class="footerWrap">
+  <!-- GitHub link image on the left (no tap indicators) -->
+  <a class="ghLink" href="https://github.com/PastLifeDreamer/Pocket-Comfy" target="_blank" rel="noopener">
+    <img src="{{ asset_url('github') }}" alt="GitHub repository">
+  </a>
+
+  <!-- Buy Me A Coffee link image on the right (no tap indicators) -->
+  <a class="bmacLink" href="https://buymeacoffee.com/pastlifedreamer" target="_blank" rel="noopener">
+    <img src="{{ asset_url('bmac') }}" alt="Buy Me a Coffee">
+  </a>
+
+  <div class="statusLine" id="statusBox">Ready.</div>
+  <div class="modeWrap">
+    <div id="modeBox" class="modeBadge" style="display:none">
+      <svg viewBox="0 0 24 24"><rect x="3" y="4" width="18" height="12" rx="2"/><path d="M8 20h8"/></svg>
+      <span>Mode: Visible</span>
+    </div>
+  </div>
+  <div class="sigLine">Flask server running • <span>Pocket Comfy</span> by <strong>PastLifeDreamer</strong></div>
+</div>
+
+<script>let CSRF="{{ csrf_token }}";</script>
+<script src="{{ bundle_url('dashboard.js') }}"></script>
 </body></html>
 """
 
+# ================== Static asset pipeline ==================
+# The images in static/ are up to a few megabytes each. On first use they are
+# resized to what the pages actually display (about 3x the CSS size, for
+# phone screens) and encoded as AVIF when Pillow supports it, WebP or PNG,
+# named by content hash and served from /assets as immutable. A manifest
+# keyed by source size/mtime lets later starts reuse the files. Without
+# Pillow, or when a variant fails to encode, the pages use the pre-shrunk
+# copies shipped in static/fallback/ (regenerate them with
+# build_fallback_assets() after changing ASSETS or the sources), so they
+# never fall back to the multi-megabyte originals.
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:
+    Image = None
+
+ASSET_DIR = os.getenv("ASSET_CACHE_DIR", "").strip() or os.path.join(os.path.dirname(SCRIPT_PATH), ".pocketcomfy-cache", "assets")
+_ASSET_VERSION = 1
+# name: (source in static/, output width in px, formats by preference)
+ASSETS = {
+    "hero":          (HERO_FILE, 960, ("avif", "webp")),        # 75vw, max 520px
+    "mascot":        (BRAND_MASCOT_FILE, 228, ("webp",)),                    # 76px circle
+    "matrix-mascot": ("matrix-mascot.png", 540, ("avif", "webp")),           # max 180px wide
+    "comfy-mini":    ("Comfy-Mini.webp", 144, ("webp",)),                     # 2.85em
+    "comfyui-text":  ("comfyui-text.webp", 960, ("avif", "webp")),           # max 320px wide
+    "gallery-logo":  ("ModernMinimalGalleryLogo.webp", 96, ("webp",)),       # 2em
+    "github":        ("Github-Link.webp", 132, ("webp",)),                    # 44px
+    "bmac":          ("BMAC.webp", 132, ("webp",)),                           # 44px
+    "touch-icon":    ("apple-touch-icon.png", 180, ("png",)),
+    "icon-192":      ("apple-touch-icon.png", 192, ("png",)),                 # web manifest
+    "icon-512":      ("apple-touch-icon.png", 512, ("png",)),
+    "favicon-32":    ("favicon-32.png", 32, ("png",)),
+    "favicon-16":    ("favicon-16.png", 16, ("png",)),
+}
+_ASSET_MIME = {"avif": "image/avif", "webp": "image/webp", "png": "image/png"}
+# Files build_assets() wrote (and may delete once stale); anything else in ASSET_DIR is left alone.
+_ASSET_FILE = re.compile(r"(?:(?:%s)\.[0-9a-f]{12}\.(?:%s)|manifest\.json)(?:\.\d+\.tmp)?"
+                         % ("|".join(map(re.escape, ASSETS)), "|".join(_ASSET_MIME)))
+FALLBACK_DIR = "fallback"  # under static/
+_asset_lock = threading.Lock()
+_asset_manifest: Optional[dict] = None
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f: f.write(data)
+    os.replace(tmp, path)
+
+def _encode_asset(src: str, width: int, fmt: str) -> bytes:
+    with Image.open(src) as im:
+        im.load()
+        if im.width > width:
+            im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        buf = io.BytesIO()
+        if fmt == "avif": im.save(buf, "AVIF", quality=60, speed=6)
+        elif fmt == "webp": im.save(buf, "WEBP", quality=82, method=4)
+        else: im.save(buf, "PNG", optimize=True)
+        return buf.getvalue()
+
+def build_assets() -> dict:
+    """Encode missing variants once per process; returns {name: {fmt: filename}}."""
+    global _asset_manifest
+    with _asset_lock:
+        if _asset_manifest is not None: return _asset_manifest
+        manifest, fresh = {}, {}
+        try:
+            if Image is None: raise RuntimeError("Pillow not installed")
+            os.makedirs(ASSET_DIR, exist_ok=True)
+            index = os.path.join(ASSET_DIR, "manifest.json")
+            try:
+                with open(index, "r", encoding="utf-8") as f: previous = json.load(f)
+            except (OSError, ValueError):
+                previous = {}
+            avif = pil_features.check("avif")
+            started = time.perf_counter(); built = 0
+            for name, (source, width, formats) in ASSETS.items():
+                src = os.path.join(app.static_folder, source)
+                try: st = os.stat(src)
+                except OSError: continue
+                for fmt in formats:
+                    if fmt == "avif" and not avif: continue
+                    key = f"{source}|{st.st_size}|{st.st_mtime_ns}|{width}|{fmt}|{_ASSET_VERSION}"
+                    filename = previous.get(key)
+                    if not filename or not os.path.isfile(os.path.join(ASSET_DIR, filename)):
+                        try: data = _encode_asset(src, width, fmt)
+                        except Exception as e:
+                            print(f"[WARN] asset {name}.{fmt}: {e}"); continue
+                        filename = f"{name}.{hashlib.sha256(data).hexdigest()[:12]}.{fmt}"
+                        _write_atomic(os.path.join(ASSET_DIR, filename), data); built += 1
+                    fresh[key] = filename
+                    manifest.setdefault(name, {})[fmt] = filename
+            _write_atomic(index, json.dumps(fresh, indent=1).encode("utf-8"))
+            keep = set(fresh.values()) | {"manifest.json"}
+            for entry in os.scandir(ASSET_DIR):
+                if entry.name not in keep and _ASSET_FILE.fullmatch(entry.name) and entry.is_file():
+                    try: os.remove(entry.path)
+                    except OSError: pass
+            if built: print(f"[INFO] Built {built} asset variant(s) in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            print(f"[WARN] asset pipeline disabled, serving originals: {e}")
+        _asset_manifest = manifest
+        return manifest
+
+def _fallback_name(name: str) -> str:
+    return f"{FALLBACK_DIR}/{name}.{ASSETS[name][2][-1]}"
+
+def build_fallback_assets() -> list:
+    """Write the pre-shrunk static/fallback/ copies (a maintainer step; needs Pillow)."""
+    os.makedirs(os.path.join(app.static_folder, FALLBACK_DIR), exist_ok=True)
+    written = []
+    for name, (source, width, formats) in ASSETS.items():
+        out = os.path.join(app.static_folder, _fallback_name(name))
+        _write_atomic(out, _encode_asset(os.path.join(app.static_folder, source), width, formats[-1]))
+        written.append(out)
+    return written
+
+def asset_url(name: str, fmt: Optional[str] = None) -> str:
+    source, _, formats = ASSETS[name]
+    filename = build_assets().get(name, {}).get(fmt or formats[-1])
+    if filename: return url_for("asset_file", filename=filename)
+    if os.path.isfile(os.path.join(app.static_folder, _fallback_name(name))):
+        return url_for("static", filename=_fallback_name(name))
+    return url_for("static", filename=source)
+
+def _html_attrs(attrs: dict) -> str:
+    return "".join(f' {k.rstrip("_").replace("_", "-")}="{escape(v)}"' for k, v in attrs.items())
+
+def asset_picture(name: str, **attrs) -> Markup:
+    img = f'<img src="{asset_url(name)}"{_html_attrs(attrs)}>'
+    if "avif" not in build_assets().get(name, {}): return Markup(img)
+    return Markup(f'<picture><source type="image/avif" srcset="{asset_url(name, "avif")}">{img}</picture>')
+
+def asset_preload(name: str) -> Markup:
+    # Preload exactly the variant <picture> will pick; browsers without AVIF skip the hint.
+    variants = build_assets().get(name, {})
+    fmt = next((f for f in ASSETS[name][2] if f in variants), None)
+    kind = f' type="{_ASSET_MIME[fmt]}"' if fmt else ""
+    return Markup(f'<link rel="preload" as="image" href="{asset_url(name, fmt)}"{kind}>')
+
+app.jinja_env.globals.update(asset_url=asset_url, asset_picture=asset_picture, asset_preload=asset_preload)
+
+# ==================== Output thumbnails =====================
+# /thumb serves small WebP previews of images under DELETE_PATH, so the phone
+# never has to pull a full-size PNG. Decoding runs in a process pool (JPEGs
+# use draft mode to decode at 1/2..1/8 scale); results are cached on disk
+# under a key of (path, mtime, size, width) and evicted least recently used
+# once the cache passes THUMB_CACHE_MB. Concurrent requests for the same
+# thumbnail share one render. Videos get posters and animated clips below.
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+THUMB_DIR = os.getenv("THUMB_CACHE_DIR", "").strip() or os.path.join(os.path.dirname(SCRIPT_PATH), ".pocketcomfy-cache", "thumbs")
+THUMB_WIDTHS = (160, 320, 640, 1024)
+THUMB_TYPES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+_THUMB_VERSION = 1
+_thumb_lock = threading.Lock()
+_thumb_lru: "OrderedDict[str, int]" = OrderedDict()  # cache name -> bytes, least recent first
+_thumb_state = {"bytes": 0, "loaded": False, "pools": {}}
+_thumb_flights: dict[str, Future] = {}
+_thumb_failed: "OrderedDict[str, str]" = OrderedDict()  # cache name -> why it could not be rendered
+_THUMB_FAILED_MAX = 2048
+
+class PreviewFailed(Exception):
+    """The source could not be decoded; remembered per cache key so retries don't decode it again."""
+
+def resolve_output(rel: str, folder: bool = False) -> Optional[str]:
+    """Map a client-supplied path to a file (or with `folder`, a directory; "" is the root) under DELETE_PATH, or None."""
+    if not DELETE_PATH or "\x00" in rel or not (rel or folder): return None
+    root = os.path.realpath(DELETE_PATH)
+    path = os.path.realpath(os.path.join(root, rel.replace("\\", "/").lstrip("/")))
+    try:
+        inside = os.path.commonpath([os.path.normcase(root), os.path.normcase(path)]) == os.path.normcase(root)
+    except ValueError:  # different drive
+        return None
+    if folder: return path if inside and os.path.isdir(path) else None
+    return path if inside and path != root and os.path.isfile(path) else None
+
+def _render_thumb(src: str, width: int) -> bytes:
+    """Runs in a worker process: decode, shrink and encode one thumbnail."""
+    with Image.open(src) as im:
+        if im.format == "JPEG": im.draft("RGB", (width, width * 4))
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.mode or "transparency" in im.info else "RGB")
+        im.thumbnail((width, width * 4), Image.LANCZOS, reducing_gap=3.0)
+        buf = io.BytesIO()
+        im.save(buf, "WEBP", quality=78, method=4)
+        return buf.getvalue()
+
+def _preview_pool(kind: str):
+    with _thumb_lock:
+        pool = _thumb_state["pools"].get(kind)
+        if pool is None:
+            workers = max(1, VIDEO_WORKERS if kind == "video" else THUMB_WORKERS)
+            try: pool = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError):  # no multiprocessing here; decode on threads instead
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"preview-{kind}")
+            _thumb_state["pools"][kind] = pool
+        return pool
+
+def _drop_pool(kind: str, pool):
+    with _thumb_lock:
+        if _thumb_state["pools"].get(kind) is pool: del _thumb_state["pools"][kind]
+
+def _settle_preview(name: str, flight: Future, error: Optional[BaseException] = None):
+    with _thumb_lock:
+        _thumb_flights.pop(name, None)
+        if isinstance(error, PreviewFailed):
+            _thumb_failed[name] = str(error)
+            while len(_thumb_failed) > _THUMB_FAILED_MAX: _thumb_failed.popitem(last=False)
+    if error is None: flight.set_result(os.path.join(THUMB_DIR, name))
+    else: flight.set_exception(error)
+
+def _submit_preview(name: str, flight: Future, kind: str, fn, args, retry: bool = True):
+    """Render in the `kind` pool; the result is stored and `flight` settled from the pool's callback."""
+    pool = _preview_pool(kind)
+    def finish(fut: Future):
+        try:
+            try: data = fut.result()
+            except (BrokenProcessPool, CancelledError): raise
+            except Exception as e: raise PreviewFailed(str(e)) from e  # the source itself; a pool or disk problem is not
+            _store_preview(name, data)
+        except BrokenProcessPool as e:  # a worker died (e.g. out of memory); start a fresh pool once
+            _drop_pool(kind, pool)
+            if retry: _submit_preview(name, flight, kind, fn, args, retry=False)
+            else: _settle_preview(name, flight, e)
+        except BaseException as e:
+            _settle_preview(name, flight, e)
+        else:
+            _settle_preview(name, flight)
+    try:
+        pool.submit(fn, *args).add_done_callback(finish)
+    except (BrokenProcessPool, RuntimeError) as e:  # pool broke or was shut down between lookup and submit
+        _drop_pool(kind, pool)
+        if retry: _submit_preview(name, flight, kind, fn, args, retry=False)
+        else: _settle_preview(name, flight, e)
+
+def _load_preview_cache():
+    """Rebuild the LRU from the cache folder; file mtimes carry the order across restarts."""
+    entries = []
+    for sub in os.scandir(THUMB_DIR) if os.path.isdir(THUMB_DIR) else ():
+        if not sub.is_dir(): continue
+        for entry in os.scandir(sub.path):
+            try:
+                if entry.name.endswith(".tmp"): os.remove(entry.path); continue
+                st = entry.stat()
+                entries.append((st.st_mtime, f"{sub.name}/{entry.name}", st.st_size))
+            except OSError:
+                pass
+    for _, name, size in sorted(entries):
+        _thumb_lru[name] = size; _thumb_state["bytes"] += size
+    _thumb_state["loaded"] = True
+
+def _store_preview(name: str, data: bytes):
+    path = os.path.join(THUMB_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, data)
+    cap = THUMB_CACHE_MB * 1024 * 1024
+    with _thumb_lock:
+        _thumb_state["bytes"] += len(data) - _thumb_lru.pop(name, 0)
+        _thumb_lru[name] = len(data)
+        while _thumb_state["bytes"] > cap and len(_thumb_lru) > 1:
+            old, size = _thumb_lru.popitem(last=False)
+            _thumb_state["bytes"] -= size
+            try: os.remove(os.path.join(THUMB_DIR, old))
+            except OSError: pass
+
+def preview_key(src: str, st: os.stat_result, variant: str) -> str:
+    return hashlib.sha1(f"{_THUMB_VERSION}|{src}|{st.st_mtime_ns}|{st.st_size}|{variant}".encode("utf-8")).hexdigest()
+
+def cached_preview(key: str, ext: str, fn, *args, kind: str = "image", wait: Optional[float] = None) -> Optional[str]:
+    """Path of the cached preview `key`, rendering it with fn(*args) in the `kind` pool if needed.
+
+    Returns None if the render is still running after `wait` seconds; it
+    finishes in the background and a later call gets the cached file.
+    """
+    name = f"{key[:2]}/{key}.{ext}"
+    path = os.path.join(THUMB_DIR, name)
+    with _thumb_lock:
+        if name in _thumb_failed: raise PreviewFailed(_thumb_failed[name])
+        if not _thumb_state["loaded"]: _load_preview_cache()
+        hit = name in _thumb_lru
+        if hit: _thumb_lru.move_to_end(name)
+        flight = None if hit else _thumb_flights.get(name)
+        owner = not hit and flight is None
+        if owner: flight = _thumb_flights[name] = Future()
+    if hit:
+        try:
+            os.utime(path); return path
+        except FileNotFoundError:  # removed behind our back
+            with _thumb_lock:
+                _thumb_state["bytes"] -= _thumb_lru.pop(name, 0)
+            return cached_preview(key, ext, fn, *args, kind=kind, wait=wait)
+    if owner: _submit_preview(name, flight, kind, fn, args)
+    try:
+        return flight.result(timeout=wait)
+    except FuturesTimeout:
+        return None
+
+# ---- Video previews ----
+# MP4/WebM outputs get a poster frame and a short animated WebP. Frames are
+# taken by seeking straight to sampled positions, never by decoding the whole
+# file, in their own VIDEO_WORKERS pool so a batch of new videos cannot hold
+# up image thumbnails or request threads.
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+VIDEO_TYPES = {".mp4", ".webm", ".mov", ".mkv", ".avi", ".m4v"}
+CLIP_FRAMES = 12
+CLIP_FRAME_MS = 250
+CLIP_MAX_WIDTH = 320
+VIDEO_WAIT_SECS = 2.0
+
+def _grab_frames(src: str, positions, width: int) -> list:
+    """Frames at the given fractions of the video (0..1), as RGB images at most `width` wide."""
+    cap = cv2.VideoCapture(src)
+    try:
+        if not cap.isOpened(): raise ValueError("cannot open video")
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        frames = []
+        for pos in positions:
+            if count > 1: cap.set(cv2.CAP_PROP_POS_FRAMES, min(count - 1, int(pos * count)))
+            ok, frame = cap.read()
+            if not ok: continue  # short or damaged file; keep what we have
+            h, w = frame.shape[:2]
+            if w > width: frame = cv2.resize(frame, (width, max(1, h * width // w)), interpolation=cv2.INTER_AREA)
+            frames.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        if not frames: raise ValueError("no decodable frames")
+        return frames
+    finally:
+        cap.release()
+
+def _render_poster(src: str, width: int) -> bytes:
+    """Runs in a worker process: one frame a tenth of the way in (past fade-ins), as WebP."""
+    frame = _grab_frames(src, (0.1, 0.0), width)[0]
+    buf = io.BytesIO()
+    frame.save(buf, "WEBP", quality=78, method=4)
+    return buf.getvalue()
+
+def _render_clip(src: str, width: int) -> bytes:
+    """Runs in a worker process: CLIP_FRAMES evenly spaced frames as a looping animated WebP."""
+    frames = _grab_frames(src, [(i + 0.5) / CLIP_FRAMES for i in range(CLIP_FRAMES)], width)
+    buf = io.BytesIO()
+    frames[0].save(buf, "WEBP", save_all=True, append_images=frames[1:], duration=CLIP_FRAME_MS, loop=0, quality=60, method=4)
+    return buf.getvalue()
+
+def thumb_width(requested: int) -> int:
+    return next((w for w in THUMB_WIDTHS if w >= requested), THUMB_WIDTHS[-1])
+
+def preview_response(path: str, mimetype: str, key: str) -> Response:
+    resp = send_file(path, mimetype=mimetype, etag=key, max_age=3600, conditional=True)
+    resp.cache_control.public = False; resp.cache_control.private = True
+    return resp
+
+def preview_not_modified(key: str) -> Response:
+    resp = Response(status=304)
+    resp.set_etag(key)
+    resp.cache_control.private = True; resp.cache_control.max_age = 3600
+    return resp
+
+# ===================== Output downloads =====================
+# /output/<path> serves a file under DELETE_PATH with byte ranges, so a phone
+# can scrub a video or resume a download without refetching what it has.
+# Single ranges answer 206, several answer multipart/byteranges, and If-Range
+# drops back to the whole file once it changed. The body is a FileSegments,
+# which the pooled server writes with socket.sendfile (zero-copy where the OS
+# has it); other servers just iterate it.
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+
+MAX_RANGES = 16            # more than this and the client gets the whole file
+_RANGE_COALESCE = 80       # ranges closer than this many bytes are sent as one
+
+class FileSegments:
+    """WSGI body made of literal bytes and (offset, count) slices of one open file."""
+
+    def __init__(self, file, block_size: int = 64 * 1024, parts: Optional[list] = None):
+        self.file = file
+        self.block_size = block_size
+        self.parts = parts if parts is not None else [(0, None)]  # also usable as wsgi.file_wrapper
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part; continue
+            offset, left = part
+            self.file.seek(offset)
+            while left is None or left > 0:
+                chunk = self.file.read(self.block_size if left is None else min(self.block_size, left))
+                if not chunk: break
+                if left is not None: left -= len(chunk)
+                yield chunk
+
+    def close(self):
+        self.file.close()
+
+def output_etag(st: os.stat_result) -> str:
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def plan_ranges(header: str, size: int) -> Optional[list]:
+    """Sorted, merged (start, end-exclusive) ranges for a bytes Range header.
+
+    None means serve the whole file (no/invalid header, or too many ranges);
+    an empty list means nothing in it is satisfiable.
+    """
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip(): return None
+    ranges = []
+    for item in spec.split(","):
+        first, dash, last = item.strip().partition("-")
+        if not dash: return None
+        try:
+            if not first:  # suffix: the last N bytes
+                n = int(last)
+                if n > 0 and size: ranges.append((max(0, size - n), size))
+                continue
+            start, end = int(first), (int(last) + 1 if last else None)
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end <= start): return None
+        if start < size: ranges.append((start, size if end is None else min(end, size)))
+    if len(ranges) > MAX_RANGES: return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + _RANGE_COALESCE:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _if_range_matches(value: str, etag: str, mtime: float) -> bool:
+    value = value.strip()
+    if not value: return True
+    if value.startswith(("\"", "W/")): return value == f'"{etag}"'  # weak tags never match
+    try:
+        return int(parsedate_to_datetime(value).timestamp()) == int(mtime)  # must be the exact Last-Modified
+    except (TypeError, ValueError):
+        return False
+
+def output_response(path: str, download: bool = False) -> Response:
+    st = os.stat(path)
+    size, etag = st.st_size, output_etag(st)
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{etag}"', "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+               "Cache-Control": "private, no-cache"}
+    if download:
+        headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}"
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    ranges = None
+    if request.headers.get("Range") and _if_range_matches(request.headers.get("If-Range", ""), etag, st.st_mtime):
+        ranges = plan_ranges(request.headers["Range"], size)
+    if ranges == []:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status=416, headers=headers)
+    f = open(path, "rb")
+    if ranges is None:
+        body, status, length = FileSegments(f, parts=[(0, size)]), 200, size
+        headers["Content-Type"] = mimetype
+    elif len(ranges) == 1:
+        (start, end), = ranges
+        body, status, length = FileSegments(f, parts=[(start, end - start)]), 206, end - start
+        headers["Content-Type"] = mimetype
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    else:
+        boundary = hashlib.sha1(f"{etag}|{time.time_ns()}".encode()).hexdigest()[:24]
+        parts = []
+        for start, end in ranges:
+            parts.append(f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                         f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n".encode("latin-1"))
+            parts.append((start, end - start))
+        parts.append(f"\r\n--{boundary}--\r\n".encode("latin-1"))
+        body, status = FileSegments(f, parts=parts), 206
+        length = sum(len(p) if isinstance(p, bytes) else p[1] for p in parts)
+        headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+    headers["Content-Length"] = str(length)
+    return Response(body, status=status, headers=headers, direct_passthrough=True)
+
+# ======================= ZIP export =========================
+# /export streams a ZIP of a selection under DELETE_PATH (a folder, a glob on
+# the relative path, a modified-date range) while it is being built: files
+# are read in EXPORT_BLOCK pieces and each piece is sent as soon as zipfile
+# has written it, so memory stays flat and nothing touches the disk. Images
+# and videos are already compressed and go in STORED; everything else is
+# deflated. Entries carry data descriptors since the output cannot seek back.
+import zipfile, fnmatch
+
+EXPORT_BLOCK = 256 * 1024
+_EXPORT_STORED = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".avif", ".mp4", ".webm", ".mov", ".mkv",
+                  ".m4v", ".zip", ".7z", ".gz", ".safetensors", ".latent"}
+
+class _ZipSink:
+    """Write-only target for zipfile; collects bytes until the generator drains them."""
+
+    def __init__(self):
+        self.chunks, self.size = [], 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data)); self.size += len(data)
+        return len(data)
+
+    def flush(self): pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+def parse_export_date(value: str, end: bool = False) -> Optional[float]:
+    """Epoch seconds for an ISO date/datetime; a bare date used as an end covers that whole day."""
+    if not value: return None
+    dt = datetime.fromisoformat(value.strip())
+    if end and len(value.strip()) == 10: dt += timedelta(days=1)
+    return dt.timestamp()
+
+def export_files(base: str, pattern: str = "", since: Optional[float] = None, until: Optional[float] = None):
+    """Yield (name in archive, path, mtime_ns, size) under `base`, in sorted order, lazily."""
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        try: listing = _list_dir(os.path.join(base, rel))
+        except OSError: continue
+        for name, mtime_ns, size in sorted(listing["files"]):
+            arc = f"{rel}/{name}" if rel else name
+            if pattern and not fnmatch.fnmatch(arc, pattern) and not fnmatch.fnmatch(name, pattern): continue
+            if since is not None and mtime_ns < since * 1e9: continue
+            if until is not None and mtime_ns >= until * 1e9: continue
+            yield arc, os.path.join(base, rel, name), mtime_ns, size
+        stack.extend(f"{rel}/{d}" if rel else d for d in sorted(listing["subdirs"], reverse=True))
+
+def zip_stream(files):
+    """Generate a ZIP archive of `files` (from export_files) piece by piece."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for arc, path, mtime_ns, size in files:
+            try: src = open(path, "rb")
+            except OSError: continue  # removed since it was listed
+            zi = zipfile.ZipInfo(arc, time.localtime(max(mtime_ns / 1e9, 315532800))[:6])  # ZIP dates start in 1980
+            zi.compress_type = zipfile.ZIP_STORED if os.path.splitext(arc)[1].lower() in _EXPORT_STORED else zipfile.ZIP_DEFLATED
+            zi.external_attr = 0o644 << 16
+            zi.file_size = size  # lets zipfile pick zip64 up front
+            with src, zf.open(zi, "w") as dst:
+                while chunk := src.read(EXPORT_BLOCK):
+                    dst.write(chunk)
+                    if sink.size >= EXPORT_BLOCK: yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()  # central directory
+
+# ==================== Response compression ==================
+# gzip/deflate, plus brotli when the module is installed, negotiated from
+# Accept-Encoding. Cached pages keep one precompressed copy per encoding so
+# the CPU cost is paid once per process; dynamic JSON is compressed per
+# response once it is large enough to benefit.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_ENCODINGS = ("br", "gzip", "deflate") if brotli else ("gzip", "deflate")
+_COMPRESS_ENDPOINTS = {"ui", "mini_page", "comfyui_page", "gallery_page", "status", "netinfo"}
+
+def negotiate_encoding(accept: str) -> Optional[str]:
+    weights = {}
+    for part in accept.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            k, _, v = param.strip().partition("=")
+            if k.lower() == "q":
+                try: q = float(v)
+                except ValueError: q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for enc in _ENCODINGS:  # server preference breaks ties
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q: best, best_q = enc, q
+    return best
+
+def compress_bytes(data: bytes, encoding: str, best: bool = False) -> bytes:
+    if encoding == "br": return brotli.compress(data, quality=11 if best else 5)
+    if encoding == "gzip": return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+    return zlib.compress(data, 9 if best else 6)
+
+_packed_lock = threading.Lock()
+
+def packed_body(entry: dict, enc: Optional[str]) -> bytes:
+    """entry["body"] in the given encoding, compressed once and kept in entry["packed"]."""
+    if not enc: return entry["body"]
+    packed = entry["packed"].get(enc)
+    if packed is None:
+        packed = compress_bytes(entry["body"], enc, best=True)
+        with _packed_lock: entry["packed"][enc] = packed
+    return packed
+
+@app.after_request
+def _compress_response(resp):
+    if request.endpoint not in _COMPRESS_ENDPOINTS or resp.direct_passthrough or resp.is_streamed:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    if resp.status_code != 200 or "Content-Encoding" in resp.headers: return resp
+    enc = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    data = resp.get_data()
+    if enc and len(data) >= COMPRESS_MIN_BYTES:
+        resp.set_data(compress_bytes(data, enc))
+        resp.headers["Content-Encoding"] = enc
+    return resp
+
+# ====================== CSS/JS bundles =====================
+# The pages' <style>/<script> blocks live in the *_CSS/*_JS constants above
+# (the three framed pages share one pair). They are minified once, named by
+# content hash and served from /bundle as immutable, precompressed per
+# encoding, so moving between pages only re-sends each page's small HTML.
+BUNDLES = {
+    "login.css": LOGIN_CSS, "login.js": LOGIN_JS,
+    "frame.css": FRAME_CSS, "frame.js": FRAME_JS,
+    "dashboard.css": DASHBOARD_CSS, "dashboard.js": DASHBOARD_JS,
+}
+_BUNDLE_TYPES = {"css": "text/css", "js": "text/javascript"}
+
+def _minify_css(src: str) -> str:
+    # Drops comments and collapses whitespace; strings are copied untouched.
+    out, i, n = [], 0, len(src)
+    while i < n:
+        c = src[i]
+        if src.startswith("/*", i):
+            j = src.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+        elif c in "\"'":
+            j = i + 1
+            while j < n and src[j] != c: j += 2 if src[j] == "\\" else 1
+            out.append(src[i:j + 1]); i = j + 1
+        elif c.isspace():
+            while i < n and src[i].isspace(): i += 1
+            if out and out[-1] not in "{};,>: " and i < n and src[i] not in "{};,>!":
+                out.append(" ")
+        else:
+            if c == "}" and out and out[-1] == ";": out.pop()
+            out.append(c); i += 1
+    return "".join(out).strip()
+
+def _minify_js(src: str) -> str:
+    # Line-preserving so ASI is unaffected: strips indentation, blank lines and whole-line comments.
+    keep = []
+    for line in src.splitlines():
+        t = line.strip()
+        if not t or t.startswith("//") or (t.startswith("/*") and t.endswith("*/") and "*/" not in t[2:-2]):
+            continue
+        keep.append(t)
+    return "\n".join(keep)
+
+_bundle_files: dict = {}
+_bundle_names: dict = {}
+for _name, _src in BUNDLES.items():
+    _base, _ext = _name.rsplit(".", 1)
+    _body = (_minify_css(_src) if _ext == "css" else _minify_js(_src)).encode("utf-8")
+    _bundle_names[_name] = f"{_base}.{hashlib.sha256(_body).hexdigest()[:12]}.{_ext}"
+    _bundle_files[_bundle_names[_name]] = {"body": _body, "mime": _BUNDLE_TYPES[_ext], "packed": {}}
+
+def bundle_url(name: str) -> str:
+    return url_for("bundle_file", filename=_bundle_names[name])
+
+app.jinja_env.globals["bundle_url"] = bundle_url
+
+# ===================== Page rendering ======================
+# The inline templates are compiled once at import. Their output depends only
+# on process-lifetime values (CSRF token, config, static URLs), so each page
+# is rendered once per script root and then served from memory, together with
+# its precompressed variants, under a strong ETag per representation; a
+# repeat visit revalidates to a 304.
+_PAGES = {name: app.jinja_env.from_string(src) for name, src in (
+    ("login", LOGIN_TEMPLATE), ("ui", TEMPLATE), ("mini", MINI_TEMPLATE),
+    ("comfyui", COMFYUI_TEMPLATE), ("gallery", GALLERY_TEMPLATE))}
+_page_cache: dict = {}
+_page_lock = threading.Lock()
+
+def _page_context() -> dict:
+    return {
+        "csrf_token": CSRF_TOKEN,
+        "delete_path": DELETE_PATH,
+        "service_proxy": SERVICE_PROXY,
+        "apple_icon": asset_url("touch-icon"),
+        "favicon32": asset_url("favicon-32"),
+        "favicon16": asset_url("favicon-16"),
+    }
+
+def render_page(name: str) -> str:
+    ctx = _page_context()
+    app.update_template_context(ctx)
+    return _PAGES[name].render(ctx)
+
+def cached_page(name: str) -> Response:
+    key = (name, request.script_root)
+    entry = _page_cache.get(key)
+    if entry is None:
+        body = render_page(name).encode("utf-8")
+        entry = {"body": body, "etag": hashlib.sha256(body).hexdigest()[:32], "packed": {}}
+        with _page_lock: _page_cache[key] = entry
+    enc = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    etag = f"{entry['etag']}.{enc}" if enc else entry["etag"]
+    resp = Response(packed_body(entry, enc), mimetype="text/html")
+    if enc: resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
+
+# ==================== Installable app (PWA) =================
+# /manifest.webmanifest makes the remote installable to the home screen and
+# /sw.js caches the app shell: bundles and images cache-first (their names are
+# content hashes), the pages and /status//netinfo stale-while-revalidate, so
+# a cold start paints from the cache and /events fills in live state. The
+# worker's VERSION hashes everything it precaches plus the page templates, so
+# upgrading the controller installs a new worker that drops the old cache.
+# Browsers only run service workers on https or localhost.
+SHELL_PAGES = ("/", "/mini", "/comfyui", "/gallery")
+
+SW_TEMPLATE = """
+/* Pocket Comfy service worker, generated by the controller. */
+const VERSION = {{ version|tojson }};
+const SHELL = 'pocketcomfy-' + VERSION;
+const PRECACHE = {{ precache|tojson }};
+const PAGES = {{ pages|tojson }};
+const LIVE = ['/status', '/netinfo'];
+
+self.addEventListener('install', e => {
+  e.waitUntil((async () => {
+    const cache = await caches.open(SHELL);
+    await cache.addAll(PRECACHE);
+    // Pages need a session; before login they redirect and are cached on first visit instead.
+    await Promise.all(PAGES.map(p => revalidate(cache, p, true)));
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener('activate', e => {
+  e.waitUntil((async () => {
+    for (const key of await caches.keys()) if (key.startsWith('pocketcomfy-') && key !== SHELL) await caches.delete(key);
+    await self.clients.claim();
+  })());
+});
+
+async function signedOut(cache){
+  for (const p of PAGES.concat(LIVE)) await cache.delete(p);
+  for (const c of await self.clients.matchAll({ type: 'window' })) c.postMessage({ type: 'logged-out' });
+}
+
+async function revalidate(cache, path, quiet){
+  try{
+    const r = await fetch(path, { cache: 'no-cache' });
+    if (r.redirected){ if (!quiet && new URL(r.url).pathname === '/login') await signedOut(cache); return null; }
+    if (r.ok) await cache.put(path, r.clone());
+    return r;
+  }catch(_){ return null; }
+}
+
+async function cacheFirst(req){
+  const hit = await caches.match(req);
+  if (hit) return hit;
+  const r = await fetch(req);
+  if (r.ok){ const cache = await caches.open(SHELL); await cache.put(req, r.clone()); }
+  return r;
+}
+
+async function staleWhileRevalidate(e, path){
+  const cache = await caches.open(SHELL);
+  const hit = await cache.match(path);
+  if (hit){ e.waitUntil(revalidate(cache, path, false)); return hit; }
+  // Nothing cached yet: let the browser handle redirects (e.g. to /login) itself.
+  const r = await fetch(e.request);
+  if (r.ok && r.type === 'basic' && !r.redirected) await cache.put(path, r.clone());
+  return r;
+}
+
+async function networkFirst(req, path){
+  const cache = await caches.open(SHELL);
+  try{
+    const r = await fetch(req);
+    if (r.ok && r.type === 'basic' && !r.redirected) await cache.put(path, r.clone());
+    return r;
+  }catch(err){
+    const hit = await cache.match(path);
+    if (hit) return hit;
+    throw err;
+  }
+}
+
+self.addEventListener('fetch', e => {
+  const req = e.request;
+  if (req.method !== 'GET' || req.cache === 'no-store') return;
+  const url = new URL(req.url);
+  if (url.origin !== location.origin) return;
+  const path = url.pathname;
+  if (path.startsWith('/bundle/') || path.startsWith('/assets/')) e.respondWith(cacheFirst(req));
+  else if (req.mode === 'navigate' && PAGES.includes(path)) e.respondWith(staleWhileRevalidate(e, path));
+  else if (LIVE.includes(path)) e.respondWith(staleWhileRevalidate(e, path));
+  else if (req.mode === 'navigate' && path === '/login') e.respondWith(networkFirst(req, path));
+  // everything else (/svc, /events, /progress, POSTs) goes straight to the network
+});
+"""
+_sw_script = app.jinja_env.from_string(SW_TEMPLATE)
+_sw_cache: dict = {}
+
+def service_worker_entry() -> dict:
+    key = request.script_root
+    entry = _sw_cache.get(key)
+    if entry is None:
+        assets = build_assets()
+        precache = [bundle_url(name) for name in BUNDLES]
+        precache += [url_for("asset_file", filename=f) for name in ASSETS for f in assets.get(name, {}).values()]
+        pages = list(SHELL_PAGES)
+        # The CSRF token is deliberately not part of the version: a restart alone must not reinstall the worker.
+        digest = hashlib.sha256()
+        for part in precache + [LOGIN_TEMPLATE, TEMPLATE, MINI_TEMPLATE, COMFYUI_TEMPLATE, GALLERY_TEMPLATE, SW_TEMPLATE]:
+            digest.update(part.encode("utf-8"))
+        body = _sw_script.render(version=digest.hexdigest()[:12], precache=precache, pages=pages).encode("utf-8")
+        entry = {"body": body, "etag": hashlib.sha256(body).hexdigest()[:32], "packed": {}}
+        _sw_cache[key] = entry
+    return entry
+
+def web_manifest_data() -> dict:
+    return {
+        "name": "Pocket Comfy",
+        "short_name": "Pocket Comfy",
+        "start_url": url_for("ui"),
+        "scope": request.script_root + "/",
+        "display": "standalone",
+        "background_color": "#0a0b1e",
+        "theme_color": "#0a0b1e",
+        "icons": [
+            {"src": asset_url("icon-192"), "sizes": "192x192", "type": "image/png"},
+            {"src": asset_url("icon-512"), "sizes": "512x512", "type": "image/png"},
+        ],
+    }
+
 # ========================= Routes =========================
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -2611,14 +4597,7 @@ def login():
         else:
             time.sleep(0.4)
 
-    resp = make_response(render_template_string(
-        LOGIN_TEMPLATE,
-        csrf_token=CSRF_TOKEN,
-        hero_logo=url_for('static', filename=HERO_FILE),
-        apple_icon=url_for('static', filename='apple-touch-icon.png'),
-        favicon32=url_for('static', filename='favicon-32.png'),
-        favicon16=url_for('static', filename='favicon-16.png')
-    ))
+    resp = cached_page("login")
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
@@ -2627,62 +4606,78 @@ def login():
 @app.route("/", methods=["GET"])
 @login_required
 def ui():
-    return render_template_string(
-        TEMPLATE,
-        delete_path=DELETE_PATH,
-        csrf_token=CSRF_TOKEN,
-        brand_mascot=url_for('static', filename=BRAND_MASCOT_FILE),
-        apple_icon=url_for('static', filename='apple-touch-icon.png'),
-        favicon32=url_for('static', filename='favicon-32.png'),
-        favicon16=url_for('static', filename='favicon-16.png')
-    )
+    return cached_page("ui")
 
 @app.route("/mini", methods=["GET"])
 @login_required
 def mini_page():
-    return render_template_string(
-        MINI_TEMPLATE,
-        csrf_token=CSRF_TOKEN,
-        apple_icon=url_for('static', filename='apple-touch-icon.png'),
-        favicon32=url_for('static', filename='favicon-32.png'),
-        favicon16=url_for('static', filename='favicon-16.png')
-    )
+    return cached_page("mini")
+
 @app.route("/comfyui")
 @login_required
 def comfyui_page():
-    return render_template_string(
-        COMFYUI_TEMPLATE,
-        apple_icon=url_for("static", filename="apple-touch-icon.png"),
-        favicon32=url_for("static", filename="favicon-32.png"),
-        favicon16=url_for("static", filename="favicon-16.png"),
-        csrf_token=CSRF_TOKEN,
-    )
+    return cached_page("comfyui")
 
 @app.route("/gallery")
 @login_required
 def gallery_page():
-    return render_template_string(
-        GALLERY_TEMPLATE,
-        apple_icon=url_for("static", filename="apple-touch-icon.png"),
-        favicon32=url_for("static", filename="favicon-32.png"),
-        favicon16=url_for("static", filename="favicon-16.png"),
-        csrf_token=CSRF_TOKEN,
-    )
+    return cached_page("gallery")
+
+
+@app.route("/manifest.webmanifest")
+def web_manifest():
+    resp = Response(json.dumps(web_manifest_data()), mimetype="application/manifest+json")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/sw.js")
+def service_worker():
+    entry = service_worker_entry()
+    enc = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    resp = Response(packed_body(entry, enc), mimetype="text/javascript")
+    if enc: resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(f"{entry['etag']}.{enc}" if enc else entry["etag"])
+    # Always revalidated, so a controller upgrade reaches the browser on its next update check.
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+@app.route("/csrf")
+@login_required
+def csrf_token():
+    resp = jsonify(token=CSRF_TOKEN)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+@app.route("/assets/<path:filename>")
+def asset_file(filename):
+    resp = send_from_directory(ASSET_DIR, filename, max_age=31536000)
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
 
+@app.route("/bundle/<filename>")
+def bundle_file(filename):
+    entry = _bundle_files.get(filename)
+    if entry is None: return ("Not Found", 404)
+    enc = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    resp = Response(packed_body(entry, enc), mimetype=entry["mime"])
+    if enc: resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
 
 @app.route("/ensure_mini", methods=["POST"])
 @login_required
 def ensure_mini_route():
-    threading.Thread(target=ensure_mini, daemon=True).start()
+    # Fire and forget; a start already underway (even one waiting on ComfyUI) finishes without another thread.
+    start_services(["mini"], only_missing=True, if_idle=True)
     return "success"
 
 @app.route("/ensure_comfy", methods=["POST"])
 @login_required
 def ensure_comfy_route():
     try:
-        if not (is_port_in_use(COMFY_PORT_DEFAULT) or comfy_running_by_handle()):
-            launch_comfy()
-            wait_for_comfy_ready(WAIT_FOR_COMFY_SECS)
+        start_services(["comfy"], only_missing=True, block=True)
         return "success"
     except Exception:
         return ("fail", 500)
@@ -2691,9 +4686,7 @@ def ensure_comfy_route():
 @login_required
 def ensure_gallery_route():
     try:
-        if not (is_port_in_use(SMART_GALLERY_PORT_DEFAULT) or gallery_running_by_handle()):
-            launch_gallery()
-            wait_for_gallery_ready(WAIT_FOR_GALLERY_SECS)
+        start_services(["gallery"], only_missing=True, block=True)
         return "success"
     except Exception:
         return ("fail", 500)
@@ -2702,41 +4695,150 @@ def ensure_gallery_route():
 @app.route("/status", methods=["GET"])
 @login_required
 def status():
-    comfy_alive = comfy_running_by_handle()
-    mini_alive  = mini_running_by_handle()
-    gallery_alive = gallery_running_by_handle()
-    if not comfy_alive and is_port_in_use(COMFY_PORT_DEFAULT):
-        comfy_alive = True; detected_ports["comfy"] = COMFY_PORT_DEFAULT
-    if not mini_alive and is_port_in_use(MINI_PORT_DEFAULT):
-        mini_alive = True; detected_ports["mini"] = MINI_PORT_DEFAULT
-    if not gallery_alive and is_port_in_use(SMART_GALLERY_PORT_DEFAULT):
-        gallery_alive = True; detected_ports["gallery"] = SMART_GALLERY_PORT_DEFAULT
-    if comfy_alive:
-        port = detect_port_for("comfy", COMFY_PORT_DEFAULT)
-        if port: detected_ports["comfy"] = port
-    if mini_alive:
-        port = detect_port_for("mini", MINI_PORT_DEFAULT)
-        if port: detected_ports["mini"] = port
-    if gallery_alive:
-        port = detect_port_for("gallery", SMART_GALLERY_PORT_DEFAULT)
-        if port: detected_ports["gallery"] = port
-    return jsonify({"comfy": comfy_alive, "mini": mini_alive, "gallery": gallery_alive, "mode_hidden": is_hidden_mode()})
+    s = collect_status()
+    return jsonify({**{key: s[key] for key in SERVICES}, "mode_hidden": s["mode_hidden"]})
 
 @app.route("/netinfo", methods=["GET"])
 @login_required
 def netinfo():
-    lan_ip = get_lan_ip()
-    comfy_port = detected_ports.get("comfy") or (COMFY_PORT_DEFAULT if is_port_in_use(COMFY_PORT_DEFAULT) else None)
-    mini_port  = detected_ports.get("mini")  or (MINI_PORT_DEFAULT  if is_port_in_use(MINI_PORT_DEFAULT)  else None)
-    gallery_port = detected_ports.get("gallery") or (SMART_GALLERY_PORT_DEFAULT if is_port_in_use(SMART_GALLERY_PORT_DEFAULT) else None)
-    comfy_alive   = is_port_in_use(COMFY_PORT_DEFAULT)   or comfy_running_by_handle()
-    mini_alive    = is_port_in_use(MINI_PORT_DEFAULT)    or mini_running_by_handle()
-    gallery_alive = is_port_in_use(SMART_GALLERY_PORT_DEFAULT) or gallery_running_by_handle()
-    return jsonify({
-        "lan_ip": lan_ip, "flask_port": FLASK_PORT,
-        "comfy_port": comfy_port, "mini_port": mini_port, "gallery_port": gallery_port,
-        "comfy_running": comfy_alive, "mini_running": mini_alive, "gallery_running": gallery_alive,
-    })
+    s = collect_status()
+    out = {"lan_ip": s["lan_ip"], "flask_port": s["flask_port"]}
+    for key in SERVICES:
+        out[f"{key}_port"] = s[f"{key}_port"]; out[f"{key}_running"] = s[key]
+    return jsonify(out)
+
+@app.route("/storage", methods=["GET"])
+@login_required
+def storage():
+    if not DELETE_PATH: return jsonify(error="DELETE_PATH not configured"), 404
+    start_storage_indexer()
+    summary = _status_state["storage"]
+    if summary is None: return jsonify(root=os.path.abspath(DELETE_PATH), ready=False)
+    return jsonify({**summary, "ready": True})
+
+@app.route("/retention", methods=["GET"])
+@login_required
+def retention():
+    """Dry run: what the retention policy would remove right now."""
+    if not DELETE_PATH: return jsonify(error="DELETE_PATH not configured"), 404
+    plan = retention_plan()
+    limit = request.args.get("limit", 200, type=int)
+    return jsonify({**plan, "evict": plan["evict"][:max(0, limit)], "truncated": len(plan["evict"]) > limit})
+
+@app.route("/thumb", methods=["GET"])
+@login_required
+def thumb():
+    if Image is None: return jsonify(error="Pillow not installed"), 503
+    src = resolve_output(request.args.get("p", ""))
+    if src is None: return jsonify(error="Not found"), 404
+    ext = os.path.splitext(src)[1].lower()
+    width = thumb_width(request.args.get("w", 320, type=int))
+    if ext in VIDEO_TYPES:
+        if cv2 is None: return jsonify(error="opencv-python not installed"), 503
+        kind, wait = "video", VIDEO_WAIT_SECS
+        if request.args.get("anim", 0, type=int) == 1:
+            width = min(width, CLIP_MAX_WIDTH)
+            variant, fn = f"clip{width}", _render_clip
+        else:
+            variant, fn = f"poster{width}", _render_poster
+    elif ext in THUMB_TYPES:
+        variant, fn, kind, wait = f"thumb{width}", _render_thumb, "image", None
+    else:
+        return jsonify(error="Not an image or video"), 415
+    try: st = os.stat(src)
+    except FileNotFoundError: return jsonify(error="Not found"), 404  # deleted since it was resolved
+    key = preview_key(src, st, variant)
+    if request.if_none_match.contains(key): return preview_not_modified(key)
+    rel = request.args.get("p", "")
+    try:
+        path = cached_preview(key, "webp", fn, src, width, kind=kind, wait=wait)
+    except PreviewFailed:
+        return jsonify(error=f"Cannot render a preview of {rel}"), 422
+    except Exception as e:  # pool or cache trouble; details stay in the console, not the response
+        print(f"[WARN] preview of {rel}: {e!r}")
+        return jsonify(error=f"Cannot render a preview of {rel}"), 500
+    if path is None:  # still rendering; the client retries
+        resp = jsonify(pending=True)
+        resp.status_code = 202; resp.headers["Retry-After"] = "2"; resp.cache_control.no_store = True
+        return resp
+    return preview_response(path, "image/webp", key)
+
+@app.route("/output/<path:rel>", methods=["GET"])
+@login_required
+def output_file(rel):
+    path = resolve_output(rel)
+    if path is None: return jsonify(error="Not found"), 404
+    return output_response(path, download=request.args.get("dl", 0, type=int) == 1)
+
+@app.route("/export", methods=["GET"])
+@login_required
+def export_zip():
+    base = resolve_output(request.args.get("folder", ""), folder=True)
+    if base is None: return jsonify(error="Folder not found"), 404
+    try:
+        since = parse_export_date(request.args.get("since", ""))
+        until = parse_export_date(request.args.get("until", ""), end=True)
+    except ValueError:
+        return jsonify(error="Dates must be ISO, e.g. 2026-10-17 or 2026-10-17T08:00"), 400
+    files = export_files(base, request.args.get("glob", "").strip(), since, until)
+    label = os.path.basename(base) or "outputs"
+    name = f"{label}-{time.strftime('%Y%m%d-%H%M%S')}.zip"
+    return Response(zip_stream(files), mimetype="application/zip", headers={
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}",
+        "Cache-Control": "no-store", "X-Content-Type-Options": "nosniff"})
+
+@app.route("/events", methods=["GET"])
+@login_required
+def events():
+    start_port_sampler()
+    start_storage_indexer()
+    if _status_state["data"] is None: publish_status()
+    resp = Response(_status_events(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/progress", methods=["GET"])
+@login_required
+def progress():
+    resp = Response(_progress_events(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/progress/preview", methods=["GET"])
+@login_required
+def progress_preview():
+    preview = _progress["preview"]
+    if not preview: return ("", 204)
+    seq, mime, img = preview
+    resp = Response(img, mimetype=mime)
+    resp.set_etag(f"preview-{PROGRESS_CLIENT_ID}-{seq}")
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
+
+_PROXY_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+@app.route("/svc/<name>", methods=_PROXY_METHODS)
+@login_required
+def svc_root(name):
+    if name not in SERVICES: return ("Not Found", 404)
+    return redirect(f"/svc/{name}/")
+
+@app.route("/svc/<name>/", methods=_PROXY_METHODS)
+@app.route("/svc/<name>/<path:sub>", methods=_PROXY_METHODS)
+@app.route("/svc/<name>/", endpoint="svc_proxy_ws", websocket=True)  # werkzeug routes upgrades only to websocket rules
+@app.route("/svc/<name>/<path:sub>", endpoint="svc_proxy_ws", websocket=True)
+@login_required
+def svc_proxy(name, sub=""):
+    if name not in SERVICES: return ("Not Found", 404)
+    return proxy_to_service(name, _raw_target(f"/svc/{name}"))
+
+@app.errorhandler(404)
+def _proxy_fallback(e):
+    name = referer_service()
+    if name and session.get("auth_ok"): return proxy_to_service(name, _raw_target())
+    return e
 
 @app.route("/checkpw", methods=["POST"])
 @login_required
@@ -2749,62 +4851,296 @@ def checkpw():
 @app.route("/restart", methods=["POST"])
 @login_required
 def restart():
-    stop_all(); time.sleep(2); launch_all(); return "success"
+    return job_response(submit_job("restart", "Restart", _job_restart, cancellable=True))
 
 @app.route("/stop", methods=["POST"])
 @login_required
 def stop():
-    stop_all(); return "success"
+    return job_response(submit_job("stop", "Stop", _job_stop))
 
 @app.route("/shutdown", methods=["POST"])
 @login_required
 def shutdown():
-    def _kill_and_exit():
-        stop_all()
-        time.sleep(5.0)
-        kill_other_controller_instances()
-        time.sleep(0.3)
-        os._exit(0)
-    threading.Thread(target=_kill_and_exit, daemon=True).start()
-    return "success"
+    return job_response(submit_job("shutdown", "Shutdown", _job_shutdown))
+
+def _outputs_password_ok() -> bool:
+    return bool(DELETE_PASSWORD and DELETE_PATH) and request.form.get("password") == DELETE_PASSWORD
 
 @app.route("/delete", methods=["POST"])
 @login_required
 def delete_folder():
-    if not (DELETE_PASSWORD and DELETE_PATH): return "error"
-    if request.form.get("password") != DELETE_PASSWORD: return "error"
-    try:
-        if os.path.exists(DELETE_PATH): shutil.rmtree(DELETE_PATH, ignore_errors=True)
-        return "success"
-    except Exception: return "error"
+    if not _outputs_password_ok(): return jsonify(error="Wrong password or delete not configured"), 403
+    return job_response(submit_job("delete", "Delete outputs", _job_delete, group="outputs", cancellable=True))
 
 @app.route("/recreate", methods=["POST"])
 @login_required
 def recreate_folder():
-    if not (DELETE_PASSWORD and DELETE_PATH): return "error"
-    if request.form.get("password") != DELETE_PASSWORD: return "error"
-    try:
-        os.makedirs(DELETE_PATH, exist_ok=True); return "success"
-    except Exception: return "error"
+    if not _outputs_password_ok(): return jsonify(error="Wrong password or delete not configured"), 403
+    return job_response(submit_job("recreate", "Recreate outputs", _job_recreate, group="outputs"))
 
 @app.route("/relaunch_hidden_full", methods=["POST"])
 @login_required
 def route_relaunch_hidden_full():
-    def worker(): stop_all(); time.sleep(0.8); relaunch_hidden_core()
-    threading.Thread(target=worker, daemon=True).start()
-    return "success"
+    return job_response(submit_job("relaunch", "Hidden mode", _job_relaunch(True)))
 
 @app.route("/relaunch_visible_full", methods=["POST"])
 @login_required
 def route_relaunch_visible_full():
-    def worker(): stop_all(); time.sleep(0.8); relaunch_visible_core_autostart()
-    threading.Thread(target=worker, daemon=True).start()
-    return "success"
+    return job_response(submit_job("relaunch", "Visible mode", _job_relaunch(False)))
+
+def job_response(job: Optional[Job]):
+    if job is None: return jsonify(error="No such job"), 404
+    resp = jsonify(job.snapshot())
+    resp.headers["Cache-Control"] = "no-store"
+    return resp, 202 if request.method == "POST" else 200
+
+@app.route("/jobs")
+@login_required
+def jobs_list():
+    with _jobs_lock: snaps = [j.snapshot() for j in reversed(list(_jobs.values()))]
+    resp = jsonify(jobs=snaps)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+@app.route("/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    return job_response(_jobs.get(job_id))
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+@login_required
+def job_cancel(job_id):
+    return job_response(cancel_job(job_id))
+
+@app.route("/boot")
+def boot_id():
+    # Unauthenticated and tiny: a page waiting out a relaunch polls it to see the new process.
+    return Response(BOOT_ID, mimetype="text/plain", headers={"Cache-Control": "no-store"})
+
+# ======================= HTTP server =======================
+# SERVER_MODE=threaded (the default) serves on a bounded pool of
+# SERVER_THREADS workers with HTTP/1.1 keep-alive; SERVER_MODE=dev keeps
+# Werkzeug's run_simple. Accepted connections wait in a queue of
+# SERVER_BACKLOG and get a 503 once it is full. SSE, WebSocket and ZIP export
+# responses hand their worker back to the pool (up to SERVER_STREAMS of them),
+# so open tabs and long downloads never starve ordinary requests. Every socket read/write is bounded by
+# REQUEST_TIMEOUT_SECS, the idle gap between requests by KEEPALIVE_SECS, and
+# on shutdown the listener closes while in-flight requests get DRAIN_SECS.
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import LimitedStream
+
+_LONG_LIVED_TYPES = ("text/event-stream", "application/zip")  # responses that give their worker back
+_DRAIN_BODY_MAX = 1 << 20  # unread request body we skip rather than dropping the connection
+_worker_state = threading.local()
+_server: Optional["PooledWSGIServer"] = None
+
+class PooledRequestHandler(WSGIRequestHandler):
+    timeout = REQUEST_TIMEOUT_SECS
+
+    def log(self, *args, **kwargs): pass
+
+    def handle_one_request(self):
+        if getattr(self, "served", 0) and not self.server.await_next_request(self):
+            self.close_connection = True
+            return
+        self.served = getattr(self, "served", 0) + 1
+        super().handle_one_request()
+
+    def run_wsgi(self):
+        # Werkzeug's run_wsgi always answers "Connection: close"; this one keeps
+        # the connection when the request body was consumed and the response
+        # is delimited (Content-Length or chunked).
+        if self.headers.get("Expect", "").lower().strip(" \t") == "100-continue":
+            self.wfile.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        environ = self.environ = self.make_environ()
+        environ["wsgi.file_wrapper"] = FileSegments
+        if self.server.draining: self.close_connection = True
+        if environ.get("HTTP_UPGRADE", "").lower() == "websocket": self.server.detach()
+        body = None
+        if environ.get("wsgi.input_terminated"):
+            self.close_connection = True  # chunked upload: cannot tell where it ends if unread
+        else:
+            try: length = max(0, int(environ.get("CONTENT_LENGTH") or 0))
+            except ValueError: length, self.close_connection = 0, True
+            body = environ["wsgi.input"] = LimitedStream(self.rfile, length)
+        state = {"status": None, "headers": None, "sent": False, "chunked": False}
+
+        def write(data: bytes):
+            if not state["sent"]:
+                state["sent"] = True
+                code, _, msg = state["status"].partition(" ")
+                code = int(code)
+                self.send_response(code, msg)
+                keys = set()
+                for k, v in state["headers"]:
+                    self.send_header(k, v); keys.add(k.lower())
+                if not ("content-length" in keys or environ["REQUEST_METHOD"] == "HEAD"
+                        or 100 <= code < 200 or code in (204, 304)):
+                    if self.request_version == "HTTP/1.1":
+                        state["chunked"] = True
+                        self.send_header("Transfer-Encoding", "chunked")
+                    else:
+                        self.close_connection = True
+                if self.close_connection: self.send_header("Connection", "close")
+                self.end_headers()
+            if data:
+                if state["chunked"]: self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else: self.wfile.write(data)
+            self.wfile.flush()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and state["sent"]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            if any(k.lower() == "content-type" and v.startswith(_LONG_LIVED_TYPES) for k, v in headers):
+                self.server.detach()
+            state["status"], state["headers"] = status, headers
+            return write
+
+        try:
+            result = self.server.app(environ, start_response)
+            try:
+                if not (isinstance(result, FileSegments) and self.send_segments(result, write, state)):
+                    for data in result: write(data)
+                if not state["sent"]: write(b"")
+                if state["chunked"]: self.wfile.write(b"0\r\n\r\n")
+            finally:
+                if hasattr(result, "close"): result.close()
+        except (ConnectionError, socket.timeout) as e:
+            self.close_connection = True  # includes hijacked WebSocket connections
+            self.connection_dropped(e, environ)
+            return
+        except Exception as e:
+            self.close_connection = True
+            print(f"[ERROR] {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}: {e!r}")
+            if not state["sent"]:
+                try:
+                    state["status"], state["headers"] = "500 Internal Server Error", [
+                        ("Content-Type", "text/plain"), ("Content-Length", "21")]
+                    write(b"Internal Server Error")
+                except OSError: pass
+            return
+        if body is not None and not self.close_connection and not body.is_exhausted:
+            if body.limit > _DRAIN_BODY_MAX: self.close_connection = True
+            else: body.exhaust()
+
+    def send_segments(self, body: FileSegments, write, state) -> bool:
+        """Write file slices straight from the page cache; False to fall back to iterating."""
+        try: body.file.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation): return False
+        write(b"")  # headers
+        if state["chunked"]: return False  # no Content-Length: frame the chunks the normal way
+        for part in body.parts:
+            if isinstance(part, bytes): self.wfile.write(part)
+            else: self.connection.sendfile(body.file, part[0], part[1])
+        return True
+
+class PooledWSGIServer(BaseWSGIServer):
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, handler=PooledRequestHandler):
+        super().__init__(host, port, app, handler=handler)
+        self.draining = False
+        self._queue: queue.Queue = queue.Queue(max(1, SERVER_BACKLOG))
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._active: dict = {}  # socket -> "request" | "stream"
+        self.streams = self.idle = 0
+        for _ in range(max(1, SERVER_THREADS)): self._spawn()
+
+    def _spawn(self):
+        threading.Thread(target=self._worker, daemon=True, name="http-worker").start()
+
+    def _worker(self):
+        while True:
+            with self._lock: self.idle += 1
+            conn, addr = self._queue.get()
+            _worker_state.conn, _worker_state.stream = conn, False
+            with self._lock:
+                self.idle -= 1
+                self._active[conn] = "request"
+            try:
+                # Headers and body are separate writes; without this a kept-alive
+                # connection waits out the client's delayed ACK (~40 ms) per response.
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.finish_request(conn, addr)
+            except Exception:
+                self.handle_error(conn, addr)
+            finally:
+                self.shutdown_request(conn)
+                with self._lock:
+                    self._active.pop(conn, None)
+                    if _worker_state.stream: self.streams -= 1
+                    self._idle.notify_all()
+            if _worker_state.stream: return  # a replacement took this worker's place
+
+    def detach(self):
+        """Called on the worker thread when its response turns into a long-lived stream."""
+        if getattr(_worker_state, "stream", True): return
+        with self._lock:
+            if self.streams >= SERVER_STREAMS: return
+            self.streams += 1
+            self._active[_worker_state.conn] = "stream"
+        _worker_state.stream = True
+        self._spawn()
+
+    def process_request(self, request, client_address):
+        if self.draining:
+            self.shutdown_request(request); return
+        try:
+            self._queue.put_nowait((request, client_address))
+        except queue.Full:
+            try:
+                request.settimeout(1)
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                                b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError: pass
+            self.shutdown_request(request)
+
+    def saturated(self) -> bool:
+        return not self._queue.empty() and self.idle == 0
+
+    def await_next_request(self, handler) -> bool:
+        """Wait on an idle keep-alive connection; give it up when the pool is saturated or we drain."""
+        sock = handler.connection
+        try:
+            sock.settimeout(0)
+            if handler.rfile.peek(1): return True  # pipelined request already buffered
+            deadline = time.monotonic() + KEEPALIVE_SECS
+            while not self.draining and not self.saturated():
+                left = deadline - time.monotonic()
+                if left <= 0: return False
+                if select.select([sock], [], [], min(left, 0.25))[0]: return True
+            return False
+        except (OSError, ValueError):
+            return False
+        finally:
+            try: sock.settimeout(REQUEST_TIMEOUT_SECS)
+            except OSError: pass
+
+    def drain(self, timeout: float):
+        self.draining = True
+        self.shutdown()  # stops accepting; serve_forever closes the listener
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._idle.wait_for(lambda: "request" not in self._active.values() and self._queue.empty(),
+                                timeout=max(0.0, deadline - time.monotonic()))
+            left = list(self._active)
+        for conn in left:  # streams (and stragglers) are cut; browsers reconnect to the next run
+            try: conn.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+
+def drain_server(timeout: float = DRAIN_SECS):
+    """Stop accepting connections and let in-flight requests finish before the process exits."""
+    srv = _server
+    if srv is None or srv.draining: return
+    started = time.perf_counter()
+    srv.drain(timeout)
+    print(f"[INFO] HTTP server drained in {time.perf_counter() - started:.1f}s")
 
 # =================== Server bootstrap =====================
 def run_flask():
+    global _server
     import logging
-    from werkzeug.serving import WSGIRequestHandler
     class SilentRequestHandler(WSGIRequestHandler):
         def log(self, *args, **kwargs): pass
     logging.getLogger("werkzeug").setLevel(logging.ERROR)
@@ -2813,14 +5149,31 @@ def run_flask():
     if START_DELAY: time.sleep(START_DELAY)
     lan = get_lan_ip()
     print(f"[INFO] Flask at http://0.0.0.0:{FLASK_PORT}  (LAN: http://{lan}:{FLASK_PORT})")
-    app.run(host="0.0.0.0", port=FLASK_PORT, debug=False, use_reloader=False,
-            request_handler=SilentRequestHandler)
+    if SERVER_MODE == "dev":
+        app.run(host="0.0.0.0", port=FLASK_PORT, debug=False, use_reloader=False,
+                request_handler=SilentRequestHandler)
+        return
+    _server = PooledWSGIServer("0.0.0.0", FLASK_PORT, app)
+    print(f"[INFO] HTTP: {SERVER_THREADS} workers, keep-alive {KEEPALIVE_SECS}s, "
+          f"request timeout {REQUEST_TIMEOUT_SECS}s")
+    _server.serve_forever()
 
 def main():
+    start_port_sampler()
+    threading.Thread(target=build_assets, daemon=True).start()
+    resume_purge()
+    start_storage_indexer()
+    start_retention()
     threading.Thread(target=run_flask, daemon=True).start()
     if not SKIP_LAUNCH:
         launch_all()
-    while True: time.sleep(1)
+    def _on_term(signum, frame): raise KeyboardInterrupt
+    try: signal.signal(signal.SIGTERM, _on_term)
+    except (ValueError, OSError): pass
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        drain_server()
 
 if __name__ == "__main__":
     print("Starting Pocket Comfy")
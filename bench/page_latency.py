@@ -0,0 +1,68 @@
+"""Page latency before/after compiling and caching the page templates.
+
+Serves the app on Werkzeug's dev server on a free loopback port and times
+sequential GETs per page. "before" swaps cached_page() for the old
+per-request render_template_string(); "after" is the cached page, and
+"304" revalidates it with If-None-Match.
+
+    python bench/page_latency.py [--requests 200]
+"""
+import argparse, http.client, os, statistics, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Response, render_template_string
+from werkzeug.serving import WSGIRequestHandler, make_server
+import PocketComfy as pc
+
+PAGES = {"/login": "login", "/": "ui", "/mini": "mini", "/comfyui": "comfyui", "/gallery": "gallery"}
+SOURCES = {"login": pc.LOGIN_TEMPLATE, "ui": pc.TEMPLATE, "mini": pc.MINI_TEMPLATE,
+           "comfyui": pc.COMFYUI_TEMPLATE, "gallery": pc.GALLERY_TEMPLATE}
+
+class QuietHandler(WSGIRequestHandler):
+    def log(self, *args, **kwargs): pass
+
+def uncached_page(name: str) -> Response:
+    return Response(render_template_string(SOURCES[name], **pc._page_context()), mimetype="text/html")
+
+def get(port: int, path: str, headers: dict) -> tuple[float, http.client.HTTPResponse, bytes]:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    t = time.perf_counter()
+    conn.request("GET", path, headers=headers)
+    resp = conn.getresponse(); body = resp.read()
+    elapsed = (time.perf_counter() - t) * 1000
+    conn.close()
+    return elapsed, resp, body
+
+def p50(port: int, path: str, headers: dict, n: int) -> float:
+    return statistics.median(get(port, path, headers)[0] for _ in range(n))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    args = ap.parse_args()
+    pc.LOGIN_PASS = "bench"
+    server = make_server("127.0.0.1", 0, pc.app, threaded=True, request_handler=QuietHandler)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("POST", "/login", body="password=bench", headers={"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse(); resp.read(); conn.close()
+    cookie = {"Cookie": resp.getheader("Set-Cookie", "").split(";", 1)[0]}
+
+    cached = pc.cached_page
+    print(f"{args.requests} sequential requests per page, p50")
+    print(f"  {'page':<10}{'bytes':>7}{'before':>11}{'after':>10}{'304':>10}")
+    for path in PAGES:
+        pc.cached_page = uncached_page
+        before = p50(port, path, cookie, args.requests)
+        pc.cached_page = cached
+        _, resp, body = get(port, path, cookie)
+        after = p50(port, path, cookie, args.requests)
+        etag = resp.getheader("ETag")
+        revalidate = p50(port, path, {**cookie, "If-None-Match": etag}, args.requests) if path != "/login" else None
+        reval = f"{revalidate:7.2f} ms" if revalidate is not None else "  (no-store)"
+        print(f"  {path:<10}{len(body):>7}{before:8.2f} ms{after:7.2f} ms{reval:>10}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
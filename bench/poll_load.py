@@ -0,0 +1,104 @@
+"""/status polling load test: pooled keep-alive server vs Werkzeug's dev server.
+
+Runs the app in-process on a free loopback port with each server in turn,
+then has --pollers clients (default 20) poll /status over keep-alive
+connections for --secs seconds, optionally with --sse /events streams held
+open. Reports throughput, p50 latency, TCP connections opened and errors.
+
+    python bench/poll_load.py [--pollers 20] [--secs 10] [--sse 8]
+"""
+import argparse, http.client, os, statistics, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from werkzeug.serving import WSGIRequestHandler, make_server
+import PocketComfy as pc
+
+class QuietHandler(WSGIRequestHandler):
+    def log(self, *args, **kwargs): pass
+
+class CountingConnection(http.client.HTTPConnection):
+    opened = 0
+    lock = threading.Lock()
+
+    def connect(self):
+        with CountingConnection.lock: CountingConnection.opened += 1
+        super().connect()
+
+def start(mode: str):
+    if mode == "dev":
+        server = make_server("127.0.0.1", 0, pc.app, threaded=True, request_handler=QuietHandler)
+    else:
+        server = pc.PooledWSGIServer("127.0.0.1", 0, pc.app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def login(port: int) -> str:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("POST", "/login", body="password=bench", headers={"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse(); resp.read(); conn.close()
+    return resp.getheader("Set-Cookie", "").split(";", 1)[0]
+
+def hold_stream(port: int, cookie: str, stop: threading.Event):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+    try:
+        conn.request("GET", "/events", headers={"Cookie": cookie})
+        resp = conn.getresponse()
+        while not stop.is_set():
+            try: resp.read1(4096)
+            except OSError: pass
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+def poll(port: int, cookie: str, until: float, latencies: list, errors: list):
+    conn = CountingConnection("127.0.0.1", port, timeout=10)
+    mine = []
+    while time.perf_counter() < until:
+        t = time.perf_counter()
+        try:
+            conn.request("GET", "/status", headers={"Cookie": cookie})
+            resp = conn.getresponse(); resp.read()
+            if resp.status != 200: errors.append(resp.status)
+            if resp.will_close: conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e)); conn.close()
+        mine.append(time.perf_counter() - t)
+    conn.close()
+    latencies.extend(mine)
+
+def run(mode: str, args) -> str:
+    server = start(mode)
+    port = server.server_port
+    cookie = login(port)
+    stop = threading.Event()
+    streams = [threading.Thread(target=hold_stream, args=(port, cookie, stop), daemon=True) for _ in range(args.sse)]
+    for t in streams: t.start()
+    time.sleep(0.2)
+    CountingConnection.opened = 0
+    latencies, errors = [], []
+    until = time.perf_counter() + args.secs
+    pollers = [threading.Thread(target=poll, args=(port, cookie, until, latencies, errors)) for _ in range(args.pollers)]
+    for t in pollers: t.start()
+    for t in pollers: t.join()
+    stop.set()
+    if mode == "dev": server.shutdown()
+    else: server.drain(1)
+    p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+    return (f"  {mode:<9}{len(latencies) / args.secs:8.0f} req/s   p50 {p50:6.1f} ms   "
+            f"{CountingConnection.opened:5} connections   {len(errors)} errors")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pollers", type=int, default=20)
+    ap.add_argument("--secs", type=float, default=10)
+    ap.add_argument("--sse", type=int, default=0)
+    ap.add_argument("--mode", choices=("both", "dev", "threaded"), default="both")
+    args = ap.parse_args()
+    pc.LOGIN_PASS = "bench"
+    print(f"{args.pollers} keep-alive /status pollers for {args.secs:g}s, {args.sse} SSE streams open")
+    for mode in (("dev", "threaded") if args.mode == "both" else (args.mode,)):
+        print(run(mode, args))
+
+if __name__ == "__main__":
+    main()
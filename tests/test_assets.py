@@ -0,0 +1,26 @@
+"""build_assets() only cleans up files it wrote itself."""
+import os
+
+import pytest
+
+import PocketComfy as pc
+
+
+@pytest.fixture
+def asset_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pc, "ASSET_DIR", str(tmp_path))
+    monkeypatch.setattr(pc, "ASSETS", {"favicon-16": pc.ASSETS["favicon-16"]})
+    monkeypatch.setattr(pc, "_asset_manifest", None)
+    return tmp_path
+
+
+def test_unrelated_files_survive(asset_dir):
+    unrelated = ["notes.txt", "photo.png", "mascot.png", "mascot.0123456789ab.webp.bak", "other.json.1.tmp"]
+    stale = ["mascot.0123456789ab.webp", "favicon-16.0123456789ab.png", "manifest.json.4242.tmp"]
+    for name in unrelated + stale: (asset_dir / name).write_bytes(b"x")
+    (asset_dir / "keep").mkdir()
+
+    manifest = pc.build_assets()
+
+    left = set(os.listdir(asset_dir))
+    assert set(unrelated) | {"keep", "manifest.json", manifest["favicon-16"]["png"]} == left
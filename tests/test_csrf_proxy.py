@@ -0,0 +1,36 @@
+"""CSRF and POST rate limiting must not be skippable with a forged Referer."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import PocketComfy as pc
+
+SVC_REFERER = {"Referer": "http://localhost/svc/comfy/"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(pc, "_rate", {})
+    monkeypatch.setattr(pc, "proxy_to_service", lambda name, target: ("proxied", 200))
+    c = pc.app.test_client()
+    with c.session_transaction() as s:
+        s["auth_ok"] = True
+    return c
+
+
+def test_referer_does_not_skip_csrf(client):
+    assert client.post("/stop", headers=SVC_REFERER).status_code == 403
+
+
+def test_referer_does_not_skip_login_rate_limit(client):
+    def attempt(_):
+        return pc.app.test_client().post("/login", data={"password": "wrong"}, headers=SVC_REFERER).status_code
+    with ThreadPoolExecutor(40) as pool:
+        codes = set(pool.map(attempt, range(40)))
+    assert 429 in codes
+
+
+def test_svc_paths_and_fallback_still_proxy(client):
+    assert client.post("/svc/comfy/prompt").status_code == 200
+    assert client.post("/prompt", headers=SVC_REFERER).status_code == 200  # unrouted: 404 fallback
+    assert client.post("/prompt").status_code == 403  # no Referer: a controller POST without a token
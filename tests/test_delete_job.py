@@ -0,0 +1,53 @@
+"""The delete job when the output folder cannot be renamed into the trash."""
+import errno, os
+
+import pytest
+
+import PocketComfy as pc
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    out = tmp_path / "output"
+    (out / "batch" / "deep").mkdir(parents=True)
+    for rel in ("a.png", "batch/b.png", "batch/deep/c.mp4"):
+        (out / rel).write_bytes(b"x" * 10)
+    monkeypatch.setattr(pc, "DELETE_PATH", str(out))
+    monkeypatch.setattr(pc, "PURGE_RATE", 0)
+    purges = []
+    monkeypatch.setattr(pc, "submit_job", lambda *a, **k: purges.append(a))
+    return out, purges
+
+
+def _job():
+    return pc.Job("delete", "Delete outputs", pc._job_delete, group="outputs", cancellable=True)
+
+
+def test_mount_point_is_purged_in_place(outputs, monkeypatch):
+    out, purges = outputs
+    monkeypatch.setattr(pc.os.path, "ismount", lambda p: p == str(out))
+    pc._job_delete(_job())
+    assert out.is_dir() and not any(out.iterdir())
+    assert not purges and not os.path.exists(pc.trash_dir())
+
+
+def test_cross_device_rename_falls_back(outputs, monkeypatch):
+    out, purges = outputs
+    def exdev(src, dst): raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(pc.os, "rename", exdev)
+    pc._job_delete(_job())
+    assert out.is_dir() and not any(out.iterdir()) and not purges
+
+
+def test_same_device_moves_to_trash(outputs):
+    out, purges = outputs
+    pc._job_delete(_job())
+    assert out.is_dir() and not any(out.iterdir())
+    assert len(os.listdir(pc.trash_dir())) == 1 and purges
+
+
+def test_other_rename_errors_are_reported_as_such(outputs, monkeypatch):
+    def denied(src, dst): raise PermissionError(errno.EACCES, "Permission denied")
+    monkeypatch.setattr(pc.os, "rename", denied)
+    with pytest.raises(RuntimeError, match="cannot move the output folder to the trash"):
+        pc._job_delete(_job())
@@ -0,0 +1,51 @@
+"""Progress hub subscribers that fall behind."""
+import json
+
+import pytest
+
+import PocketComfy as pc
+
+
+@pytest.fixture(autouse=True)
+def hub(monkeypatch):
+    monkeypatch.setattr(pc, "_progress_check", lambda: None)
+    monkeypatch.setattr(pc, "PROGRESS_QUEUE", 8)
+    monkeypatch.setitem(pc._progress, "subs", {})
+    monkeypatch.setitem(pc._progress, "last", {})
+    monkeypatch.setitem(pc._progress, "connected", True)
+
+
+def _event(kind: str, **data) -> bytes:
+    return json.dumps({"type": kind, "data": data}).encode()
+
+
+def test_overflow_closes_instead_of_dropping_events():
+    sub = pc.progress_subscribe(ws=True)
+    try:
+        pc._progress_text(_event("execution_start", prompt_id="p"))
+        for i in range(20): pc._progress_text(_event("progress", value=i, max=20))
+        assert sub["closed"] and sub["overflow"]
+        items, _, alive = pc._progress_take(sub, 0)
+        assert not alive and not items  # nothing partial is delivered; the tab reconnects
+    finally:
+        pc.progress_unsubscribe(sub)
+
+
+def test_previews_never_overflow():
+    sub = pc.progress_subscribe(ws=True)
+    try:
+        preview = (1).to_bytes(4, "big") + (1).to_bytes(4, "big") + b"\xff\xd8jpeg"
+        for _ in range(50): pc._progress_binary(preview)
+        items, latest, alive = pc._progress_take(sub, 0)
+        assert alive and not items and latest
+    finally:
+        pc.progress_unsubscribe(sub)
+
+
+def test_sse_stream_ends_on_overflow():
+    stream = pc._progress_events()
+    next(stream); next(stream)  # retry hint, snapshot
+    for i in range(20): pc._progress_text(_event("progress", value=i, max=20))
+    with pytest.raises(StopIteration):
+        next(stream)
+    assert not pc._progress["subs"]
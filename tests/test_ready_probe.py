@@ -0,0 +1,80 @@
+"""wait_for_ready against a stub service that starts answering late."""
+import os, socket, threading, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import PocketComfy as pc
+
+
+class _Alive:
+    pid = os.getpid()
+    def poll(self): return None
+
+
+class _Exited:
+    pid = os.getpid()
+    def poll(self): return 1
+
+
+class _Stub(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200); self.send_header("Content-Length", "2"); self.end_headers()
+        self.wfile.write(b"{}")
+    def log_message(self, *args): pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+
+@pytest.fixture
+def comfy(monkeypatch):
+    port = _free_port()
+    monkeypatch.setitem(pc.SERVICES["comfy"], "port", port)
+    monkeypatch.setitem(pc.processes, "comfy", _Alive())
+    monkeypatch.setitem(pc.detected_ports, "comfy", None)
+    monkeypatch.setattr(pc, "_listen_ports", lambda proc: set())
+    pc._ready_hints["comfy"].clear()
+    return port
+
+
+def test_ready_once_stub_answers(comfy):
+    booted = []
+    def boot():  # binds late, as a booting service would
+        time.sleep(0.3)
+        srv = HTTPServer(("127.0.0.1", comfy), _Stub)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        booted.append(srv)
+    threading.Thread(target=boot, daemon=True).start()
+    t = time.time()
+    assert pc.wait_for_ready("comfy", 5)
+    assert time.time() - t < 2
+    assert pc.detected_ports["comfy"] == comfy
+    booted[0].shutdown(); booted[0].server_close()
+
+
+def test_gives_up_when_process_exits(comfy, monkeypatch):
+    monkeypatch.setitem(pc.processes, "comfy", _Exited())
+    monkeypatch.setattr(pc, "is_port_in_use", lambda port, max_age=None: False)
+    t = time.time()
+    assert not pc.wait_for_ready("comfy", 5)
+    assert time.time() - t < 1
+
+
+def test_backoff_restarts_after_marker(comfy, monkeypatch):
+    probes = []
+    monkeypatch.setattr(pc, "probe_service", lambda key, port: probes.append(time.time()) or False)
+    monkeypatch.setattr(pc, "READY_PROBE_MIN_MS", 20)
+    monkeypatch.setattr(pc, "READY_PROBE_MAX_MS", 400)
+    threading.Timer(0.5, pc._ready_hints["comfy"].set).start()
+    marker_at = time.time() + 0.5
+    assert not pc.wait_for_ready("comfy", 1.6)
+    after = [p for p in probes if p >= marker_at]
+    gaps = [b - a for a, b in zip(after, after[1:])]
+    assert after[0] - marker_at < 0.05          # the marker wakes the probe at once
+    assert gaps[0] < 0.06                       # back at the minimum interval
+    assert len(after) < 10                      # not a flat 20 ms poll for the rest of the wait
+    steady = gaps[:-1]  # the last sleep is cut short by the deadline
+    assert all(b >= a * 1.5 for a, b in zip(steady, steady[1:]) if b < 0.35)  # doubling up to the cap
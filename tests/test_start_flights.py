@@ -0,0 +1,30 @@
+"""Repeated /ensure_mini calls while ComfyUI boots start mini once."""
+import threading, time
+
+import PocketComfy as pc
+
+
+def test_ensure_mini_coalesces_while_comfy_boots(monkeypatch):
+    comfy_booting = threading.Event()
+    launched = []
+    def fake_launch(key, only_missing):
+        launched.append(key)
+        if key == "comfy": comfy_booting.wait(5)
+        return {"ok": True, "launch": 0.0, "ready": 0.0}
+    monkeypatch.setattr(pc, "_launch_and_wait", fake_launch)
+    monkeypatch.setattr(pc, "service_up", lambda key: True)
+    client = pc.app.test_client()
+    with client.session_transaction() as s:
+        s["auth_ok"] = True
+    headers = {"X-CSRF-Token": pc.CSRF_TOKEN}
+
+    for _ in range(5):
+        assert client.post("/ensure_mini", headers=headers).data == b"success"
+    time.sleep(0.1)
+    assert "mini" in pc._pending and launched == ["comfy"]
+
+    comfy_booting.set()
+    deadline = time.time() + 5
+    while pc._pending and time.time() < deadline: time.sleep(0.02)
+    assert sorted(launched) == ["comfy", "mini"]
+    assert not pc._pending
@@ -0,0 +1,32 @@
+"""Incremental storage index passes."""
+import os, time
+
+import PocketComfy as pc
+
+
+SETTLED = time.time() - 60
+
+
+def _settle(path):
+    os.utime(path, (SETTLED, SETTLED))
+
+
+def test_growing_file_in_settled_directory_is_remeasured(tmp_path):
+    video = tmp_path / "render.mp4"
+    video.write_bytes(b"x" * 100)
+    _settle(tmp_path)  # the directory itself settled long ago
+    index, _ = pc._index_pass(str(tmp_path), {})
+    assert index[""]["bytes"] == 100
+
+    with open(video, "ab") as f: f.write(b"x" * 900)  # appending leaves the directory mtime alone
+    index, listed = pc._index_pass(str(tmp_path), index)
+    assert listed == 1 and index[""]["bytes"] == 1000
+
+
+def test_quiet_directory_is_not_listed_again(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"x" * 10)
+    _settle(tmp_path / "a.png"); _settle(tmp_path)
+    index, listed = pc._index_pass(str(tmp_path), {})
+    assert listed == 1 and index[""]["mtime"]
+    index, listed = pc._index_pass(str(tmp_path), index)
+    assert listed == 0 and index[""]["files"] == 1
@@ -0,0 +1,43 @@
+"""/thumb responses for good, undecodable and vanished sources."""
+import io
+
+import pytest
+from PIL import Image
+
+import PocketComfy as pc
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    out = tmp_path / "output"; out.mkdir()
+    Image.new("RGB", (1200, 800), "purple").save(out / "good.png")
+    (out / "bad.png").write_bytes(b"not an image")
+    monkeypatch.setattr(pc, "DELETE_PATH", str(out))
+    monkeypatch.setattr(pc, "THUMB_DIR", str(tmp_path / "thumbs"))
+    monkeypatch.setattr(pc, "_thumb_lru", pc.OrderedDict())
+    monkeypatch.setattr(pc, "_thumb_failed", pc.OrderedDict())
+    monkeypatch.setitem(pc._thumb_state, "loaded", False)
+    monkeypatch.setitem(pc._thumb_state, "bytes", 0)
+    c = pc.app.test_client()
+    with c.session_transaction() as s:
+        s["auth_ok"] = True
+    return c
+
+
+def test_thumbnail_is_small_webp(client):
+    r = client.get("/thumb?p=good.png&w=300")
+    assert r.status_code == 200 and r.mimetype == "image/webp"
+    assert Image.open(io.BytesIO(r.data)).width == 320
+
+
+def test_failure_is_generic_and_remembered(client, tmp_path, monkeypatch):
+    r = client.get("/thumb?p=bad.png")
+    assert r.status_code == 422
+    assert str(tmp_path) not in r.get_data(as_text=True) and "bad.png" in r.json["error"]
+    monkeypatch.setattr(pc, "_submit_preview", lambda *a, **k: pytest.fail("decoded a known-bad file again"))
+    assert client.get("/thumb?p=bad.png").status_code == 422
+
+
+def test_file_gone_after_resolving_is_404(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(pc, "resolve_output", lambda rel, folder=False: str(tmp_path / "output" / "gone.png"))
+    assert client.get("/thumb?p=gone.png").status_code == 404
@@ -0,0 +1,78 @@
+"""WebSocket frames written by _ws_frame read back intact through _ws_read."""
+import io
+
+import pytest
+
+import PocketComfy as pc
+
+SIZES = [0, 125, 126, 65535, 65536, 200_000]  # 7-bit, 16-bit and 64-bit length forms
+
+
+def _fragment(frame: bytes, fin: bool, continuation: bool) -> bytes:
+    first = frame[0] & 0x0F
+    if continuation: first = 0
+    return bytes((first | (0x80 if fin else 0),)) + frame[1:]
+
+
+@pytest.mark.parametrize("mask", [False, True])
+@pytest.mark.parametrize("size", SIZES)
+def test_round_trip(size, mask):
+    payload = bytes(i % 251 for i in range(size))
+    frame = pc._ws_frame(2, payload, mask=mask)
+    assert bool(frame[1] & 0x80) == mask
+    f = io.BytesIO(frame)
+    assert pc._ws_read(f) == (2, payload)
+    assert f.read() == b""
+
+
+def test_length_forms():
+    assert pc._ws_frame(1, b"x" * 125)[1] == 125
+    assert pc._ws_frame(1, b"x" * 126)[1:4] == bytes((126, 0, 126))
+    assert pc._ws_frame(1, b"x" * 65536)[1:10] == bytes((127,)) + (65536).to_bytes(8, "big")
+
+
+@pytest.mark.parametrize("mask", [False, True])
+def test_continuation_frames_with_interleaved_ping(mask):
+    pings = []
+    stream = io.BytesIO(
+        _fragment(pc._ws_frame(1, b'{"type": ', mask=mask), fin=False, continuation=False)
+        + pc._ws_frame(9, b"hi", mask=mask)
+        + _fragment(pc._ws_frame(1, b'"status", ' + b"x" * 300, mask=mask), fin=False, continuation=True)
+        + _fragment(pc._ws_frame(1, b'"data": {}}', mask=mask), fin=True, continuation=True)
+        + pc._ws_frame(10, b"", mask=mask)
+        + pc._ws_frame(8, (1000).to_bytes(2, "big"), mask=mask))
+    assert pc._ws_read(stream, pings.append) == (1, b'{"type": "status", ' + b"x" * 300 + b'"data": {}}')
+    assert pings == [b"hi"]
+    assert pc._ws_read(stream) == (8, (1000).to_bytes(2, "big"))  # pong skipped, close returned
+
+
+def test_oversized_message_rejected_before_payload(monkeypatch):
+    monkeypatch.setattr(pc, "_WS_MAX_MESSAGE", 1000)
+    header = bytes((0x82, 127)) + (1001).to_bytes(8, "big")  # no payload follows: must not be read
+    with pytest.raises(ConnectionError, match="too large"):
+        pc._ws_read(io.BytesIO(header))
+
+
+def test_oversized_fragments_rejected(monkeypatch):
+    monkeypatch.setattr(pc, "_WS_MAX_MESSAGE", 1000)
+    part = _fragment(pc._ws_frame(2, b"x" * 600), fin=False, continuation=False)
+    rest = _fragment(pc._ws_frame(2, b"x" * 600), fin=True, continuation=True)
+    with pytest.raises(ConnectionError, match="too large"):
+        pc._ws_read(io.BytesIO(part + rest))
+
+
+def test_default_limit_rejects_64bit_length():
+    header = bytes((0x82, 127)) + (pc._WS_MAX_MESSAGE + 1).to_bytes(8, "big")
+    with pytest.raises(ConnectionError, match="too large"):
+        pc._ws_read(io.BytesIO(header))
+
+
+def test_truncated_frame_raises():
+    frame = pc._ws_frame(1, b"hello world", mask=True)
+    with pytest.raises(ConnectionError):
+        pc._ws_read(io.BytesIO(frame[:-3]))
+
+
+def test_oversized_control_frame_rejected():
+    with pytest.raises(ConnectionError, match="control frame"):
+        pc._ws_read(io.BytesIO(pc._ws_frame(9, b"x" * 126)))